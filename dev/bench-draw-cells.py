@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+'''
+Benchmark redrawing a wide sheet with computed columns.
+
+Draws a sheet with plain and ExprColumn columns to a stub screen, with and
+without options.disp_cell_cache, and reports the time per frame for
+redrawing the same screen, and for moving the cursor down one row per frame.
+
+Usage: dev/bench-draw-cells.py [ncols] [nexprcols] [nframes]
+'''
+
+import sys
+import time
+
+import visidata
+from visidata import vd, Sheet, ColumnItem, ExprColumn
+
+
+class StubScreen:
+    def __init__(self, h=50, w=250):
+        self.h, self.w = h, w
+    def getmaxyx(self):
+        return self.h, self.w
+    def addstr(self, *args):
+        pass
+    def move(self, *args):
+        pass
+    def erase(self):
+        pass
+
+
+def main(ncols=40, nexprcols=20, nframes=50):
+    vs = Sheet('wide', rows=[[f'{r}.{c}' for c in range(ncols)] for r in range(1000)])
+    for c in range(ncols):
+        vs.addColumn(ColumnItem(f'c{c}', c, width=8))
+    for c in range(nexprcols):
+        vs.addColumn(ExprColumn(f'e{c}', f'c{c%ncols} + c{(c+1)%ncols}', width=8))
+    vd.sheets.insert(0, vs)
+    scr = StubScreen()
+    vs._scr = scr
+
+    def frames(move):
+        vs.cursorRowIndex = 0
+        t0 = time.perf_counter()
+        for i in range(nframes):
+            vd.clearCaches()
+            if move:
+                vs.cursorRowIndex += 1
+            vs.draw(scr)
+        return 1000*(time.perf_counter()-t0)/nframes
+
+    print(f'{ncols} columns and {nexprcols} expression columns, {nframes} frames')
+    for cache in (False, True):
+        vs.options.disp_cell_cache = cache
+        vs.draw(scr)  # warm up
+        print(f'disp_cell_cache={cache}: {frames(False):.2f} ms per idle frame, {frames(True):.2f} ms per frame moving down')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
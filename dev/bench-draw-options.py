@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+'''
+Benchmark time spent resolving options while drawing a wide sheet.
+
+Draws a sheet with many columns to a stub screen repeatedly, and reports the
+time per frame, and the part of it spent looking up options.
+
+Usage: dev/bench-draw-options.py [ncols] [nrows] [nframes]
+'''
+
+import sys
+import time
+import cProfile
+import pstats
+
+import visidata
+from visidata import vd, Sheet, ColumnItem
+
+
+class StubScreen:
+    def __init__(self, h=50, w=250):
+        self.h, self.w = h, w
+    def getmaxyx(self):
+        return self.h, self.w
+    def addstr(self, *args):
+        pass
+    def move(self, *args):
+        pass
+    def erase(self):
+        pass
+
+
+def main(ncols=200, nrows=1000, nframes=200):
+    vs = Sheet('wide', rows=[[f'{r}.{c}' for c in range(ncols)] for r in range(nrows)])
+    for c in range(ncols):
+        vs.addColumn(ColumnItem(f'c{c}', c, width=8))
+    vd.sheets.insert(0, vs)
+    scr = StubScreen()
+    vs._scr = scr
+
+    def frames():
+        for i in range(nframes):
+            vd.clearCaches()
+            vs.draw(scr)
+
+    frames()  # warm up
+
+    t0 = time.perf_counter()
+    frames()
+    elapsed = time.perf_counter() - t0
+
+    prof = cProfile.Profile()
+    prof.runcall(frames)
+    stats = pstats.Stats(prof)
+    total = stats.total_tt
+    optstime = sum(v[3] for k, v in stats.stats.items() if (k[2] == '__getattr__' and k[0].endswith('settings.py')) or k[2] == '_obj_options')
+    ncalls = sum(v[1] for k, v in stats.stats.items() if k[2] in ('__getattr__',) and k[0].endswith('settings.py'))
+
+    print(f'{ncols} columns, {nframes} frames')
+    print(f'{1000*elapsed/nframes:.2f} ms per frame')
+    print(f'{ncalls/nframes:.0f} OptionsObject.__getattr__ calls per frame, {100*optstime/total:.0f}% of profiled time')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+'''
+Benchmark saving a sheet with typed columns.
+
+Builds a sheet of text rows with str, int, float, date, and untyped columns,
+saves it in each given filetype, and reports the time and rows per second.
+
+Usage: dev/bench-save.py [nrows] [filetype ...]
+'''
+
+import os
+import sys
+import time
+import tempfile
+
+import visidata
+from visidata import vd, Sheet, ColumnItem, Path, date
+
+
+def main(nrows=1000000, *filetypes):
+    filetypes = filetypes or ('tsv', 'csv', 'jsonl')
+    vs = Sheet('bench', rows=[[f'name{i}', str(i), f'{i/7:.4f}', f'2023-{i%12+1:02d}-{i%28+1:02d}', f'x{i%100}'] for i in range(nrows)])
+    for i, t in enumerate((str, int, float, date, None)):
+        vs.addColumn(ColumnItem(f'c{i}', i, type=t))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for ft in filetypes:
+            p = Path(os.path.join(tmpdir, 'bench.'+ft))
+            savefunc = getattr(vd, 'save_'+ft)
+            t0 = time.perf_counter()
+            savefunc(p, vs)
+            elapsed = time.perf_counter() - t0
+            print(f'{ft}: {elapsed:.2f}s for {nrows} rows, {nrows/elapsed:.0f} rows/s, {os.path.getsize(p)} bytes')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000, *sys.argv[2:])
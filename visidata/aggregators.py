@@ -3,6 +3,8 @@ import math
 import functools
 import collections
 import statistics
+import hashlib
+import itertools
 
 from visidata import Progress, Sheet, Column, ColumnsSheet, VisiData
 from visidata import vd, anytype, vlen, asyncthread, wrapply, AttrDict
@@ -17,6 +19,20 @@ def getValueRows(self, rows):
     'Generate (value, row) for each row in *rows* at this column, excluding null and error values.'
     f = self.sheet.isNullFunc()
 
+    if type(self).getTypedValues is not Column.getTypedValues:  # computed for many rows together, like ArrowColumn
+        rows = iter(Progress(rows, 'calculating'))
+        while True:
+            chunk = list(itertools.islice(rows, 10000))
+            if not chunk:
+                return
+            try:
+                vals = self.getTypedValues(chunk)
+            except Exception:
+                vals = [wrapply(self.getTypedValue, r) for r in chunk]
+            for v, r in zip(vals, chunk):
+                if not f(v):
+                    yield v, r
+
     for r in Progress(rows, 'calculating'):
         try:
             v = self.getTypedValue(r)
@@ -58,11 +74,12 @@ Column.aggregators = property(aggregators_get, aggregators_set)
 
 
 class Aggregator:
-    def __init__(self, name, type, funcRows, funcValues=None, helpstr='foo'):
+    def __init__(self, name, type, funcRows, funcValues=None, helpstr='foo', state=None):
         'Define aggregator `name` that calls func(col, rows)'
         self.type = type
         self.func = funcRows  # funcRows(col, rows)
         self.funcValues = funcValues  # funcValues(values, *args)
+        self.state = state  # state() -> new AggregatorState, for single-pass aggregation
         self.helpstr = helpstr
         self.name = name
 
@@ -71,19 +88,305 @@ class Aggregator:
 
 _defaggr = Aggregator
 
-@VisiData.api
-def aggregator(vd, name, funcValues, helpstr='', *args, type=None):
-    'Define simple aggregator *name* that calls ``funcValues(values, *args)`` to aggregate *values*.  Use *type* to force the default type of the aggregated column.'
-    def _funcRows(col, rows):  # wrap builtins so they can have a .type
-        vals = list(col.getValues(rows))
+
+class AggregatorState:
+    '''Running state of an aggregator over a stream of values.
+
+    Subclasses implement *add(v)* to take the next value, *combine(other)* to take the state over another disjoint set of values, and *result()* to return the aggregated value.
+    They can also implement *addValues(values)* to take a whole list of values at once faster than *add(v)* for each.
+    States computed separately (per chunk or per thread) can be merged in order with *merge(other)*.'''
+    addValues = None
+
+    def __init__(self):
+        self.n = 0
+        self.error = None
+
+    @classmethod
+    def of(cls, values):
+        'Return new state of this class over all *values*.'
+        st = cls()
+        for v in values:
+            st.update(v)
+        return st
+
+    def update(self, v):
+        if self.error is None:
+            try:
+                self.add(v)
+            except Exception as e:
+                self.error = e
+        self.n += 1
+
+    def updateValues(self, values):
+        'Take every value in the list *values*, like update(v) for each.'
+        if self.addValues is None:
+            for v in values:
+                self.update(v)
+            return
+
+        if self.error is None:
+            try:
+                self.addValues(values)
+            except Exception as e:
+                self.error = e
+        self.n += len(values)
+
+    def merge(self, other):
+        if self.error is None:
+            if other.error is not None:
+                self.error = other.error
+            else:
+                try:
+                    self.combine(other)
+                except Exception as e:
+                    self.error = e
+        self.n += other.n
+        return self
+
+    def value(self):
+        'Return the aggregated value, or the error raised while aggregating (None if there were no values).'
         try:
-            return funcValues(vals, *args)
+            if self.error is not None:
+                raise self.error
+            return self.result()
         except Exception as e:
-            if len(vals) == 0:
+            if self.n == 0:
                 return None
             return e
 
-    vd.aggregators[name] = _defaggr(name, type, _funcRows, funcValues=funcValues, helpstr=helpstr)  # accepts a srccol + list of rows
+
+class ValuesState(AggregatorState):
+    'Keep all values, and call ``funcValues(values, *args)`` at the end.'
+    def __init__(self, funcValues, *args):
+        super().__init__()
+        self.funcValues = funcValues
+        self.args = args
+        self.values = []
+
+    def add(self, v):
+        self.values.append(v)
+
+    def addValues(self, values):
+        self.values.extend(values)
+
+    def combine(self, other):
+        self.values.extend(other.values)
+
+    def result(self):
+        return self.funcValues(self.values, *self.args)
+
+
+class CountState(AggregatorState):
+    def add(self, v):
+        pass
+
+    def addValues(self, values):
+        pass
+
+    def combine(self, other):
+        pass
+
+    def result(self):
+        return self.n
+
+
+class SumState(AggregatorState):
+    def __init__(self):
+        super().__init__()
+        self.total = None
+
+    def add(self, v):
+        self.total = type(v)()+v if self.total is None else self.total+v  #1996
+
+    def addValues(self, values):
+        if values:
+            self.total = sum(values[1:], type(values[0])()+values[0] if self.total is None else self.total+values[0])
+
+    def combine(self, other):
+        if other.total is not None:
+            self.total = other.total if self.total is None else self.total+other.total
+
+    def result(self):
+        return 0 if self.total is None else self.total
+
+
+class MeanState(AggregatorState):
+    def __init__(self):
+        super().__init__()
+        self.total = 0
+
+    def add(self, v):
+        self.total += v
+
+    def addValues(self, values):
+        self.total = sum(values, self.total)
+
+    def combine(self, other):
+        self.total += other.total
+
+    def result(self):
+        if self.n:
+            return float(self.total)/self.n
+
+
+class MinState(AggregatorState):
+    def __init__(self):
+        super().__init__()
+        self.extreme = None
+
+    def better(self, a, b):
+        return min(a, b)
+
+    def add(self, v):
+        self.extreme = v if self.n == 0 else self.better(self.extreme, v)
+
+    def addValues(self, values):
+        if values:
+            v = self.better(*values) if len(values) > 1 else values[0]
+            self.add(v)
+
+    def combine(self, other):
+        if other.n:
+            self.extreme = other.extreme if self.n == 0 else self.better(self.extreme, other.extreme)
+
+    def result(self):
+        if self.n == 0:
+            raise ValueError('no values')
+        return self.extreme
+
+
+class MaxState(MinState):
+    def better(self, a, b):
+        return max(a, b)
+
+
+class StdevState(AggregatorState):
+    'Sample standard deviation, using Welford\'s online algorithm (and Chan\'s formula to merge).'
+    def __init__(self):
+        super().__init__()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, v):
+        d = v - self.mean
+        self.mean += d/(self.n+1)
+        self.m2 += d*(v - self.mean)
+
+    def addValues(self, values):
+        if values:
+            chunk = StdevState()
+            chunk.n = len(values)
+            chunk.mean = sum(values)/chunk.n
+            chunk.m2 = sum((v-chunk.mean)**2 for v in values)
+            self.combine(chunk)
+
+    def combine(self, other):
+        if other.n:
+            n = self.n + other.n
+            d = other.mean - self.mean
+            self.mean += d*other.n/n
+            self.m2 += other.m2 + d*d*self.n*other.n/n
+
+    def result(self):
+        if self.n < 2:
+            raise statistics.StatisticsError('stdev requires at least two data points')
+        return math.sqrt(self.m2/(self.n-1))
+
+
+class DistinctState(AggregatorState):
+    def __init__(self):
+        super().__init__()
+        self.values = set()
+
+    def add(self, v):
+        self.values.add(v)
+
+    def addValues(self, values):
+        self.values.update(values)
+
+    def combine(self, other):
+        self.values |= other.values
+
+    def result(self):
+        return self.values
+
+
+class HyperLogLogState(AggregatorState):
+    'Approximate count of distinct values, using HyperLogLog with 2**p registers (standard error about 1.6% for p=12).'
+    p = 12
+
+    def __init__(self):
+        super().__init__()
+        self.registers = bytearray(1 << self.p)
+
+    def add(self, v):
+        h = int.from_bytes(hashlib.blake2b(repr(v).encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+        i = h >> (64-self.p)
+        rest = h & ((1 << (64-self.p))-1)
+        rank = (64-self.p) - rest.bit_length() + 1
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+
+    def combine(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def result(self):
+        m = len(self.registers)
+        est = 0.7213/(1+1.079/m) * m*m / sum(2.0**-r for r in self.registers)
+        zeros = self.registers.count(0)
+        if est <= 2.5*m and zeros:
+            est = m*math.log(m/zeros)  # linear counting for small cardinalities
+        return round(est)
+
+
+@VisiData.api
+def aggregator(vd, name, funcValues, helpstr='', *args, type=None, state=None):
+    '''Define simple aggregator *name* that calls ``funcValues(values, *args)`` to aggregate *values*.  Use *type* to force the default type of the aggregated column.
+    Use *state* to give a function returning a new AggregatorState that computes the same result without keeping all the values.'''
+    if state is None:
+        state = lambda: ValuesState(funcValues, *args)
+
+    def _funcRows(col, rows):  # wrap builtins so they can have a .type
+        st = state()
+        for v in col.getValues(rows):
+            st.update(v)
+        return st.value()
+
+    vd.aggregators[name] = _defaggr(name, type, _funcRows, funcValues=funcValues, helpstr=helpstr, state=state)  # accepts a srccol + list of rows
+
+
+@Sheet.api
+def aggregateRows(sheet, colaggs, rows):
+    '''Return list of aggregated values over *rows*, one for each (col, aggregator) in *colaggs*.
+    All aggregators with a *state* are computed together in a single pass over *rows*, getting the typed value of each column only once per row.'''
+    results = [None]*len(colaggs)
+    colstates = collections.defaultdict(list)  # [col] -> list of (idx, AggregatorState)
+    for i, (col, agg) in enumerate(colaggs):
+        if agg.state:
+            colstates[col].append((i, agg.state()))
+        else:
+            results[i] = agg(col, rows)
+
+    if colstates:
+        isNull = sheet.isNullFunc()
+        colstates = list(colstates.items())
+        for r in Progress(rows, 'aggregating'):
+            for col, states in colstates:
+                try:
+                    v = col.getTypedValue(r)
+                except Exception:
+                    continue
+                if isNull(v):
+                    continue
+                for i, st in states:
+                    st.update(v)
+
+        for col, states in colstates:
+            for i, st in states:
+                results[i] = st.value()
+
+    return results
+
 
 ## specific aggregator implementations
 
@@ -122,22 +425,24 @@ def _percentile(N, percent, key=lambda x:x):
 
 @functools.lru_cache(100)
 def percentile(pct, helpstr=''):
-    return _defaggr('p%s'%pct, None, lambda col,rows,pct=pct: _percentile(sorted(col.getValues(rows)), pct/100), helpstr=helpstr)
+    return _defaggr('p%s'%pct, None, lambda col,rows,pct=pct: _percentile(sorted(col.getValues(rows)), pct/100), helpstr=helpstr,
+                    state=lambda pct=pct: ValuesState(lambda vals: _percentile(sorted(vals), pct/100)))
 
 def quantiles(q, helpstr):
     return [percentile(round(100*i/q), helpstr) for i in range(1, q)]
 
-vd.aggregator('min', min, 'minimum value')
-vd.aggregator('max', max, 'maximum value')
-vd.aggregator('avg', mean, 'arithmetic mean of values', type=float)
-vd.aggregator('mean', mean, 'arithmetic mean of values', type=float)
+vd.aggregator('min', min, 'minimum value', state=MinState)
+vd.aggregator('max', max, 'maximum value', state=MaxState)
+vd.aggregator('avg', mean, 'arithmetic mean of values', type=float, state=MeanState)
+vd.aggregator('mean', mean, 'arithmetic mean of values', type=float, state=MeanState)
 vd.aggregator('median', statistics.median, 'median of values')
 vd.aggregator('mode', statistics.mode, 'mode of values')
-vd.aggregator('sum', vsum, 'sum of values')
-vd.aggregator('distinct', set, 'distinct values', type=vlen)
-vd.aggregator('count', lambda values: sum(1 for v in values), 'number of values', type=int)
+vd.aggregator('sum', vsum, 'sum of values', state=SumState)
+vd.aggregator('distinct', set, 'distinct values', type=vlen, state=DistinctState)
+vd.aggregator('approx_distinct', lambda values: HyperLogLogState.of(values).value(), 'approximate number of distinct values', type=int, state=HyperLogLogState)
+vd.aggregator('count', lambda values: sum(1 for v in values), 'number of values', type=int, state=CountState)
 vd.aggregator('list', list, 'list of values')
-vd.aggregator('stdev', statistics.stdev, 'standard deviation of values', type=float)
+vd.aggregator('stdev', statistics.stdev, 'standard deviation of values', type=float, state=StdevState)
 
 vd.aggregators['q3'] = quantiles(3, 'tertiles (33/66th pctile)')
 vd.aggregators['q4'] = quantiles(4, 'quartiles (25/50/75th pctile)')
@@ -100,10 +100,17 @@ class BaseSheet(DrawablePane):
     help = ''            # default to show in sidebar
 
     def _obj_options(self):
-        return vd.OptionsObject(vd._options, obj=self)
+        opts = self.__dict__.get('_options', None)
+        if opts is None or opts._obj is not self:  # not copied from another sheet
+            opts = self.__dict__['_options'] = vd.OptionsObject(vd._options, obj=self)
+        return opts
 
     def _class_options(cls):
-        return vd.OptionsObject(vd._options, obj=cls)
+        opts = cls.__dict__.get('_class_options_obj', None)
+        if opts is None:
+            opts = vd.OptionsObject(vd._options, obj=cls)
+            setattr(cls, '_class_options_obj', opts)
+        return opts
 
     class_options = options = _dualproperty(_obj_options, _class_options)
 
@@ -252,6 +259,7 @@ class BaseSheet(DrawablePane):
         if self._names:
             vd.addUndo(setattr, self, '_names', self._names)
         self._name = self.maybeClean(str(name))
+        self.options._clear(self)  # sheet options are set by name
 
     def maybeClean(self, s):
         'stub'
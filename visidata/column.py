@@ -6,6 +6,8 @@ import threading
 import re
 import time
 import json
+import sys
+import weakref
 
 from visidata import options, anytype, stacktrace, vd
 from visidata import asyncthread, dispwidth, clipstr, iterchars
@@ -19,8 +21,10 @@ class InProgress(Exception):
         return  ['calculation in progress']
 
 INPROGRESS = TypedExceptionWrapper(None, exception=InProgress())  # sentinel
+_notcached = object()  # sentinel for ColumnCache.get
 
 vd.option('col_cache_size', 0, 'max number of cache entries in each cached column', max_help=-1)
+vd.option('col_cache_max_mb', 512, 'max approximate memory (MB) for the caches of all cached columns together, including async caches which col_cache_size does not limit (0 for no limit)', max_help=-1)
 vd.option('disp_formatter', 'generic', 'formatter to create the text in each cell (also used by text savers)', replay=True, max_help=0)
 vd.option('disp_displayer', 'generic', 'displayer to render the text in each cell', replay=False, max_help=0)
 
@@ -40,6 +44,138 @@ class DisplayWrapper:
     def __eq__(self, other):
         return self.value == other
 
+class ColumnCache(collections.OrderedDict):
+    'Cached values of one column by rowid, in least-recently-used order.  The approximate memory of all ColumnCaches is bounded by options.col_cache_max_mb.'
+    entry_overhead = 100  # approximate bytes for the key and dict entry of each value
+
+    def __init__(self, col):
+        super().__init__()
+        self.col = weakref.ref(col)
+        self.nbytes = 0
+        self.lastUsed = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        vd.columnCaches.register(self)
+
+    # caches are distinct objects (in the WeakSet of all caches), whatever their contents
+    __hash__ = object.__hash__
+
+    def __eq__(self, other):
+        return self is other
+
+    def entrySize(self, v):
+        try:
+            return sys.getsizeof(v) + self.entry_overhead
+        except Exception:
+            return self.entry_overhead*2
+
+    def __getitem__(self, k):
+        v = super().__getitem__(k)
+        self.move_to_end(k)
+        self.hits += 1
+        self.lastUsed = vd.columnCaches.touch()
+        return v
+
+    def get(self, k, default=None):
+        'Return the cached value for *k* as most recently used, or *default* if not cached.  The check and lookup are atomic with eviction by other threads.'
+        with vd.columnCaches.lock:
+            if k not in self:
+                return default
+            v = super().__getitem__(k)
+            self.move_to_end(k)
+        self.hits += 1
+        self.lastUsed = vd.columnCaches.touch()
+        return v
+
+    def __setitem__(self, k, v):
+        n = self.entrySize(v)
+        mgr = vd.columnCaches
+        with mgr.lock:
+            if k in self:
+                self._remove(k)
+            super().__setitem__(k, v)
+            self.nbytes += n
+            mgr.nbytes += n
+        self.lastUsed = mgr.touch()
+        mgr.checkLimit()
+
+    def __delitem__(self, k):
+        with vd.columnCaches.lock:
+            self._remove(k)
+
+    def _remove(self, k):
+        'Remove and return the value for *k*, and forget its size.  Must hold vd.columnCaches.lock.'
+        v = super().__getitem__(k)
+        super().__delitem__(k)
+        n = self.entrySize(v)
+        self.nbytes -= n
+        vd.columnCaches.nbytes -= n
+        return v
+
+    def _popitem(self, last=True):
+        'Remove and return the most recently used (key, value) if *last*, else the least recently used.  Must hold vd.columnCaches.lock.'
+        if not self:
+            raise KeyError('cache is empty')
+        k = next(reversed(self) if last else iter(self))
+        return k, self._remove(k)  # OrderedDict.popitem would go through our __getitem__/__delitem__
+
+    def popitem(self, last=True):
+        'Remove and return the most recently used (key, value) if *last*, else the least recently used.'
+        with vd.columnCaches.lock:
+            self.evictions += 1
+            return self._popitem(last)
+
+    def clear(self):
+        with vd.columnCaches.lock:
+            vd.columnCaches.nbytes -= self.nbytes
+            self.nbytes = 0
+            super().clear()
+
+    def __copy__(self):
+        return ColumnCache(self.col())  # an unrelated cache
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+
+class ColumnCacheManager:
+    'Account for the memory of all ColumnCaches, and evict values from the least recently used caches when over options.col_cache_max_mb.'
+    def __init__(self):
+        self.caches = weakref.WeakSet()
+        self.nbytes = 0
+        self.tick = 0
+        self.lock = threading.Lock()
+
+    def register(self, cache):
+        self.caches.add(cache)
+
+    def touch(self):
+        self.tick += 1
+        return self.tick
+
+    def checkLimit(self):
+        'Evict values if all caches are over options.col_cache_max_mb.'
+        maxbytes = options.col_cache_max_mb*1024*1024
+        if maxbytes and self.nbytes > maxbytes:
+            self.evict(maxbytes)
+
+    def evict(self, maxbytes):
+        'Evict least recently used values from the least recently used caches, until below 90% of *maxbytes*.'
+        with self.lock:
+            caches = list(self.caches)
+            self.nbytes = sum(c.nbytes for c in caches)  # drop accounting for caches since collected
+            for cache in sorted(caches, key=lambda c: c.lastUsed):
+                while cache and self.nbytes > maxbytes*0.9:
+                    cache._popitem(last=False)
+                    cache.evictions += 1
+                if self.nbytes <= maxbytes*0.9:
+                    break
+
+
+vd.columnCaches = ColumnCacheManager()
+
+
 def _default_colnames():
     'A B C .. Z AA AB .. ZZ AAA .. to infinity'
     i=0
@@ -98,7 +234,7 @@ class Column(Extensible):
         ret.__dict__.update(self.__dict__)
         ret.keycol = 0   # column copies lose their key status
         if self._cachedValues is not None:
-            ret._cachedValues = collections.OrderedDict()  # an unrelated cache for copied columns
+            ret._cachedValues = ColumnCache(ret)  # an unrelated cache for copied columns
         return ret
 
     def __str__(self):
@@ -303,14 +439,24 @@ class Column(Extensible):
         'Return the properly-typed value for the given row at this column, or a TypedWrapper object in case of null or error.'
         return wrapply(self.type, wrapply(self.getValue, row))
 
+    def getRowValues(self, rows):
+        'Return list of values of this column for *rows*, as getValue would for each row.  Overridable to get all rows at once.'
+        return [self.getValue(row) for row in rows]
+
+    def getTypedValues(self, rows):
+        'Return list of typed values of this column for *rows*, as getTypedValue would for each row.  Overridable to compute all rows at once.'
+        return [wrapply(self.type, wrapply(self.getValue, row)) for row in rows]
+
     def setCache(self, cache):
         '''Set cache behavior for this column to *cache*:
 
            - ``False`` (default): getValue never caches; calcValue is always called.
            - ``True``: getValue maintains a cache of ``options.col_cache_size``.
-           - ``"async"``: ``getValue`` launches thread for every uncached result, maintains cache of infinite size.  Returns invalid value until cache entry available.'''
+           - ``"async"``: ``getValue`` launches thread for every uncached result, maintains cache not limited by ``options.col_cache_size``.  Returns invalid value until cache entry available.
+
+           All caches together are limited to ``options.col_cache_max_mb``, evicting the least recently used values.'''
         self.cache = cache
-        self._cachedValues = collections.OrderedDict() if self.cache else None
+        self._cachedValues = ColumnCache(self) if self.cache else None
 
     @asyncthread
     def _calcIntoCacheAsync(self, row):
@@ -337,9 +483,11 @@ class Column(Extensible):
         if self._cachedValues is None:
             return self.calcValue(row)
 
-        k = self.sheet.rowid(row)
-        if k in self._cachedValues:
-            return self._cachedValues[k]
+        ret = self._cachedValues.get(self.sheet.rowid(row), _notcached)
+        if ret is not _notcached:
+            return ret
+
+        self._cachedValues.misses += 1
 
         if self.cache == 'async':
             ret = self._calcIntoCacheAsync(row)
@@ -447,6 +595,7 @@ class Column(Extensible):
         for r, v in zip(rows, itertools.cycle(values)):
             self.setValueSafe(r, v)
         self.recalc()
+        self.sheet.repositionRows(rows, self)
         return vd.status('set %d cells to %d values' % (len(rows), len(values)))
 
     def setValuesTyped(self, rows, *values):
@@ -456,6 +605,7 @@ class Column(Extensible):
             self.setValueSafe(r, v)
 
         self.recalc()
+        self.sheet.repositionRows(rows, self)
 
         return vd.status('set %d cells to %d values' % (len(rows), len(values)))
 
@@ -597,6 +747,7 @@ vd.addGlobals(
     ItemColumn=ItemColumn,
     ExprColumn=ExprColumn,
     SettableColumn=SettableColumn,
+    ColumnCache=ColumnCache,
     SubColumnFunc=SubColumnFunc,
     SubColumnItem=SubColumnItem,
     SubColumnAttr=SubColumnAttr,
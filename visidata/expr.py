@@ -1,4 +1,18 @@
-from visidata import Progress, Sheet, Column, asyncthread, vd, ExprColumn
+import ast
+import builtins
+import functools
+import itertools
+import threading
+import time
+
+from visidata import Progress, Sheet, Column, asyncthread, vd, ExprColumn, LazyComputeRow
+from visidata import wrapply, stacktrace, TypedExceptionWrapper
+
+# expressions with their own scopes evaluate names differently, so are always evaluated per row
+_unbatchable = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.Await, ast.Yield, ast.YieldFrom) + \
+               ((ast.NamedExpr,) if hasattr(ast, 'NamedExpr') else ())
+
+_batching = threading.local()  # .cols: set of ExprColumns being evaluated in batch in this thread
 
 
 class CompleteExpr:
@@ -29,17 +43,137 @@ class CompleteExpr:
         return varnames[state%len(varnames)]
 
 
+@functools.lru_cache(maxsize=1000)
+def batchExprCode(expr):
+    '''Return (names, code) for Python expression *expr*, where *code* evaluates to a function taking the values of *names* as arguments, in order.
+    Return None if *expr* cannot be evaluated as such a function.'''
+    try:
+        tree = ast.parse(expr, mode='eval')
+    except SyntaxError:
+        return None
+
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, _unbatchable):
+            return None
+        if isinstance(node, ast.Name) and node.id not in names:
+            names.append(node.id)
+
+    argnames = {name:'_arg%d' % i for i, name in enumerate(names)}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            node.id = argnames[node.id]
+
+    func = ast.parse('lambda %s: None' % ', '.join(argnames.values()), mode='eval')
+    func.body.body = tree.body
+    return names, compile(func, '<expr>', 'eval')
+
+
+@Sheet.api
+def batchExprArgs(sheet, names, rows, col=None):
+    '''Return list of an iterable of values for each of *names* over *rows*, resolving names as evalExpr would for *col*.
+    The values of referenced columns are fetched with getTypedValues, all rows at once.  Return None if some name cannot be resolved.'''
+    lcm = None
+    args = []
+    for name in names:
+        try:
+            i = sheet._ordered_colnames.index(name)
+            c = sheet._ordered_cols[i]
+            if c is col:  # ignore current column
+                j = sheet._ordered_colnames[i+1:].index(name)
+                c = sheet._ordered_cols[i+j+1]
+        except ValueError:
+            if lcm is None:
+                lcm = LazyComputeRow(sheet, None, col=col)._lcm
+            try:
+                c = lcm[name]
+            except (KeyError, AttributeError):
+                if name == 'sheet': c = sheet
+                elif name == 'row':
+                    args.append(rows)
+                    continue
+                elif name == 'col': c = col
+                elif name in vd.getGlobals(): c = vd.getGlobals()[name]
+                elif hasattr(builtins, name): c = getattr(builtins, name)
+                else:
+                    return None
+
+        if isinstance(c, Column):
+            args.append(c.getTypedValues(rows))
+        else:
+            args.append(itertools.repeat(c))
+
+    return args
+
+
+@Sheet.api
+def evalExprs(sheet, expr, rows, col=None):
+    '''Return list of the result of Python expression *expr* (a str) for each of *rows*, or a TypedExceptionWrapper for the exception it raised.
+    Simple expressions are compiled into a function of the columns they reference, and the values of those columns are fetched in batch.  Other expressions are evaluated row by row with evalExpr.'''
+    r = batchExprCode(expr) if type(sheet).evalExpr is Sheet.evalExpr else None
+    args = sheet.batchExprArgs(r[0], rows, col=col) if r else None
+
+    ret = []
+    if args is None:
+        compiledExpr = compile(expr, '<expr>', 'eval')
+        for row in Progress(rows, 'computing'):
+            try:
+                ret.append(sheet.evalExpr(compiledExpr, row, col=col))
+            except Exception as e:
+                e.stacktrace = stacktrace()
+                ret.append(TypedExceptionWrapper(sheet.evalExpr, row, exception=e))
+        return ret
+
+    func = eval(r[1], {})
+    argvals = zip(*args) if args else itertools.repeat((), len(rows))
+    for row, vals in Progress(zip(rows, argvals), 'computing', total=len(rows)):
+        try:
+            ret.append(func(*vals))
+        except Exception as e:
+            e.stacktrace = stacktrace()
+            ret.append(TypedExceptionWrapper(sheet.evalExpr, row, exception=e))
+    return ret
+
+
+@ExprColumn.api
+def getTypedValues(col, rows):
+    'Return list of typed values of this column for *rows*, evaluating its expression for all rows together with evalExprs.'
+    batching = getattr(_batching, 'cols', None)
+    if batching is None:
+        batching = _batching.cols = set()
+
+    if col in batching or col._cachedValues is not None or col.defer:
+        # recursive reference, or cached/deferred values: use getValue for each row
+        return Column.getTypedValues(col, rows)
+
+    batching.add(col)
+    try:
+        t0 = time.perf_counter()
+        vals = col.sheet.evalExprs(col.expr, rows, col=col)
+        t1 = time.perf_counter()
+    finally:
+        batching.remove(col)
+
+    col.ncalcs += len(rows)
+    col.totaltime += t1-t0
+
+    return [wrapply(col.type, v) for v in vals]
+
+
 @Column.api
 @asyncthread
 def setValuesFromExpr(self, rows, expr):
     'Set values in this column for *rows* to the result of the Python expression *expr* applied to each row.'
-    compiledExpr = compile(expr, '<expr>', 'eval')
     vd.addUndoSetValues([self], rows)
-    for row in Progress(rows, 'setting'):
-        # Note: expressions that are only calculated once, do not need to pass column identity
-        # they can reference their "previous selves" once without causing a recursive problem
+    # Note: expressions that are only calculated once, do not need to pass column identity
+    # they can reference their "previous selves" once without causing a recursive problem
+    vals = self.sheet.evalExprs(expr, rows)
+    for row, v in Progress(zip(rows, vals), 'setting', total=len(rows)):
+        if isinstance(v, TypedExceptionWrapper):
+            vd.exceptionCaught(v.exception)
+            continue
         try:
-            self.setValueSafe(row, self.sheet.evalExpr(compiledExpr, row))
+            self.setValueSafe(row, v)
         except Exception as e:
             vd.exceptionCaught(e)
     self.recalc()
@@ -0,0 +1,45 @@
+from visidata import vd, Sheet, BaseSheet, Column, AttrColumn
+
+
+class ColumnCachesSheet(Sheet):
+    'Memory use and hit/miss/eviction counts of the caches of all cached columns.'
+    rowtype = 'column caches'  # rowdef: ColumnCache
+    precious = False
+    columns = [
+        Column('sheet', getter=lambda col,row: row.col() and row.col().sheet),
+        Column('column', getter=lambda col,row: row.col() and row.col().name),
+        Column('entries', type=int, getter=lambda col,row: len(row)),
+        Column('kbytes', type=int, getter=lambda col,row: row.nbytes//1024),
+        AttrColumn('hits', type=int),
+        AttrColumn('misses', type=int),
+        AttrColumn('evictions', type=int),
+        Column('hit_pct', type=float, getter=lambda col,row: 100*row.hits/(row.hits+row.misses) if row.hits+row.misses else None),
+    ]
+
+    def reload(self):
+        # skip caches of template columns not on any sheet
+        self.rows = [c for c in vd.columnCaches.caches if isinstance(getattr(c.col(), 'sheet', None), BaseSheet)]
+        vd.status(f'{vd.columnCaches.nbytes//1024} KiB in {len(self.rows)} column caches (max {self.options.col_cache_max_mb} MB)')
+
+    def openRow(self, row):
+        'open sheet of cached column'
+        col = row.col()
+        if col is not None:
+            return col.sheet
+
+    def clearColumnCaches(self, caches):
+        for c in caches:
+            c.clear()
+        self.reload()
+
+
+ColumnCachesSheet.addCommand('d', 'clear-col-cache', 'clearColumnCaches([cursorRow])', 'clear cached values of current column cache')
+ColumnCachesSheet.addCommand('gd', 'clear-col-caches', 'clearColumnCaches(selectedRows or rows)', 'clear cached values of selected column caches')
+
+BaseSheet.addCommand('', 'open-col-caches', 'vd.push(ColumnCachesSheet("column_caches"))', 'open sheet of memory use and hit rates of all column caches')
+
+vd.addMenuItems('''
+    System > Column caches > open-col-caches
+''')
+
+vd.addGlobals(ColumnCachesSheet=ColumnCachesSheet)
@@ -0,0 +1,238 @@
+'''
+Compact columnar storage for the rows of sequence sheets (csv, tsv, etc).
+
+Each column of a loaded sheet is moved into a single buffer:
+
+- int, float, and date columns into an `array.array` of machine values;
+- all other columns into one joined string with an array of offsets.
+
+The rows are then replaced with `ColumnarRow` proxies, which only hold the
+buffers and their own index, so `ItemColumn` reads the value straight out of
+the column buffer.  Values which do not fit the buffer (nulls, parse errors,
+edits) are kept as-is in a small per-buffer overlay.
+
+Numeric and date columns store the typed value, so the original text of
+those cells (like leading zeros) is not preserved.
+'''
+
+import array
+import datetime
+
+from visidata import vd, SequenceSheet, SettableColumn, SelectedRows, Progress, date
+
+
+vd.option('load_columnar', False, 'compact rows of sequence sheets into columnar buffers after loading', replay=True)
+
+
+class StringBuffer:
+    'Strings of a single column joined into one str, indexed by an array of offsets.'
+    def __init__(self, values):
+        self.others = {}  # [rowidx] -> non-str or edited value
+        self.offsets = array.array('Q', [0])
+        parts = []
+        pos = 0
+        for i, v in enumerate(values):
+            if not isinstance(v, str):
+                self.others[i] = v
+                v = ''
+            parts.append(v)
+            pos += len(v)
+            self.offsets.append(pos)
+        self.text = ''.join(parts)
+
+    def __len__(self):
+        return len(self.offsets)-1
+
+    def __getitem__(self, i):
+        if self.others and i in self.others:
+            return self.others[i]
+        return self.text[self.offsets[i]:self.offsets[i+1]]
+
+    def __setitem__(self, i, v):
+        self.others[i] = v
+
+    @property
+    def nbytes(self):
+        return len(self.text.encode('utf-8', 'surrogatepass')) + self.offsets.itemsize*len(self.offsets)
+
+
+class ArrayBuffer:
+    'Typed values of a single column in an array.array; *unbox(v)* converts a raw value to the stored number, *box(x)* converts it back.'
+    def __init__(self, typecode, values, box, unbox):
+        self.box = box
+        self.others = {}  # [rowidx] -> null, unparseable, or edited value
+        self.values = array.array(typecode)
+        for i, v in enumerate(values):
+            try:
+                x = unbox(v)
+            except Exception:
+                x = None
+
+            if x is not None:
+                try:
+                    self.values.append(x)
+                    continue
+                except OverflowError:  # like ints beyond 64 bits
+                    pass
+
+            self.others[i] = v
+            self.values.append(0)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if self.others and i in self.others:
+            return self.others[i]
+        return self.box(self.values[i])
+
+    def __setitem__(self, i, v):
+        self.others[i] = v
+
+    @property
+    def nbytes(self):
+        return self.values.itemsize*len(self.values)
+
+
+def _unbox_int(v):
+    if v is None or v == '':
+        return None
+    return int(v)
+
+def _unbox_float(v):
+    if v is None or v == '':
+        return None
+    return float(v)
+
+_usecsPerDay = 24*60*60*1000000
+
+def _unbox_date(v):
+    'Return naive date of *v* as microseconds since 0001-01-01, without converting it to or from local time.'
+    if v is None or v == '':
+        return None
+    d = date(v)
+    if d.tzinfo is not None:  # the count of microseconds loses the timezone
+        return None
+    return (d.toordinal()-1)*_usecsPerDay + ((d.hour*60 + d.minute)*60 + d.second)*1000000 + d.microsecond
+
+def _box_date(x):
+    days, usecs = divmod(x, _usecsPerDay)
+    return date(datetime.datetime.fromordinal(days+1) + datetime.timedelta(microseconds=usecs))
+
+
+# [coltype] -> (typecode, box, unbox)
+vd.columnarTypes = {
+    int: ('q', int, _unbox_int),
+    float: ('d', float, _unbox_float),
+    date: ('q', _box_date, _unbox_date),
+}
+
+
+def makeBuffer(values, coltype):
+    'Return a compact buffer for the list of *values* of a column of type *coltype*.'
+    if coltype in vd.columnarTypes:
+        typecode, box, unbox = vd.columnarTypes[coltype]
+        buf = ArrayBuffer(typecode, values, box, unbox)
+        if len(buf.others) <= len(values)//2:
+            return buf
+
+    return StringBuffer(values)
+
+
+class ColumnStore:
+    'Per-column buffers of a compacted sheet.'
+    def __init__(self, buffers):
+        self.buffers = buffers
+
+    @property
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self.buffers)
+
+
+class ColumnarRow:
+    'Row proxy into the column buffers of a ColumnStore.  Behaves like a fixed-length list.'
+    __slots__ = ('store', 'idx')
+
+    def __init__(self, store, idx):
+        self.store = store
+        self.idx = idx
+
+    def __len__(self):
+        return len(self.store.buffers)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [buf[self.idx] for buf in self.store.buffers[k]]
+        return self.store.buffers[k][self.idx]
+
+    def __setitem__(self, k, v):
+        self.store.buffers[k][self.idx] = v
+
+    def __iter__(self):
+        for buf in self.store.buffers:
+            yield buf[self.idx]
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return list(self)
+
+
+@SequenceSheet.api
+def compactRows(sheet):
+    'Move the values of all rows into compact per-column buffers, according to the current column types.'
+    if sheet._deferredAdds or sheet._deferredMods or sheet._deferredDels:
+        vd.fail('commit or discard changes before compacting rows')
+
+    oldrows = sheet.rows
+    nrows = len(oldrows)
+    ncols = max((c.expr+1 for c in sheet.columns if isinstance(c.expr, int)), default=0)
+
+    coltypes = [None]*ncols
+    for c in sheet.columns:
+        if isinstance(c.expr, int) and coltypes[c.expr] is None:
+            coltypes[c.expr] = c.type
+
+    buffers = []
+    with Progress(gerund='compacting', total=ncols*nrows) as prog:
+        for i in range(ncols):
+            values = [r[i] if i < len(r) else None for r in oldrows]
+            buffers.append(makeBuffer(values, coltypes[i]))
+            prog.addProgress(nrows)
+
+    store = ColumnStore(buffers)
+    newrows = [ColumnarRow(store, i) for i in range(nrows)]
+
+    # carry over everything keyed by rowid
+    newids = {sheet.rowid(oldr): newr for oldr, newr in zip(oldrows, newrows)}
+    sheet._selectedRows = SelectedRows((sheet.rowid(newids[k]), newids[k]) for k in sheet._selectedRows if k in newids)
+    for c in sheet.columns:
+        if isinstance(c, SettableColumn):
+            c._store = {sheet.rowid(newids[k]):v for k, v in c._store.items() if k in newids}
+
+    sheet.rows[:] = newrows
+    sheet.recalc()
+
+    vd.status(f'compacted {nrows} {sheet.rowtype} into {ncols} columns ({store.nbytes//1024} KiB)')
+
+
+@SequenceSheet.after
+def afterLoad(sheet):
+    if sheet.options.load_columnar and isinstance(sheet.rows, list) and sheet.rows:
+        sheet.compactRows()
+
+
+SequenceSheet.addCommand('', 'compact-rows', 'compactRows()', 'compact rows into per-column buffers using current column types, to reduce memory')
+
+vd.addMenuItems('''
+    Data > Compact rows > compact-rows
+''')
+
+vd.addGlobals(
+    ColumnarRow=ColumnarRow,
+    ColumnStore=ColumnStore,
+)
@@ -10,6 +10,12 @@ in the sheet.
 If key columns *are* specified, then duplicates are detected based on the
 values in just those columns.
 
+Each row is remembered by a 64-bit fingerprint of its values, and the index of
+the first row with it; rows with the same fingerprint are compared by their
+values.  If the fingerprints take more than `options.dedupe_memory_mb`, they
+are partitioned into temp files by fingerprint, and each partition is
+deduplicated separately.
+
 ## Commands
 
 - `select-duplicate-rows` sets the selection status in VisiData to `selected`
@@ -17,56 +23,185 @@ values in just those columns.
 
 - `dedupe-rows` pushes a new sheet in which only non-duplicate rows in the
   active sheet are included.
+
+- `dedupe-rows-last` is like `dedupe-rows`, but keeps the last row of each
+  group of duplicates instead of the first.
+
+- `open-duplicate-groups` pushes a new sheet with the values and number of
+  rows of each group of duplicate rows.
 """
 
 
 __author__ = "Jeremy Singer-Vine <jsvine@gmail.com>"
 
+import array
+import tempfile
 from copy import copy
 
-from visidata import Sheet, BaseSheet, asyncthread, Progress, vd
+from visidata import Sheet, BaseSheet, ColumnItem, SubColumnItem, asyncthread, Progress, vd
+
+
+vd.option('dedupe_memory_mb', 0, 'approximate memory budget in MB for dedupe fingerprints; spill partitions to temp files when exceeded (0 for no limit)')
+
+
+class DedupeMemoryExceeded(Exception):
+    pass
+
+
+def fingerprint(vals):
+    'Return 64-bit fingerprint of tuple *vals*.'
+    try:
+        return hash(vals)
+    except TypeError:  # unhashable values
+        return hash(repr(vals))
+
+
+class Deduper:
+    """Find duplicate rows of *sheet* by the values in *cols*, keeping the first (or with keep='last', the last) row of each group.
+
+    Only a fingerprint and the index of the kept row are remembered for each distinct row.
+    Rows with the same fingerprint are compared by their values, so a collision of fingerprints never marks a row as a duplicate."""
+    entrysize = 120  # approximate bytes for each fingerprint in memory
+    maxparts = 256  # temp files open at once when spilling
+
+    def __init__(self, sheet, cols, keep='first', budget=0, countGroups=False):
+        self.sheet = sheet
+        self.cols = cols
+        self.rows = sheet.rows
+        self.keep = keep
+        self.budget = budget
+        self.isdupe = bytearray(len(self.rows))  # [rowidx] -> 1 if duplicate
+        self.countGroups = countGroups
+        self.counts = {}  # [kept rowidx] -> number of rows in group, for groups of more than one (if countGroups)
+        self.spilled = False
+
+    def keyvals(self, i):
+        r = self.rows[i]
+        return tuple(col.getValue(r) for col in self.cols)
+
+    def order(self):
+        'Return row indexes in order of scanning: the kept row of a group is the first one scanned.'
+        n = len(self.rows)
+        return range(n-1, -1, -1) if self.keep == 'last' else range(n)
+
+    def scan(self, records, budget=0):
+        """Mark duplicates among *records* of (rowidx, vals or None, fingerprint), in order of scanning.
+        Raise DedupeMemoryExceeded if the fingerprints take more than *budget* bytes."""
+        isdupe, counts, countGroups = self.isdupe, self.counts, self.countGroups
+        kept = {}  # [fingerprint] -> kept rowidx
+        exact = {}  # [repr(vals)] -> kept rowidx, for rows whose fingerprint was kept for different values
+        for i, vals, fp in records:
+            j = kept.setdefault(fp, i)
+            if j == i:
+                if budget and len(kept)*self.entrysize > budget:
+                    raise DedupeMemoryExceeded()
+                continue
+            if vals is None:
+                vals = self.keyvals(i)
+            if self.keyvals(j) != vals:  # collision of fingerprints
+                j = exact.setdefault(repr(vals), i)
+                if j == i:
+                    continue
+            isdupe[i] = 1
+            if countGroups:
+                counts[j] = counts.get(j, 1) + 1
+
+    def iterrecords(self, prog):
+        for i in self.order():
+            vals = self.keyvals(i)
+            prog.addProgress(1)
+            yield i, vals, fingerprint(vals)
+
+    def partition(self, nparts, prog):
+        'Write (rowidx, fingerprint) for all rows into *nparts* temp files by fingerprint, in order of scanning.  Return list of files.'
+        files = [tempfile.TemporaryFile() for _ in range(nparts)]
+        bufs = [array.array('q') for _ in range(nparts)]
+        for i, vals, fp in self.iterrecords(prog):
+            buf = bufs[fp % nparts]
+            buf.append(i)
+            buf.append(fp)
+            if len(buf) >= 8192:
+                buf.tofile(files[fp % nparts])
+                del buf[:]
+
+        for fp, buf in zip(files, bufs):
+            buf.tofile(fp)
+            fp.seek(0)
+        return files
+
+    def readPartition(self, fp):
+        'Generate (rowidx, None, fingerprint) for all records in partition file *fp*.'
+        while True:
+            buf = array.array('q', fp.read(8*8192))
+            if not buf:
+                break
+            for k in range(0, len(buf), 2):
+                yield buf[k], None, buf[k+1]
+        fp.close()
+
+    def run(self):
+        'Mark all duplicate rows.  Return self.'
+        nrows = len(self.rows)
+        try:
+            with Progress(gerund='deduplicating', total=nrows) as prog:
+                self.scan(self.iterrecords(prog), self.budget)
+        except DedupeMemoryExceeded:
+            self.spilled = True
+            self.isdupe = bytearray(nrows)
+            self.counts = {}
+            nparts = min(max(2, int(self.entrysize*nrows/self.budget)+1), self.maxparts)
+            vd.status(f'dedupe exceeds memory budget; spilling to {nparts} partitions')
+            with Progress(gerund='partitioning', total=nrows) as prog:
+                files = self.partition(nparts, prog)
+
+            with Progress(gerund='deduplicating', total=nparts) as prog:
+                for fp in files:
+                    self.scan(self.readPartition(fp))
+                    prog.addProgress(1)
+        return self
+
+    def groups(self):
+        'Return list of (kept rowidx, number of rows) for each group of duplicates, in sheet order.'
+        return sorted(self.counts.items())
+
+
+def dedupe_cols(sheet):
+    'Return the columns which determine duplicates; see note in Usage section above.'
+    if not sheet.keyCols:
+        vd.warning("No key cols specified. Using all columns.")
+        return sheet.visibleCols
+    return sheet.keyCols
 
 
-def gen_identify_duplicates(sheet):
+def gen_identify_duplicates(sheet, keep='first'):
     """
     Takes a sheet, and returns a generator yielding a tuple for each row
     encountered. The tuple's structure is `(row_object, is_dupe)`, where
-    is_dupe is True/False.
+    is_dupe is True/False.  With `keep='last'`, the last row of each group of
+    duplicates is not a dupe, instead of the first.
 
     See note in Usage section above regarding how duplicates are determined.
     """
-
-    keyCols = sheet.keyCols
-
-    cols_to_check = None
-    if len(keyCols) == 0:
-        vd.warning("No key cols specified. Using all columns.")
-        cols_to_check = sheet.visibleCols
-    else:
-        cols_to_check = sheet.keyCols
-
-    seen = set()
-    for r in sheet.rows:
-        vals = tuple(col.getValue(r) for col in cols_to_check)
-        is_dupe = vals in seen
-        if not is_dupe:
-            seen.add(vals)
-        yield (r, is_dupe)
+    budget = sheet.options.dedupe_memory_mb*1024*1024
+    deduper = Deduper(sheet, dedupe_cols(sheet), keep=keep, budget=budget).run()
+    for r, is_dupe in zip(deduper.rows, deduper.isdupe):
+        yield (r, bool(is_dupe))
 
 
 @Sheet.api
 @asyncthread
-def select_duplicate_rows(sheet, duplicates=True):
+def select_duplicate_rows(sheet, duplicates=True, keep='first'):
     """
     Given a sheet, sets the selection status in VisiData to `selected` for each
-    row that is a duplicate of a prior row.
+    row that is a duplicate of a prior row (or with `keep='last'`, of a later
+    row).
 
     If `duplicates = False`, then the behavior is reversed; sets the selection
     status to `selected` for each row that is *not* a duplicate.
     """
     before = len(sheet.selectedRows)
 
-    gen = gen_identify_duplicates(sheet)
+    gen = gen_identify_duplicates(sheet, keep=keep)
     prog = Progress(gen, gerund="selecting", total=sheet.nRows)
 
     for row, is_dupe in prog:
@@ -81,10 +216,11 @@ def select_duplicate_rows(sheet, duplicates=True):
 
 
 @Sheet.api
-def dedupe_rows(sheet):
+def dedupe_rows(sheet, keep='first'):
     """
     Given a sheet, pushes a new sheet in which only non-duplicate rows are
-    included.
+    included.  With `keep='last'`, the last row of each group of duplicates
+    is included instead of the first.
     """
     vs = copy(sheet)
     vs.name += "_deduped"
@@ -92,7 +228,7 @@ def dedupe_rows(sheet):
     @asyncthread
     def _reload(self=vs):
         self.rows = []
-        gen = gen_identify_duplicates(sheet)
+        gen = gen_identify_duplicates(sheet, keep=keep)
         prog = Progress(gen, gerund="deduplicating", total=sheet.nRows)
         for row, is_dupe in prog:
             if not is_dupe:
@@ -102,18 +238,54 @@ def dedupe_rows(sheet):
     return vs
 
 
+class DuplicateGroupsSheet(Sheet):
+    'Values and number of rows of each group of duplicate rows in the source sheet.'
+    rowtype = 'groups'  # rowdef: [kept row, number of rows]
+
+    def loader(self):
+        srccols = dedupe_cols(self.source)
+        self.columns = []
+        for i, c in enumerate(srccols):
+            self.addColumn(SubColumnItem(0, c), index=i)
+        self.setKeys(self.columns)
+        self.addColumn(ColumnItem('count', 1, type=int))
+
+        budget = self.source.options.dedupe_memory_mb*1024*1024
+        deduper = Deduper(self.source, srccols, budget=budget, countGroups=True).run()
+        self.rows = [[deduper.rows[i], n] for i, n in deduper.groups()]
+
+    def openRow(self, row):
+        'open copy of source sheet with the rows in this group'
+        vs = copy(self.source)
+        vs.name += "_duplicates"
+        vals = [c.getValue(row) for c in self.keyCols]
+        vs.rows = [r for r in self.source.rows if [c.origcol.getValue(r) for c in self.keyCols] == vals]
+        return vs
+
+
 # Add longname-commands to VisiData to execute these methods
 BaseSheet.addCommand(None, "select-duplicate-rows", "sheet.select_duplicate_rows()", "select each row that is a duplicate of a prior row")
 BaseSheet.addCommand(None, "dedupe-rows", "vd.push(sheet.dedupe_rows())", "open new sheet in which only non-duplicate rows in the active sheet are included")
+BaseSheet.addCommand(None, "dedupe-rows-last", "vd.push(sheet.dedupe_rows(keep='last'))", "open new sheet with only the last row of each group of duplicate rows in the active sheet")
+BaseSheet.addCommand(None, "open-duplicate-groups", "vd.push(DuplicateGroupsSheet(sheet.name, 'duplicates', source=sheet))", "open sheet with the values and number of rows of each group of duplicate rows in the active sheet")
 
 vd.addMenuItems('''
     Row > Select > duplicate rows > select-duplicate-rows
-    Data > Deduplicate rows > dedupe-rows
+    Data > Deduplicate rows > keep first > dedupe-rows
+    Data > Deduplicate rows > keep last > dedupe-rows-last
+    Data > Deduplicate rows > group sizes > open-duplicate-groups
 ''')
 
+vd.addGlobals(DuplicateGroupsSheet=DuplicateGroupsSheet)
+
 """
 # Changelog
 
+## 0.3.0 - 2026-10-17
+
+Remember fingerprints instead of all values, spill to temp files over
+`options.dedupe_memory_mb`; add `dedupe-rows-last` and `open-duplicate-groups`.
+
 ## 0.2.0 - 2021-09-22
 
 Use `vd.warning(...)` instead of `warning(...)`
@@ -1,11 +1,17 @@
+import collections
+import math
+import random
 from copy import copy
-from statistics import mode, median, mean, stdev
+from statistics import mode, median
 
-from visidata import vd, Column, ColumnAttr, vlen, RowColorizer, asyncthread, Progress, wrapply
+from visidata import vd, Column, ColumnAttr, vlen, RowColorizer, asyncthread, Progress, wrapply, TypedExceptionWrapper
 from visidata import BaseSheet, TableSheet, ColumnsSheet, SheetsSheet
+from visidata.aggregators import ValuesState, HyperLogLogState
 
 
 vd.option('describe_aggrs', 'mean stdev', 'numeric aggregators to calculate on Describe sheet', help=vd.help_aggregators)
+vd.option('describe_distinct_max', 10000, 'distinct values to count per column on Describe sheet; beyond this, distinct is estimated and mode is among the values counted until then', max_help=-1)
+vd.option('describe_sample_size', 10000, 'values to keep per column on Describe sheet for median and other aggregators without a streaming state; beyond this, a random sample is kept', max_help=-1)
 
 
 @Column.api
@@ -20,6 +26,223 @@ def isError(col, row):
         return True
 
 
+class RowBitmap:
+    'Set of rows from the list *rows*, as one bit per row index.  Iterates over its rows in order.'
+    def __init__(self, rows):
+        self.rows = rows
+        self.bits = None  # allocated on first add()
+        self.n = 0
+
+    def add(self, i):
+        if self.bits is None:
+            self.bits = bytearray((len(self.rows)+7)//8)
+        b = 1 << (i & 7)
+        if not self.bits[i >> 3] & b:
+            self.bits[i >> 3] |= b
+            self.n += 1
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        if not self.bits:
+            return
+        rows = self.rows
+        for j, byte in enumerate(self.bits):
+            if byte:
+                for k in range(8):
+                    if byte & (1 << k):
+                        yield rows[j*8+k]
+
+
+class ValueSample(list):
+    'Uniform random sample of up to *size* values, out of all values given to *extend()*, using reservoir sampling (Algorithm L).  Has all values, in order, if there are no more than *size*.'
+    def __init__(self, size, seed=0):
+        super().__init__()
+        self.size = size
+        self.nseen = 0
+        self.random = random.Random(seed)
+        self.w = 1.0
+        self.nextidx = size-1  # index of the next value to replace a random one in the sample, once full
+
+    def _skip(self):
+        self.w *= math.exp(math.log(self.random.random() or 0.5)/self.size)
+        self.nextidx += math.floor(math.log(self.random.random() or 0.5)/math.log(1-self.w)) + 1
+
+    def extend(self, vals):
+        room = self.size - len(self)
+        if room > 0:
+            super().extend(vals[:room])
+            if len(self) == self.size:
+                self._skip()
+
+        if len(self) == self.size:
+            while self.nextidx < self.nseen + len(vals):
+                self[self.random.randrange(self.size)] = vals[self.nextidx - self.nseen]
+                self._skip()
+
+        self.nseen += len(vals)
+
+
+_getValueError = object()  # in place of the value of a row whose getValue raised
+
+
+class ColumnDescription:
+    '''Statistics over the values of *srccol* in *rows*, given a batch of rows at a time with *addRows()*.
+    Keeps running results and counts, and a sample of values for the median and other aggregators without a streaming state.'''
+    def __init__(self, srccol, rows, aggrnames=[]):
+        self.col = srccol
+        self.numeric = vd.isNumeric(srccol)
+        self.errors = RowBitmap(rows)
+        self.nulls = RowBitmap(rows)
+        self.nullvals = set()  # distinct null values
+        self.counts = collections.Counter()  # [typed value] -> count, for distinct and mode
+        self.countsError = None  # if values could not be counted
+        self.hll = None  # HyperLogLogState to estimate distinct, once counts is full
+        self.distinctMax = srccol.sheet.options.describe_distinct_max
+        self.nvals = 0
+        self.sample = ValueSample(srccol.sheet.options.describe_sample_size)
+        self.running = {}  # [func] -> running result or Exception
+        self.aggrs = []  # list of (aggrname, Aggregator, AggregatorState or None)
+        if self.numeric:
+            for aggrname in aggrnames:
+                aggr = vd.aggregators[aggrname]
+                st = aggr.state() if aggr.state else None
+                if isinstance(st, ValuesState):
+                    st = None  # computed over sample
+                self.aggrs.append((aggrname, aggr, st))
+
+    def addRows(self, rows, start, isNull):
+        'Take *rows*, starting at index *start* in all rows.'
+        getValue = self.col.getValue
+        try:
+            raws = self.col.getRowValues(rows)
+        except Exception:
+            raws = []
+            for i, r in enumerate(rows, start):
+                try:
+                    raws.append(getValue(r))
+                except Exception:
+                    self.errors.add(i)
+                    raws.append(_getValueError)
+
+        typ = self.col.type
+        vals = []  # typed non-null values
+        idxs = []  # [i] -> index of row for vals[i]
+        for i, v in enumerate(raws, start):
+            if v is _getValueError:
+                continue
+            if isNull(v):
+                self.nulls.add(i)
+                try:
+                    self.nullvals.add(v)
+                except TypeError:
+                    self.errors.add(i)
+                continue
+            try:
+                vals.append(typ(v))
+                idxs.append(i)
+            except Exception:
+                self.errors.add(i)
+
+        self.nvals += len(vals)
+        self.count(vals, idxs)
+        self.sample.extend(vals)
+
+        if self.numeric and vals:
+            self.accumulate(min, vals, lambda prev, v: min(prev, v))
+            self.accumulate(max, vals, lambda prev, v: max(prev, v))
+            self.accumulate(sum, vals, None)
+            for aggrname, aggr, st in self.aggrs:
+                if st is not None:
+                    st.updateValues(vals)
+
+    def count(self, vals, idxs):
+        'Count *vals* (of rows at *idxs*) for distinct and mode.'
+        try:
+            self._count(vals)
+        except TypeError:  # unhashable values cannot be counted, and are errors
+            for k, v in enumerate(vals):
+                try:
+                    hash(v)
+                except TypeError:
+                    break
+            for v, i in zip(vals[k:], idxs[k:]):  # vals[:k] have been counted
+                try:
+                    hash(v)
+                except TypeError as e:
+                    self.errors.add(i)
+                    self.countsError = e
+                    continue
+                self._count([v])
+
+        if self.hll is None and len(self.counts) > self.distinctMax:
+            self.hll = HyperLogLogState()
+            for v in self.counts:
+                self.hll.update(v)
+
+    def _count(self, vals):
+        counts = self.counts
+        if self.hll is None:
+            counts.update(vals)
+        else:  # only count values already counted, and estimate distinct
+            for v in vals:
+                if v in counts:
+                    counts[v] += 1
+                self.hll.update(v)
+
+    def accumulate(self, func, vals, combine):
+        'Update running result of *func* over all values with the list *vals*, using *combine(prev, result)*; with None, as *func(vals, prev)*.'
+        prev = self.running.get(func, None)
+        if isinstance(prev, Exception):
+            return
+        try:
+            if combine is None:
+                self.running[func] = func(vals, 0 if prev is None else prev)
+            elif prev is None:
+                self.running[func] = func(vals)
+            else:
+                self.running[func] = combine(prev, func(vals))
+        except Exception as e:
+            self.running[func] = e
+
+    def result(self, func):
+        'Return *func* over all values like wrapply(func, values), using its running result.'
+        if self.nvals == 0:
+            return wrapply(func, [])
+        r = self.running[func]
+        if isinstance(r, Exception):
+            return TypedExceptionWrapper(func, exception=r)
+        return r
+
+    def distinct(self):
+        if self.hll is not None:
+            return self.hll.value() + len(self.nullvals)
+        return len(self.counts) + sum(1 for v in self.nullvals if v not in self.counts)
+
+    def mode(self):
+        if self.countsError is not None:
+            return TypedExceptionWrapper(mode, exception=self.countsError)
+        if not self.counts:
+            return wrapply(mode, [])
+        return self.counts.most_common(1)[0][0]
+
+    def describeData(self):
+        'Return dict of statistics, by name of DescribeColumn.'
+        d = dict(errors=self.errors, nulls=self.nulls, distinct=self.distinct(), mode=self.mode())
+        if self.numeric:
+            for func in [min, max, sum]:
+                d[func.__name__] = self.result(func)
+            d['median'] = wrapply(median, self.sample)
+            for aggrname, aggr, st in self.aggrs:
+                if st is None or self.nvals == 0:
+                    d[aggrname] = wrapply(aggr.funcValues, self.sample)
+                else:
+                    r = st.value()
+                    d[aggrname] = TypedExceptionWrapper(aggr.funcValues, exception=r) if isinstance(r, Exception) else r
+        return d
+
+
 class DescribeColumn(Column):
     def __init__(self, name, **kwargs):
         kwargs.setdefault('width', 10)
@@ -53,6 +276,7 @@ class DescribeSheet(ColumnsSheet):
         RowColorizer(7, 'color_key_col', lambda s,c,r,v: r and r in r.sheet.keyCols),
     ]
     nKeys = 2
+    batchRows = 10000  # rows to take at a time for all columns
 
     def loader(self):
         super().loader()
@@ -63,50 +287,39 @@ class DescribeSheet(ColumnsSheet):
         for aggrname in vd.options.describe_aggrs.split():
             self.addColumn(DescribeColumn(aggrname, type=float))
 
-        for srccol in Progress(self.rows, 'categorizing'):
-            if not srccol.hidden:
-                self.reloadColumn(srccol)
+        srccols = collections.defaultdict(list)  # [sheet] -> list of columns from that sheet
+        for srccol in self.rows:
+            srccols[srccol.sheet].append(srccol)
+
+        for cols in Progress(srccols.values(), 'categorizing'):
+            self.describeColumns(cols)
 
     def reloadColumn(self, srccol):
-            d = self.describeData[srccol]
-            isNull = srccol.sheet.isNullFunc()
+        self.describeColumns([srccol])
 
-            vals = list()
-            d['errors'] = list()
-            d['nulls'] = list()
-            d['distinct'] = set()
+    def describeColumns(self, srccols):
+        'Calculate statistics for *srccols*, all from the same sheet, in one pass over the rows of that sheet.'
+        srcsheet = srccols[0].sheet
+        rows = copy(srcsheet.rows)
+        isNull = srcsheet.isNullFunc()
+        descs = [ColumnDescription(c, rows, vd.options.describe_aggrs.split()) for c in srccols]
 
-            for sr in Progress(srccol.sheet.rows, 'calculating'):
-                try:
-                    v = srccol.getValue(sr)
-                    if isNull(v):
-                        d['nulls'].append(sr)
-                    else:
-                        v = srccol.type(v)
-                        vals.append(v)
-                    d['distinct'].add(v)
-                except Exception as e:
-                    d['errors'].append(sr)
-
-            d['mode'] = self.calcStatistic(d, mode, vals)
-            if vd.isNumeric(srccol):
-                for func in [min, max, sum, median]:  # use type
-                    d[func.__name__] = self.calcStatistic(d, func, vals)
-                for aggrname in vd.options.describe_aggrs.split():
-                    aggr = vd.aggregators[aggrname].funcValues
-                    d[aggrname] = self.calcStatistic(d, aggr, vals)
-
-    def calcStatistic(self, d, func, *args, **kwargs):
-        r = wrapply(func, *args, **kwargs)
-        d[func.__name__] = r
-        return r
+        with Progress(gerund='calculating', total=len(rows)) as prog:
+            for start in range(0, len(rows), self.batchRows):
+                batch = rows[start:start+self.batchRows]
+                for desc in descs:
+                    desc.addRows(batch, start, isNull)
+                prog.addProgress(len(batch))
+
+        for desc in descs:
+            self.describeData[desc.col] = desc.describeData()
 
     def openCell(self, col, row):
         'open copy of source sheet with rows described in current cell'
         val = col.getValue(row)
-        if isinstance(val, list):
+        if isinstance(val, (list, RowBitmap)):
             vs=copy(row.sheet)
-            vs.rows=val
+            vs.rows=list(val)
             vs.name+="_%s_%s"%(row.name,col.name)
             return vs
         vd.warning(val)
@@ -1,11 +1,10 @@
-import collections
-from visidata import Column, Sheet, VisiData, ColumnItem, Progress, TypedExceptionWrapper, SettableColumn
+from visidata import Column, Sheet, VisiData, ColumnItem, Progress, TypedExceptionWrapper, SettableColumn, ColumnCache
 from visidata import asyncthread, vd
 
 
 @Column.api
 def resetCache(col):
-    col._cachedValues = collections.OrderedDict()
+    col._cachedValues = ColumnCache(col)
     vd.status("reset cache for " + col.name)
 
 
@@ -20,11 +19,8 @@ def freeze_col(sheet, col):
     @asyncthread
     def calcRows_async(frozencol, rows, col):
         # no need to undo, addColumn undo is enough
-        for r in Progress(rows, 'calculating'):
-            try:
-                frozencol.putValue(r, col.getTypedValue(r))
-            except Exception as e:
-                frozencol.putValue(r, e)
+        for r, v in Progress(zip(rows, col.getTypedValues(rows)), 'calculating', total=len(rows)):
+            frozencol.putValue(r, v)
 
     calcRows_async(frozencol, sheet.rows, col)
     return frozencol
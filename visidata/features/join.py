@@ -1,10 +1,16 @@
 import collections
 import itertools
 import functools
+import pickle
+import sys
+import tempfile
 from copy import copy
 
 from visidata import vd, VisiData, asyncthread, Sheet, Progress, IndexSheet, Column, CellColorizer, ColumnItem, SubColumnItem, TypedWrapper, ColumnsSheet, AttrDict
 
+vd.option('join_sorted', False, 'assume all joined sheets are sorted ascending by the displayed values of their key columns, and use a streaming merge join')
+vd.option('join_memory_mb', 0, 'approximate memory budget in MB for join hash tables; spill partitions to temp files when exceeded (0 for no limit)')
+
 vd.help_join = '# Join Help\nHELPTODO'
 
 @VisiData.api
@@ -126,6 +132,254 @@ def groupRowsByKey(sheets:dict, rowsBySheetKey, rowsByKey):
                     ]
 
 
+def joinrowtype(sheets):
+    'Return a tuple subclass for joined rows: one source row (or None) per sheet in *sheets*, in order.  Items can also be indexed by source sheet.'
+    sheetidx = {vs:i for i, vs in enumerate(sheets)}
+
+    class JoinRow(tuple):
+        __slots__ = ()
+
+        def __getitem__(self, k):
+            if isinstance(k, (int, slice)):
+                return tuple.__getitem__(self, k)
+            return tuple.__getitem__(self, sheetidx[k])
+
+        def keys(self):
+            return sheetidx.keys()
+
+        def values(self):
+            return tuple(self)
+
+        def items(self):
+            return zip(sheetidx.keys(), self)
+
+    return JoinRow
+
+
+class JoinMemoryExceeded(Exception):
+    pass
+
+
+def _keysize(key):
+    'Approximate number of bytes used by a new *key* and its group in the join hash table.'
+    return sys.getsizeof(key) + sum(sys.getsizeof(k) for k in key) + 200
+
+
+class HashJoin:
+    """Hash join of *sheets* on their *sheetKeyCols*, keeping groups of rows by key.
+
+    - build: the rows of the build sheet(s) are grouped by key.
+    - probe: the rows of the other sheets are streamed and only kept if their key can still be part of the output (for inner and outer joins).
+    - emit: for each key, in order of first appearance, the product of the matching rows from each sheet is generated as a compact row tuple.
+
+    If the hash table grows past *budget* bytes, all keys and row indexes are instead partitioned by hash into temp files, and each partition is joined separately."""
+    def __init__(self, sheetKeyCols:dict, jointype:str, budget:int=0):
+        self.sheets = list(sheetKeyCols.keys())
+        self.sheetKeyCols = sheetKeyCols
+        self.jointype = jointype
+        self.budget = budget
+        self.rowtype = joinrowtype(self.sheets)
+        self.spilled = False
+
+    def keyFilter(self):
+        'Return (build sheet indexes, func(key, groups) for whether a probe row with key should be kept).'
+        n = len(self.sheets)
+        if self.jointype == 'inner':
+            smallest = min(range(n), key=lambda i: len(self.sheets[i].rows))
+            return [smallest], lambda key, groups: key in groups
+        elif self.jointype == 'outer':
+            return [0], lambda key, groups: key in groups
+        return list(range(n)), None
+
+    def keepGroup(self, group):
+        'Return True if rows for the key with *group* (list of row lists per sheet) should be emitted for this jointype.'
+        if self.jointype == 'inner':
+            return all(group)
+        elif self.jointype == 'outer':
+            return bool(group[0])
+        elif self.jointype == 'diff':
+            return not all(group)
+        return self.jointype in ('full', 'merge')
+
+    def iterkeys(self, sheetnum, prog):
+        'Generate (rowidx, key) for each row in sheet *sheetnum*.'
+        vs = self.sheets[sheetnum]
+        keycols = self.sheetKeyCols[vs]
+        for i, r in enumerate(vs.rows):
+            prog.addProgress(1)
+            yield i, joinkey(keycols, r)
+
+    def scanOrder(self):
+        buildnums, keep = self.keyFilter()
+        return buildnums + [i for i in range(len(self.sheets)) if i not in buildnums], set(buildnums), keep
+
+    def group(self, prog):
+        'Return dict of [key] -> [firstpos, rowidxs_sheet0, rowidxs_sheet1, ...].  Raise JoinMemoryExceeded if over budget.'
+        n = len(self.sheets)
+        groups = {}
+        nbytes = 0
+        order, buildnums, keep = self.scanOrder()
+        for sheetnum in order:
+            for i, key in self.iterkeys(sheetnum, prog):
+                g = groups.get(key)
+                if g is None:
+                    if sheetnum not in buildnums and keep and not keep(key, groups):
+                        continue
+                    g = groups[key] = [(sheetnum, i)] + [[] for _ in range(n)]
+                    nbytes += _keysize(key)
+                elif (sheetnum, i) < g[0]:
+                    g[0] = (sheetnum, i)
+                g[sheetnum+1].append(i)
+                nbytes += 8
+
+                if self.budget and nbytes > self.budget:
+                    self.nbytes = nbytes
+                    raise JoinMemoryExceeded()
+        return groups
+
+    def emit(self, groups, prog=None):
+        'Generate (firstpos, joinrow) for each key in *groups*, in order of first appearance.'
+        allrows = [vs.rows for vs in self.sheets]
+        for firstpos, *rowidxs in sorted(groups.values(), key=lambda g: g[0]):
+            if prog:
+                prog.addProgress(1)
+            if not self.keepGroup(rowidxs):
+                continue
+            for combo in itertools.product(*[[allrows[j][i] for i in idxs] or [None] for j, idxs in enumerate(rowidxs)]):
+                yield firstpos, self.rowtype(combo)
+
+    def partition(self, nparts, prog):
+        'Write (key, sheetnum, rowidx) for all rows into *nparts* temp files by hash of key.  Return list of files.'
+        files = [tempfile.TemporaryFile() for _ in range(nparts)]
+        bufs = [[] for _ in range(nparts)]
+        for sheetnum in range(len(self.sheets)):
+            for i, key in self.iterkeys(sheetnum, prog):
+                p = hash(key) % nparts
+                bufs[p].append((key, sheetnum, i))
+                if len(bufs[p]) >= 4096:
+                    pickle.dump(bufs[p], files[p])
+                    bufs[p].clear()
+
+        for fp, buf in zip(files, bufs):
+            if buf:
+                pickle.dump(buf, fp)
+            fp.seek(0)
+        return files
+
+    def readPartition(self, fp):
+        'Return groups for all records in partition file *fp*, in the same format as group().'
+        n = len(self.sheets)
+        groups = {}
+        while True:
+            try:
+                records = pickle.load(fp)
+            except EOFError:
+                break
+            for key, sheetnum, i in records:
+                g = groups.get(key)
+                if g is None:
+                    g = groups[key] = [(sheetnum, i)] + [[] for _ in range(n)]
+                elif (sheetnum, i) < g[0]:
+                    g[0] = (sheetnum, i)
+                g[sheetnum+1].append(i)
+        fp.close()
+        return groups
+
+    def iterjoin(self):
+        'Generate (firstpos, joinrow) for the join; firstpos orders the rows like an in-memory join.'
+        nrows = sum(len(vs.rows) for vs in self.sheets)
+        try:
+            with Progress(gerund='grouping', total=nrows) as prog:
+                groups = self.group(prog)
+        except JoinMemoryExceeded:
+            self.spilled = True
+            nparts = max(2, int(self.nbytes/prog.made*nrows/self.budget)+1)
+            vd.status(f'join exceeds memory budget; spilling to {nparts} partitions')
+            with Progress(gerund='partitioning', total=nrows) as prog:
+                files = self.partition(nparts, prog)
+
+            with Progress(gerund='joining', total=nparts) as prog:
+                for fp in files:
+                    yield from self.emit(self.readPartition(fp))
+                    prog.addProgress(1)
+            return
+
+        with Progress(gerund='joining', total=len(groups)) as prog:
+            yield from self.emit(groups, prog)
+
+
+def sortedKeyDirections(vs, keycols):
+    'Return list of reverse flags for *keycols* if *vs* is ordered by *keycols* first, otherwise None.'
+    ordering = [(vs.column(c) if isinstance(c, str) else c, reverse) for c, reverse in vs._ordering]
+    if [c for c, _ in ordering[:len(keycols)]] != list(keycols):
+        return None
+    return [reverse for _, reverse in ordering[:len(keycols)]]
+
+
+class MergeJoinUnsorted(Exception):
+    'Raised by MergeJoin when a sheet is found not to be in key order after all.'
+
+
+def displayKeyLessThan(a, b, reverses):
+    'Return True if display key *a* comes before display key *b*, with each key part descending if its flag in *reverses* is set.'
+    for x, y, reverse in zip(a, b, reverses):
+        if x != y:
+            return (y < x) if reverse else (x < y)
+    return False
+
+
+class MergeJoin(HashJoin):
+    """Merge join of *sheets* which are all sorted by their key columns in the same directions (*reverses*).
+
+    Rows are read in order from every sheet at once, one run of equal keys at a time, so no hash table is needed and joined rows are generated as soon as each key is complete.  Keys are the same display values that HashJoin matches on, so the sheets must also be ordered by those; otherwise MergeJoinUnsorted is raised."""
+    def __init__(self, sheetKeyCols:dict, jointype:str, reverses:list):
+        super().__init__(sheetKeyCols, jointype)
+        self.reverses = reverses
+
+    def iterruns(self, sheetnum, prog):
+        'Generate (key, rows) for each run of consecutive rows with equal keys in sheet *sheetnum*.'
+        vs = self.sheets[sheetnum]
+        keycols = self.sheetKeyCols[vs]
+        runkey, run = None, []
+        for r in vs.rows:
+            prog.addProgress(1)
+            key = joinkey(keycols, r)
+            if run and key != runkey:
+                if displayKeyLessThan(key, runkey, self.reverses):
+                    raise MergeJoinUnsorted(f'{vs.name} is not sorted by its key columns')
+                yield runkey, run
+                run = []
+            if not run:
+                runkey = key
+            run.append(r)
+
+        if run:
+            yield runkey, run
+
+    def iterjoin(self):
+        nrows = sum(len(vs.rows) for vs in self.sheets)
+        with Progress(gerund='merging', total=nrows) as prog:
+            its = [self.iterruns(i, prog) for i in range(len(self.sheets))]
+            heads = [next(it, None) for it in its]
+            while any(heads):
+                minkey = None
+                for head in heads:
+                    if head and (minkey is None or displayKeyLessThan(head[0], minkey, self.reverses)):
+                        minkey = head[0]
+
+                group = []
+                for i, head in enumerate(heads):
+                    if head and head[0] == minkey:
+                        group.append(head[1])
+                        heads[i] = next(its[i], None)
+                    else:
+                        group.append([])
+
+                if self.keepGroup(group):
+                    for combo in itertools.product(*[rows or [None] for rows in group]):
+                        yield None, self.rowtype(combo)
+
+
 class JoinKeyColumn(Column):
     def __init__(self, name='', keycols=None, **kwargs):
         super().__init__(name, type=keycols[0].type, width=keycols[0].width, **kwargs)
@@ -169,7 +423,7 @@ class MergeColumn(Column):
 
 
 #### slicing and dicing
-# rowdef: {sheet1:sheet1_row, sheet2:sheet2_row, ...}
+# rowdef: JoinRow(sheet1_row, sheet2_row, ...), also indexable as row[sheet1]
 #   if a sheet does not have this key, sheet#_row is None
 class JoinSheet(Sheet):
     'Column-wise join/merge. `jointype` constructor arg should be one of jointypes.'
@@ -211,35 +465,39 @@ class JoinSheet(Sheet):
                       newname = c.name if ctr[c.name] == 1 else '%s_%s' % (vs.name, c.name)
                       self.addColumn(SubColumnItem(vs, c, name=newname))
 
-        rowsBySheetKey = {}   # [sheet] -> { key:list(rows), ... }
-        rowsByKey = {}  # [key] -> [{sheet1:row1, sheet2:row1, ... }, ...]
-
-        groupRowsByKey(self.sheetKeyCols, rowsBySheetKey, rowsByKey)
-
         self.rows = []
 
-        with Progress(gerund='joining', total=len(rowsByKey)) as prog:
-            for k, combinedRows in rowsByKey.items():
-                prog.addProgress(1)
-
-                if self.jointype in ['full', 'merge']:  # keep all rows from all sheets
-                    for combinedRow in combinedRows:
-                        self.addRow(combinedRow)
-
-                elif self.jointype == 'inner':  # only rows with matching key on all sheets
-                    for combinedRow in combinedRows:
-                        if all(r is not None for r in combinedRow.values()):
-                            self.addRow(combinedRow)
-
-                elif self.jointype == 'outer':  # all rows from first sheet
-                    for combinedRow in combinedRows:
-                        if combinedRow[sheets[0]]:
-                            self.addRow(combinedRow)
-
-                elif self.jointype == 'diff':  # only rows without matching key on all sheets
-                    for combinedRow in combinedRows:
-                        if not all(r is not None for r in combinedRow.values()):
-                            self.addRow(combinedRow)
+        hj = None
+        if self.jointype in ['inner', 'outer', 'full', 'diff', 'merge']:
+            dirs = [sortedKeyDirections(vs, cols) for vs, cols in self.sheetKeyCols.items()]
+            # numbers sorted by value are not in order by display value
+            numeric = any(vd.isNumeric(c) for cols in self.sheetKeyCols.values() for c in cols)
+            if dirs[0] is not None and all(d == dirs[0] for d in dirs) and not numeric:
+                hj = MergeJoin(self.sheetKeyCols, self.jointype, dirs[0])
+            elif self.options.join_sorted:
+                hj = MergeJoin(self.sheetKeyCols, self.jointype, [False]*len(dirs[0] or list(self.sheetKeyCols.values())[0]))
+
+        if hj:
+            try:
+                self.addJoinedRows(hj)
+                return
+            except MergeJoinUnsorted as e:
+                vd.warning(f'{e}; joining by hash instead')
+                self.rows = []
+
+        self.addJoinedRows(HashJoin(self.sheetKeyCols, self.jointype, budget=self.options.join_memory_mb*2**20))
+
+    def addJoinedRows(self, hj):
+        'Add the rows generated by join *hj*, in the order of an in-memory hash join if it spilled to disk.'
+        firstposes = []
+        for firstpos, row in hj.iterjoin():
+            self.addRow(row)
+            if hj.spilled:
+                firstposes.append(firstpos)
+
+        if hj.spilled:  # restore the order of an in-memory join
+            order = sorted(range(len(self.rows)), key=firstposes.__getitem__)
+            self.rows[:] = [self.rows[i] for i in order]
 
 
 ## for ExtendedSheet_reload below
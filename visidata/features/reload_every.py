@@ -1,7 +1,9 @@
+import io
 import os
 import time
+from copy import copy
 
-from visidata import vd, BaseSheet, Sheet, asyncthread, Path, ScopedSetattr
+from visidata import vd, BaseSheet, Sheet, SequenceSheet, asyncthread, Path, ScopedSetattr
 
 
 @BaseSheet.api
@@ -15,18 +17,75 @@ def reload_every(sheet, seconds:int):
 @BaseSheet.api
 @asyncthread
 def reload_modified(sheet):
-    'Spawn thread to call sheet.reload_rows when sheet.source mtime has changed.'
+    '''Spawn thread to add the lines appended to sheet.source when its mtime has changed, parsing only the appended bytes.
+    Call sheet.reload_rows instead if the file was replaced or rewritten, or if the sheet cannot parse only the appended lines.'''
     p = sheet.source
     assert isinstance(p, Path)
     assert not p.is_url()
 
-    mtime = os.stat(p).st_mtime
+    st = os.stat(p)
+    mtime = st.st_mtime
+    tail = AppendedLines(str(p), st)
     while True:
         time.sleep(1)
-        t = os.stat(p).st_mtime
-        if t != mtime:
-            mtime = t
-            sheet.reload_rows()
+        st = os.stat(p)
+        if st.st_mtime != mtime:
+            mtime = st.st_mtime
+            data = None
+            if isinstance(sheet, SequenceSheet) and not p.compression:
+                data = tail.read(st)
+
+            if data is None:
+                vd.sync(sheet.reload_rows())
+                tail = AppendedLines(str(p), os.stat(p))
+            elif data:
+                sheet.loadAppended(data)
+
+
+class AppendedLines:
+    '''Bytes of complete lines appended to the file at *path* since they were last read, starting at the end of the file with stat *st*.
+    The first time, the file is assumed to have been parsed up to its end.'''
+    checksize = 4096  # number of bytes before the offset which must be unchanged
+
+    def __init__(self, path, st):
+        self.path = path
+        self.inode = (st.st_dev, st.st_ino)
+        self.offset = st.st_size  # after the last parsed line
+        self.before = self.readRange(max(0, self.offset-self.checksize), self.offset)
+
+    def readRange(self, start, end):
+        with open(self.path, 'rb') as fp:
+            fp.seek(start)
+            return fp.read(end-start)
+
+    def read(self, st):
+        '''Return bytes of the complete lines after the offset in the file with stat *st*, and move the offset after them.
+        Return None if the file is not the same file with only lines appended.'''
+        if (st.st_dev, st.st_ino) != self.inode or st.st_size < self.offset:
+            return None
+
+        data = self.readRange(max(0, self.offset-self.checksize), st.st_size)
+        n = len(self.before)
+        if data[:n] != self.before:
+            return None
+
+        data = data[n:]
+        end = data.rfind(b'\n')+1  # a partial last line is read when it is complete
+        data = data[:end]
+        if data:
+            self.offset += end
+            self.before = (self.before + data)[-self.checksize:]
+        return data
+
+
+@SequenceSheet.api
+def loadAppended(sheet, data:bytes):
+    'Parse the lines in *data* appended to ``sheet.source``, and add them to *sheet* in sorted position.  Existing rows are kept intact.'
+    vs = copy(sheet)
+    vs.source = Path(sheet.source.given, fp=io.BytesIO(data))
+    newrows = list(vs.iterload())
+    sheet.addSortedRows(newrows)
+    vd.status(f'added {len(newrows)} {sheet.rowtype}')
 
 
 @Sheet.api
@@ -0,0 +1,214 @@
+'''
+Search index for repeated regex searches on large sheets.
+
+With `options.search_index`, the first search in a column starts building
+its index in the background: the displayed text of every row, joined into
+one string with a newline after each row, and the offset where each row
+starts.  Later searches (`/`, `?`, `n`, `N`, `|`, `\\`) in indexed columns
+run the regex over the joined text in one call, and only check the rows
+where it found a match, instead of formatting every cell again.
+
+The index of a column is dropped when the column is recalculated or its
+type, format, or width changes.  Any edit on the sheet drops the indexes
+of all its columns, since other columns may be computed from the edited
+one.  An index is only used until the next command which could change
+cells (like adding, removing, or reordering rows), as counted by
+vd.drawnCellsVersion, and while the sheet has the same number of rows.
+'''
+
+import array
+import bisect
+import functools
+import heapq
+import re
+import threading
+
+from visidata import vd, Sheet, Column, ColumnItem, Progress, asyncthread
+
+
+vd.option('search_index', False, 'build an index of displayed values for each searched column, to make later searches faster', replay=True)
+
+
+class SearchIndex:
+    'Displayed values of *col* for *rows*, in one string.  Valid while vd.drawnCellsVersion is still *version*.'
+    def __init__(self, col, rows, version):
+        self.col = col
+        self.rows = rows
+        self.version = version
+        self.signature = searchSignature(col)
+        self.offsets = array.array('q', [0])  # [rowidx] -> offset of row in text; then len(text)
+        parts = []
+        pos = 0
+        for r in Progress(rows, gerund='indexing'):
+            s = col.getDisplayValue(r)
+            parts.append(s)
+            pos += len(s)+1
+            self.offsets.append(pos)
+        parts.append('')
+        self.text = '\n'.join(parts)
+
+    def isValid(self, sheet):
+        'Return True if the index is still up to date for the column and rows of *sheet*.'
+        return (self.version == vd.drawnCellsVersion and
+                self.rows is sheet.rows and len(self.rows) == len(self.offsets)-1 and
+                self.signature == searchSignature(self.col))
+
+    def value(self, rowidx):
+        return self.text[self.offsets[rowidx]:self.offsets[rowidx+1]-1]
+
+    def matches(self, regex, rowidx):
+        return bool(regex.search(self.value(rowidx)))
+
+    def iterMatches(self, regex, start, end):
+        'Generate indexes of rows between *start* and *end* with values matching *regex*, in order.'
+        prefilter = textRegex(regex)
+        if prefilter is None:
+            for i in range(start, end):
+                if self.matches(regex, i):
+                    yield i
+            return
+
+        offsets = self.offsets
+        pos, endpos = offsets[start], offsets[end]
+        while pos < endpos:
+            m = prefilter.search(self.text, pos, endpos)
+            if not m or m.start() >= endpos:  # empty match at start of next row
+                return
+            i = bisect.bisect_right(offsets, m.start())-1
+            if self.matches(regex, i):  # the match might span rows or not match on its own
+                yield i
+            pos = offsets[i+1]
+
+    def iterMatchesBackward(self, regex, start, end):
+        'Generate indexes of rows between *start* and *end* with values matching *regex*, in reverse order.'
+        n = 1024
+        while end > start:
+            chunkstart = max(start, end-n)
+            yield from reversed(list(self.iterMatches(regex, chunkstart, end)))
+            end = chunkstart
+            n *= 2
+
+
+def searchSignature(col):
+    'Return the attributes of *col* which affect its displayed values.'
+    return (col.type, col.fmtstr, col.formatter, col.width)
+
+
+def textRegex(regex):
+    '''Return *regex* compiled to find matching rows in the joined text of a SearchIndex (where each row ends with a newline), or None if it could miss some.
+    With MULTILINE, ^ and $ match at the start and end of each row.'''
+    if regex.flags & re.DOTALL or re.search(r'\\A|\\Z|\(\?[aiLmux]*s', regex.pattern):
+        return None
+    return compileTextRegex(regex.pattern, regex.flags | re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=10)
+def compileTextRegex(pattern, flags):
+    return re.compile(pattern, flags)
+
+
+Sheet.init('_searchIndexes', dict)  # [col] -> SearchIndex, or None while being built
+
+
+@Sheet.api
+def searchIndex(sheet, col):
+    'Return the valid SearchIndex for *col*, or None.  If there is none, start building it.'
+    idx = sheet._searchIndexes.get(col, None)
+    if idx is not None and idx.isValid(sheet):
+        return idx
+    if col not in sheet._searchIndexes or idx is not None:
+        sheet._searchIndexes[col] = None
+        sheet.buildSearchIndex(col)
+
+
+@Sheet.api
+@asyncthread
+def buildSearchIndex(sheet, col):
+    'Build SearchIndex for *col*.  Async.'
+    rows = sheet.rows
+    if not isinstance(rows, list):
+        return
+    version = vd.drawnCellsVersion
+    if any(t is not threading.current_thread() for t in sheet.currentThreads):
+        version = None  # rows may be changing, so build it again for the next search
+    idx = SearchIndex(col, rows, version)
+    if col in sheet._searchIndexes:  # not dropped while building
+        sheet._searchIndexes[col] = idx
+
+
+@Sheet.api
+def iterMatches(sheet, regex, columns, backward=False):
+    if not sheet.options.search_index:
+        yield from iterMatches.__wrapped__(sheet, regex, columns, backward=backward)
+        return
+
+    indexes = [sheet.searchIndex(c) for c in columns]
+    if None in indexes:
+        yield from iterMatches.__wrapped__(sheet, regex, columns, backward=backward)
+        return
+
+    n = len(sheet.rows)
+    cur = sheet.cursorRowIndex
+    if backward:
+        ranges = [(0, cur), (cur, n)]
+        key = lambda i: -i
+    else:
+        ranges = [(cur+1, n), (0, min(cur+1, n))]
+        key = None
+
+    for rangenum, (start, end) in enumerate(ranges):
+        if rangenum > 0 and start < end:
+            vd.status('search wrapped')
+
+        if backward:
+            its = [idx.iterMatchesBackward(regex, start, end) for idx in indexes]
+        else:
+            its = [idx.iterMatches(regex, start, end) for idx in indexes]
+
+        lastidx = None
+        for rowidx in heapq.merge(*its, key=key):
+            if rowidx == lastidx:  # matched in more than one column
+                continue
+            lastidx = rowidx
+            for c, idx in zip(columns, indexes):
+                if idx.matches(regex, rowidx):
+                    yield rowidx, c
+                    break
+
+
+@Column.after
+def recalc(col, sheet=None):
+    if isinstance(col.sheet, Sheet):
+        col.sheet._searchIndexes.pop(col, None)
+
+
+@Column.after
+def setValue(col, row, val, setModified=True):
+    if isinstance(col.sheet, Sheet):
+        col.sheet._searchIndexes.clear()
+
+
+def test_search_index(vd):
+    vs = Sheet('search', rows=[[f'r{i}', i%7] for i in range(100)])
+    vs.addColumn(ColumnItem('name', 0))
+    vs.addColumn(ColumnItem('n', 1, type=int))
+    vs.options.search_index = True
+    for c in vs.columns:
+        vs.searchIndex(c)
+    vd.sync()
+
+    def matches(regex, backward=False):
+        vs.options.search_index = True
+        ret = list(vs.iterMatches(re.compile(regex), vs.columns, backward=backward))
+        vs.options.search_index = False
+        assert ret == list(vs.iterMatches(re.compile(regex), vs.columns, backward=backward))
+        return [(i, c.name) for i, c in ret]
+
+    vs.cursorRowIndex = 50
+    assert matches('^r1') == [(1, 'name')] + [(i, 'name') for i in range(10, 20)]
+    assert matches('^r1', backward=True)[:2] == [(19, 'name'), (18, 'name')]
+    assert matches('^3$')[:2] == [(52, 'n'), (59, 'n')]
+    assert matches('9') == [(59, 'name'), (69, 'name'), (79, 'name'), (89, 'name'), (90, 'name')] + [(i, 'name') for i in range(91, 100)] + [(9, 'name'), (19, 'name'), (29, 'name'), (39, 'name'), (49, 'name')]
+
+    vs.columns[1].setValue(vs.rows[0], 3)
+    assert not vs._searchIndexes
@@ -0,0 +1,468 @@
+'''
+Indexed loading of large line-oriented files (csv, tsv, jsonl, fixed-width).
+
+With options.load_indexed, a loader scans its local source file once to
+record the byte offset where each row starts, and sets sheet.rows to an
+IndexedRows instead of a list.  Rows are parsed out of the memory-mapped
+file only when they are used (drawn, searched, sorted, aggregated), and the
+last options.indexed_cache_rows rows used are kept parsed.
+
+Rows that are still referenced elsewhere (selected, edited, on the undo
+stack) are returned as the same object, and the sheet's rowid() identifies
+rows by their row number in the file, so they stay identifiable when
+reparsed.  The file is closed when the sheet is reloaded or released.
+
+The row index can be saved next to the source file (as <file>.vdidx) with
+options.indexed_save, and is reused as long as the source has the same
+size and modification time.
+
+The source file must not be changed while the sheet is open.
+'''
+
+import os
+import re
+import sys
+import json
+import mmap
+import array
+import codecs
+import weakref
+import threading
+import itertools
+import collections
+
+from visidata import vd, Sheet, SequenceSheet, Column, ColumnItem, Progress, namedlist, UNLOADED
+
+
+vd.option('load_indexed', False, 'index rows of local csv/tsv/jsonl/fixed-width files by byte offset, and parse them only when used', replay=True)
+vd.option('indexed_cache_rows', 10000, 'number of most recently used rows kept parsed by indexed sheets')
+vd.option('indexed_save', False, 'save row index of indexed sheets to <file>.vdidx, and reuse it while the file is unchanged')
+
+_indexVersion = 1
+
+
+def scanRowStarts(path, start=0, quote=None, skip=None, skipEmpty=False, blocksize=2**24):
+    '''Return array of byte offsets in the file at *path* where rows start, or None if the file cannot be split into rows at newlines.
+    Lines matching the bytes regex *skip*, and empty lines if *skipEmpty*, are not rows.
+    If *quote* is given, lines starting after an odd number of quote bytes continue the previous row.'''
+    starts = array.array('Q')
+    inquote = False
+    pos = start
+    with open(path, 'rb') as fp, Progress(gerund='indexing', total=os.path.getsize(path)) as prog:
+        fp.seek(start)
+        prog.addProgress(start)
+        carry = b''
+        while True:
+            data = fp.read(blocksize)
+            block = carry + data
+            if data:
+                n = block.rfind(b'\n')+1
+                if n == 0:
+                    carry = block
+                    continue
+                block, carry = block[:n], block[n:]
+            elif not block:
+                break
+            else:
+                carry = b''
+
+            if block.count(b'\r') != block.count(b'\r\n'):
+                return None  # newlines other than \n and \r\n
+
+            lines = block.split(b'\n')
+            if block.endswith(b'\n'):
+                lines.pop()
+
+            linestarts = list(itertools.accumulate(itertools.chain([pos], map((1).__add__, map(len, lines)))))  # not initial=pos, which needs Python 3.8
+            pos = linestarts.pop()
+
+            skipped = set()
+            if skip is not None:
+                skipped = set(m.start() for m in skip.finditer(block))
+
+            noquotes = quote is None or (not inquote and quote not in block)
+            if noquotes and not skipped and not skipEmpty:
+                starts.extend(linestarts)
+            else:
+                for linestart, line in zip(linestarts, lines):
+                    if (linestart-linestarts[0]) in skipped:
+                        continue
+                    if skipEmpty and (not line or line == b'\r'):
+                        continue
+                    if not inquote:
+                        starts.append(linestart)
+                    if quote is not None and line.count(quote) % 2:
+                        inquote = not inquote
+
+            prog.addProgress(len(block))
+
+    if inquote:
+        return None  # unbalanced quotes
+    return starts
+
+
+def indexPath(path):
+    return path + '.vdidx'
+
+
+def loadRowIndex(path, params):
+    'Return array of row offsets saved for the file at *path* with the same scan *params*, or None if there is none or the file has changed since.'
+    try:
+        st = os.stat(path)
+        with open(indexPath(path), 'rb') as fp:
+            hdr = json.loads(fp.readline())
+            if hdr != dict(version=_indexVersion, size=st.st_size, mtime_ns=st.st_mtime_ns, byteorder=sys.byteorder, params=params):
+                return None
+            starts = array.array('Q')
+            starts.frombytes(fp.read())
+            return starts
+    except (OSError, ValueError):
+        return None
+
+
+def saveRowIndex(path, starts, params):
+    'Save array of row offsets *starts* for the file at *path* with its scan *params*.'
+    st = os.stat(path)
+    hdr = dict(version=_indexVersion, size=st.st_size, mtime_ns=st.st_mtime_ns, byteorder=sys.byteorder, params=params)
+    try:
+        with open(indexPath(path), 'wb') as fp:
+            fp.write(json.dumps(hdr).encode('utf-8') + b'\n')
+            starts.tofile(fp)
+    except OSError as e:
+        vd.warning(f'could not save row index: {e}')
+
+
+class RowRef(weakref.ref):
+    'Weak reference to a row parsed from an IndexedFile.'
+    __slots__ = ('rowid', 'rownum')
+
+
+class IndexedFile:
+    '''Memory-mapped local file with the byte offsets of its rows, which parses rows when they are used.
+    *parse(lines)* is given an iterator of lines (with universal newlines) from the start of a row, and returns the row.'''
+    def __init__(self, path, starts, parse, encoding, encoding_errors, cachesize):
+        self.path = path
+        self.starts = starts
+        self.parse = parse
+        self.encoding = encoding
+        self.encoding_errors = encoding_errors
+        self.cachesize = cachesize
+
+        self._fp = open(path, 'rb')
+        self._mm = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._lock = threading.RLock()
+        self._recent = collections.OrderedDict()  # [rownum] -> row, most recently used last
+        self._pinned = {}      # [rownum] -> row, modified or not weakly referenceable
+        self._alive = {}       # [rownum] -> RowRef
+        self._rownums = {}     # [id(row)] -> rownum
+
+    def __len__(self):
+        return len(self.starts)
+
+    def close(self):
+        'Close the memory map and the file.  Rows already parsed can still be used and identified.'
+        with self._lock:
+            self._recent.clear()
+            self._mm.close()
+            self._fp.close()
+
+    def lines(self, pos):
+        'Generate decoded lines of the file from byte offset *pos*.'
+        mm = self._mm
+        size = len(mm)
+        while pos < size:
+            end = mm.find(b'\n', pos)
+            end = size if end < 0 else end+1
+            line = mm[pos:end].decode(self.encoding, self.encoding_errors)
+            if line.endswith('\r\n'):
+                line = line[:-2] + '\n'
+            yield line
+            pos = end
+
+    def parseRow(self, rownum):
+        'Return row *rownum* freshly parsed, without keeping it.'
+        return self.parse(self.lines(self.starts[rownum]))
+
+    def row(self, rownum, keep=True):
+        'Return row *rownum*, as the same object as long as it is referenced.  If *keep*, also keep it among the most recently used rows.'
+        with self._lock:
+            ref = self._alive.get(rownum)
+            row = ref() if ref is not None else None
+            if row is None:
+                row = self._pinned.get(rownum)
+            if row is None:
+                row = self.parseRow(rownum)
+                self._register(rownum, row)
+
+            if keep:
+                recent = self._recent
+                recent[rownum] = row
+                recent.move_to_end(rownum)
+                while len(recent) > self.cachesize:
+                    recent.popitem(last=False)
+
+            return row
+
+    def _register(self, rownum, row):
+        self._rownums[id(row)] = rownum
+        try:
+            ref = RowRef(row, self._forget)
+        except TypeError:
+            self._pinned[rownum] = row
+            return
+        ref.rowid = id(row)
+        ref.rownum = rownum
+        self._alive[rownum] = ref
+
+    def _forget(self, ref):
+        with self._lock:
+            if self._rownums.get(ref.rowid) == ref.rownum:
+                del self._rownums[ref.rowid]
+            if self._alive.get(ref.rownum) is ref:
+                del self._alive[ref.rownum]
+
+    def rownum(self, row):
+        'Return row number in file of *row*, or None if it was not parsed from the file.'
+        rownum = self._rownums.get(id(row))
+        if rownum is not None and self._pinned.get(rownum, row) is row:
+            ref = self._alive.get(rownum)
+            if ref is None or ref() is row:
+                return rownum
+
+    def pin(self, row):
+        'Keep *row* parsed until the sheet is closed, so that changes to it are not lost.'
+        rownum = self.rownum(row)
+        if rownum is not None:
+            self._pinned[rownum] = row
+
+
+class IndexedRows(collections.abc.MutableSequence):
+    '''Rows of a sheet parsed on demand from an IndexedFile.
+    Until rows are added, deleted, or reordered, these are file rows *first* and after.  Then each entry is a row number in the file, or ~i for added row i.'''
+    def __init__(self, file, first=0):
+        self.file = file
+        self.first = first
+        self._entries = None  # array of entries, or None for all file rows from first
+        self._added = []
+
+    def __repr__(self):
+        return f'<IndexedRows of {len(self)} rows in {self.file.path}>'
+
+    def __len__(self):
+        if self._entries is None:
+            return len(self.file)-self.first
+        return len(self._entries)
+
+    def _entry(self, i):
+        if self._entries is not None:
+            return self._entries[i]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('row index out of range')
+        return self.first+i
+
+    def _row(self, entry, keep=True):
+        if entry >= 0:
+            return self.file.row(entry, keep=keep)
+        return self._added[~entry]
+
+    def _entryOf(self, row, add=True):
+        rownum = self.file.rownum(row)
+        if rownum is not None:
+            return rownum
+        for i, r in enumerate(self._added):
+            if r is row:
+                return ~i
+        if not add:
+            return None
+        self._added.append(row)
+        return ~(len(self._added)-1)
+
+    def _materialize(self):
+        if self._entries is None:
+            self._entries = array.array('q', range(self.first, len(self.file)))
+        return self._entries
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._row(self._entry(i))
+
+    def __iter__(self):
+        entries = self._entries if self._entries is not None else range(self.first, len(self.file))
+        for entry in entries:
+            yield self._row(entry, keep=False)
+
+    def __setitem__(self, i, row):
+        entries = self._materialize()
+        if isinstance(i, slice):
+            entries[i] = array.array('q', (self._entryOf(r) for r in row))
+        else:
+            entries[i] = self._entryOf(row)
+
+    def __delitem__(self, i):
+        del self._materialize()[i]
+
+    def insert(self, i, row):
+        self._materialize().insert(i, self._entryOf(row))
+
+    def append(self, row):
+        self._materialize().append(self._entryOf(row))
+
+    def clear(self):
+        self._entries = array.array('q')
+
+    def index(self, row, *args):
+        entry = self._entryOf(row, add=False)
+        if entry is not None:
+            if self._entries is not None:
+                return self._entries.index(entry, *args)
+            if self.first <= entry:
+                return entry-self.first
+        raise ValueError('row not in rows')
+
+    def sampleRows(self, n=1000):
+        'Return the first *n* rows, freshly parsed and not kept; for finding columns at load.'
+        return [self.file.parseRow(self._entry(i)) for i in range(min(n, len(self)))]
+
+    def reorder(self, idxs):
+        'Put rows in the order given by the list of current row indexes *idxs*.'
+        entries = self._materialize()
+        self._entries = array.array('q', (entries[i] for i in idxs))
+
+    def rowid(self, row):
+        rownum = self.file.rownum(row)
+        if rownum is not None:
+            return ~rownum  # negative, unlike id()
+        return id(row)
+
+    def __copy__(self):
+        ret = IndexedRows(self.file, self.first)
+        if self._entries is not None:
+            ret._entries = array.array('q', self._entries)
+        ret._added = list(self._added)
+        return ret
+
+
+Sheet.init('_indexedFile', lambda: None)  # IndexedFile that rows were loaded from, if any
+
+
+@Sheet.api
+def setIndexedRows(sheet, rows):
+    'Set rows to IndexedRows *rows*, and identify rows by their row number in its file instead of by id().'
+    oldfile = sheet._indexedFile
+    sheet.rows = rows
+    sheet.rowid = rows.rowid
+    sheet._indexedFile = rows.file
+    if oldfile and oldfile is not rows.file:
+        oldfile.close()
+
+
+@Sheet.api
+def closeIndexedFile(sheet):
+    'Close the file that rows were loaded from with setIndexedRows, and identify rows by id() again.'
+    sheet.__dict__.pop('rowid', None)
+    f = sheet._indexedFile
+    sheet._indexedFile = None
+    if f:
+        f.close()
+
+
+@Sheet.after
+def afterLoad(sheet):
+    rows = sheet.rows
+    if not (isinstance(rows, IndexedRows) and rows.file is sheet._indexedFile):  # reloaded without indexing (or a copy)
+        sheet.closeIndexedFile()
+
+
+@Sheet.after
+def quitAndReleaseMemory(sheet):
+    if sheet.rows is UNLOADED:
+        sheet.closeIndexedFile()
+
+
+@Column.before
+def setValue(col, row, val, setModified=True):
+    f = getattr(col.sheet, '_indexedFile', None)
+    if f:
+        f.pin(row)
+
+
+@Sheet.api
+def indexRows(sheet, parse, quote=None, skip='', skipEmpty=False):
+    '''Return IndexedRows for the local source file, with each row parsed by *parse(lines)* when used.
+    Return None if options.load_indexed is not set or the source cannot be indexed.
+    See scanRowStarts for *quote*, *skip* (a str regex), and *skipEmpty*.'''
+    if not sheet.options.load_indexed:
+        return None
+
+    path = sheet.localSourcePath()
+    if not path or os.path.getsize(path) == 0:
+        return None
+
+    encoding = sheet.options.encoding
+    start = 0
+    if codecs.lookup(encoding).name == 'utf-8-sig':
+        with open(path, 'rb') as fp:
+            if fp.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+                start = len(codecs.BOM_UTF8)
+        encoding = 'utf-8'
+
+    skipregex = None
+    if skip:
+        try:
+            skipregex = re.compile(b'(?m)^(?=' + skip.encode(encoding) + b')', sheet.regex_flags() & ~re.UNICODE)
+        except (UnicodeError, re.error, ValueError):
+            return None
+
+    params = dict(start=start, quote=quote and quote.decode('latin-1'), skip=skip, skipEmpty=skipEmpty)
+
+    starts = None
+    if sheet.options.indexed_save:
+        starts = loadRowIndex(path, params)
+
+    if starts is None:
+        starts = scanRowStarts(path, start=start, quote=quote, skip=skipregex, skipEmpty=skipEmpty)
+        if starts is None:
+            vd.warning(f'cannot index rows of {path}; loading all rows')
+            return None
+        if sheet.options.indexed_save:
+            saveRowIndex(path, starts, params)
+
+    f = IndexedFile(path, starts, parse, encoding, sheet.options.encoding_errors, sheet.options.indexed_cache_rows)
+    return IndexedRows(f)
+
+
+@SequenceSheet.api
+def loadIndexed(sheet, parse, **kwargs):
+    '''Set rows to IndexedRows of the source file, with *parse(lines)* returning a list of values, and columns from the header rows.
+    Return False if options.load_indexed is not set or the source cannot be indexed.  See indexRows for *kwargs*.'''
+    rows = sheet.indexRows(parse, **kwargs)
+    if rows is None:
+        return False
+
+    f = rows.file
+    nskip = sheet.options.skip
+    rows.first = min(nskip+sheet.options.header, len(f))
+    sheet.setCols([f.parseRow(i) for i in range(min(nskip, rows.first), rows.first)])
+
+    # add columns for rows wider than the header
+    ncols = max(map(len, rows.sampleRows()), default=0)
+    if ncols > len(sheet.columns):
+        for i in range(len(sheet.columns), ncols):
+            sheet.addColumn(ColumnItem('', i))
+        sheet._rowtype = namedlist('tsvobj', [(c.name or '_') for c in sheet.columns])
+
+    rowtype = sheet._rowtype
+    f.parse = lambda lines: rowtype(parse(lines))
+    sheet.setIndexedRows(rows)
+    return True
+
+
+vd.addGlobals(
+    IndexedRows=IndexedRows,
+    IndexedFile=IndexedFile,
+)
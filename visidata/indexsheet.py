@@ -64,7 +64,7 @@ class SheetsSheet(IndexSheet):
         self.rows = self.source
 
     def sort(self):
-        self.rows[1:] = sorted(self.rows[1:], key=self.sortkey)
+        self.rows[1:] = self.sortedRows(self.rows[1:])
 
 
 class GlobalSheetsSheet(SheetsSheet):  #1620
@@ -1,6 +1,6 @@
 from functools import partial
 
-from visidata import VisiData, vd, Sheet, date, anytype, Path, options, Column, asyncthread, Progress, undoAttrCopyFunc, run
+from visidata import VisiData, vd, Sheet, date, anytype, Path, options, Column, asyncthread, Progress, undoAttrCopyFunc, run, wrapply, TypedWrapper
 
 @VisiData.api
 def open_pandas(vd, p):
@@ -27,12 +27,12 @@ def save_dta(vd, p, *sheets):
     # Save only the first sheet
     vs = sheets[0]
 
-    columns = [col.name for col in vs.visibleCols]
-    
+    cols = vs.visibleCols
+    columns = [col.name for col in cols]
+
     # Get data types
     types = list()
-    dispvals = next(vs.iterdispvals(format=True))
-    for col,_ in dispvals.items():
+    for col in cols:
         if col.type in [bool, int, float]:
             types.append(col.type)
         elif vd.isNumeric(col):
@@ -40,16 +40,20 @@ def save_dta(vd, p, *sheets):
         else:
             types.append(str)
 
-    # Populate numpy array
-    data = np.empty((vs.nRows, len(columns)), dtype=object)
-    for r_i, dispvals in enumerate(vs.iterdispvals(format=True)):
-        for c_i, v in enumerate(dispvals.values()):
-            data[r_i, c_i] = v
-
-    # Convert to pandas DataFrame and save
-    dtype = {col:t for col,t in zip(columns, types)}
-    df = pd.DataFrame(data, columns=columns)
-    df = df.astype(dtype)
+    if isinstance(vs, PandasSheet) and all(isinstance(c, PandasColumn) and c.expr in vs.df.columns and t in (bool, int, float) for c, t in zip(cols, types)):
+        # numeric columns of the DataFrame are taken as they are; otherwise all values are saved as displayed
+        series = [vs.df[c.expr].reset_index(drop=True) for c in cols]
+    else:
+        # populate a list for each column
+        data = [list() for col in cols]
+        for dispvals in vs.iterdispvals(format=True):
+            for vals, v in zip(data, dispvals.values()):
+                vals.append(v)
+        series = [pd.Series(vals, dtype=object) for vals in data]
+
+    # Convert to pandas DataFrame (by position, since column names may repeat) and save
+    df = pd.concat([s.astype(t) for s, t in zip(series, types)], axis=1, ignore_index=True) if series else pd.DataFrame()
+    df.columns = columns
     df.to_stata(p, version=118, write_index=False)
 
 class DataFrameAdapter:
@@ -75,6 +79,34 @@ class DataFrameAdapter:
             raise AttributeError(f"'{self.__class__.__name__}' has no attribute '{k}'")
         return getattr(self.df, k)
 
+    def __copy__(self):
+        'Return adapter of a shallow copy of the DataFrame, which keeps its rows in place when the DataFrame is sorted.'
+        return DataFrameAdapter(self.df.copy(deep=False))
+
+
+class PandasColumn(Column):
+    '''Column of a PandasSheet, with the values of DataFrame column *expr*.
+    Values for a list of rows from a slice of the DataFrame are taken from that slice all together.'''
+    def _slice(self, rows):
+        'Return the DataFrame slice of *rows*, or None if they are not one.'
+        if isinstance(rows, DataFrameAdapter) and self._cachedValues is None and not self.defer:
+            if self.expr in rows.df.columns:
+                return rows.df
+
+    def getRowValues(self, rows):
+        df = self._slice(rows)
+        if df is None:
+            return super().getRowValues(rows)
+        return df[self.expr].tolist()
+
+    def getTypedValues(self, rows):
+        df = self._slice(rows)
+        if df is None:
+            return super().getTypedValues(rows)
+        typ = self.type
+        return [wrapply(typ, v) for v in df[self.expr].tolist()]
+
+
 # source=DataFrame
 class PandasSheet(Sheet):
     '''Sheet sourced from a pandas.DataFrame
@@ -123,9 +155,43 @@ class PandasSheet(Sheet):
         else:
             self.rows = DataFrameAdapter(val)
 
+    def columnArrays(self):
+        '''Return (True if row labels are their positions, dict of [colname] -> array of values by position) for the current DataFrame.
+        The arrays are kept until the DataFrame or its index is replaced, or a value is set.'''
+        df = self.df
+        cache = self._columnArrays
+        if cache is None or cache[0] is not df or cache[1] is not df.index:
+            pd = vd.importExternal('pandas')
+            index = df.index
+            positional = isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+            cache = self._columnArrays = (df, index, positional, {})
+        return cache[2:]
+
+    def columnValues(self, colname):
+        'Return array of the values of DataFrame column *colname*, by integer position.'
+        np = vd.importExternal('numpy')
+        positional, arrays = self.columnArrays()
+        arr = arrays.get(colname)
+        if arr is None:
+            s = self.df[colname]
+            if isinstance(s.dtype, np.dtype) and s.dtype.kind not in 'mM':
+                arr = s.to_numpy()
+            else:  # extension and datetime arrays give pandas scalars, as .loc does
+                arr = s.array
+            arrays[colname] = arr
+        return arr
+
+    def rowPosition(self, row):
+        'Return integer position in the DataFrame of *row*, from its label.'
+        positional, arrays = self.columnArrays()
+        if positional:
+            return row.name
+        return self.df.index.get_loc(row.name)
+
     def getValue(self, col, row):
-        '''Look up column values in the underlying DataFrame.'''
-        return col.sheet.df.loc[row.name, col.expr]
+        '''Look up column values by integer position in the cached arrays of the underlying DataFrame.'''
+        sheet = col.sheet
+        return sheet.columnValues(col.expr)[sheet.rowPosition(row)]
 
     def setValue(self, col, row, val):
         '''
@@ -141,6 +207,7 @@ class PandasSheet(Sheet):
             vd.warning(f'Type of {val} does not match column {col.name}. Changing type.')
             col.type = anytype
             col.sheet.df.loc[row.name, col.expr] = val
+        col.sheet._columnArrays = None
         self.setModified()
 
     @asyncthread
@@ -182,7 +249,7 @@ class PandasSheet(Sheet):
 
         self.columns = []
         for col in (c for c in df.columns if not c.startswith("__vd_")):
-            self.addColumn(Column(
+            self.addColumn(PandasColumn(
                 col,
                 type=self.dtype_to_type(df[col]),
                 getter=self.getValue,
@@ -208,6 +275,36 @@ class PandasSheet(Sheet):
             ascending.append(not reverse)
         self.rows.sort_values(by=by_cols, ascending=ascending, inplace=True)
 
+    def valueMask(self, col, val, display=False):
+        '''Return boolean Series of rows with typed value *val* in *col*, or with displayed value *val* if *display*, compared all together by pandas.
+        Return None if the values must be compared row by row.'''
+        pd = vd.importExternal('pandas')
+        if not isinstance(col, PandasColumn) or col._cachedValues is not None or col.defer:
+            return None
+        if isinstance(val, TypedWrapper) or col.expr not in self.df.columns:
+            return None
+        s = self.df[col.expr]
+        if display:  # displayed as they are, if all str; nulls are displayed as ''
+            if val == '' or col.type not in (anytype, str) or pd.api.types.infer_dtype(s, skipna=True) != 'string':
+                return None
+        elif col.type is date or col.type is not self.dtype_to_type(s):
+            return None
+        return (s == val).fillna(False).astype(bool)
+
+    def selectByValue(self, col, val, display=False):
+        'Select rows with typed value *val* in *col*, or with displayed value *val* if *display*.'
+        mask = self.valueMask(col, val, display=display)
+        if mask is None:
+            if display:
+                rows = self.gatherBy(lambda r: col.getDisplayValue(r) == val)
+            else:
+                rows = self.gatherBy(lambda r: col.getTypedValue(r) == val)
+            return self.select(rows, progress=False)
+
+        self.addUndoSelection()
+        self._checkSelectedIndex()
+        self._selectedMask = self._selectedMask | mask
+
     def _checkSelectedIndex(self):
         pd = vd.importExternal('pandas')
         if self._selectedMask.index is not self.df.index:
@@ -402,9 +499,14 @@ PandasSheet.addCommand('\\', 'unselect-col-regex', 'selectByRegex(regex=input("s
 PandasSheet.addCommand('g|', 'select-cols-regex', 'selectByRegex(regex=input("select regex: ", type="regex", defaultLast=True), columns=visibleCols)', 'select rows matching regex in any visible column')
 PandasSheet.addCommand('g\\', 'unselect-cols-regex', 'selectByRegex(regex=input("select regex: ", type="regex", defaultLast=True), columns=visibleCols, unselect=True)', 'unselect rows matching regex in any visible column')
 
+PandasSheet.addCommand(',', 'select-equal-cell', 'selectByValue(cursorCol, cursorDisplay, display=True)', 'select rows matching current cell in current column')
+PandasSheet.addCommand('z,', 'select-exact-cell', 'selectByValue(cursorCol, cursorTypedValue)', 'select rows matching current cell in current column')
+
 # Override with a pandas/dataframe-aware implementation
 PandasSheet.addCommand('"', 'dup-selected', 'vs=PandasSheet(sheet.name, "selectedref", source=selectedRows.df); vd.push(vs)', 'open duplicate sheet with only selected rows')
 
+PandasSheet.init('_columnArrays', lambda: None)
+
 vd.addGlobals({
     'PandasSheet': PandasSheet,
 })
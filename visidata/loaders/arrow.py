@@ -1,8 +1,15 @@
+import array
+import collections
+import itertools
+import threading
 from collections import defaultdict
 
-from visidata import Sheet, VisiData, TypedWrapper, anytype, date, vlen, Column, vd
+from visidata import Sheet, VisiData, TypedWrapper, anytype, date, vlen, Column, vd, wrapply, Progress, filesize
 
 
+vd.option('arrows_window', 0, 'number of most recent record batches to keep when loading an Arrow IPC stream (0 keeps all)')
+vd.option('arrows_batch_rows', 65536, 'number of rows in each record batch written to Arrow IPC, flushed after each batch when streaming')
+
 
 @VisiData.api
 def open_arrow(vd, p):
@@ -13,7 +20,7 @@ def open_arrow(vd, p):
 @VisiData.api
 def open_arrows(vd, p):
     'Apache Arrow IPC streaming format'
-    return ArrowSheet(p.name, source=p)
+    return ArrowStreamSheet(p.name, source=p)
 
 
 def arrow_to_vdtype(t):
@@ -56,27 +63,437 @@ def arrow_to_vdtype(t):
     }
     return arrow_to_vd_typemap.get(t.id, anytype)
 
+def positionsWithin(positions, first, n):
+    'Return True if all of *positions* (a pyarrow integer array) are at least *first* and less than *n*.'
+    if not len(positions):
+        return True
+    pc = vd.importExternal('pyarrow.compute', 'pyarrow')
+    minmax = pc.min_max(positions)
+    return first <= minmax['min'].as_py() and minmax['max'].as_py() < n
+
+
+class ArrowRows(collections.abc.MutableSequence):
+    '''Rows of an ArrowSheet, as integer positions into its table of rows up to position *n*.
+    Until rows are added, deleted, or reordered, these are positions *first* to n-1, which are not stored; then they are kept in an array.'''
+    def __init__(self, n, first=0):
+        self.n = n
+        self.first = first
+        self._entries = None  # array of positions, or None for all table rows in order
+
+    def __repr__(self):
+        return f'<ArrowRows of {len(self)} rows>'
+
+    def __len__(self):
+        if self._entries is None:
+            return self.n-self.first
+        return len(self._entries)
+
+    def _materialize(self):
+        if self._entries is None:
+            self._entries = array.array('q', range(self.first, self.n))
+        return self._entries
+
+    def __getitem__(self, i):
+        if self._entries is not None:
+            r = self._entries[i]
+            return list(r) if isinstance(i, slice) else r
+        r = range(self.first, self.n)[i]
+        return list(r) if isinstance(i, slice) else r
+
+    def __iter__(self):
+        return iter(self._entries if self._entries is not None else range(self.first, self.n))
+
+    def __setitem__(self, i, row):
+        entries = self._materialize()
+        if isinstance(i, slice):
+            entries[i] = array.array('q', row)
+        else:
+            entries[i] = row
+
+    def __delitem__(self, i):
+        del self._materialize()[i]
+
+    def insert(self, i, row):
+        self._materialize().insert(i, row)
+
+    def append(self, row):
+        self._materialize().append(row)
+
+    def clear(self):
+        self._entries = array.array('q')
+
+    def index(self, row, *args):
+        if self._entries is not None:
+            return self._entries.index(row, *args)
+        return range(self.first, self.n).index(row, *args)
+
+    def grow(self, n):
+        'Add the table rows at positions up to *n*, after the rows already added.'
+        if self._entries is not None:
+            self._entries.extend(range(self.n, n))
+        self.n = n
+
+    def drop(self, first):
+        'Remove the table rows at positions before *first*.'
+        if self._entries is None:
+            self.first = max(self.first, min(first, self.n))
+        else:
+            self._entries = array.array('q', (r for r in self._entries if not 0 <= r < first))
+
+    def positions(self):
+        '''Return pyarrow Int64Array of the positions, sharing memory with the array of positions; or None if they are all table rows in order.
+        The array cannot be resized while the returned Int64Array is referenced, so do not keep it.'''
+        if self._entries is None:
+            return None
+        pa = vd.importExternal('pyarrow')
+        return pa.Array.from_buffers(pa.int64(), len(self._entries), [None, pa.py_buffer(self._entries)])
+
+    def reorder(self, idxs):
+        'Put rows in the order given by current row indexes *idxs*, a list or a pyarrow integer array.'
+        if isinstance(idxs, (list, range, array.array)):
+            entries = self._materialize()
+            self._entries = array.array('q', (entries[i] for i in idxs))
+            return
+
+        pa = vd.importExternal('pyarrow')
+        pc = vd.importExternal('pyarrow.compute', 'pyarrow')
+        positions = self.positions()
+        if positions is not None:
+            idxs = positions.take(idxs)
+            del positions
+        elif self.first:
+            idxs = pc.add(idxs.cast(pa.int64()), self.first)
+        idxs = idxs.cast(pa.int64())
+        buf = idxs.buffers()[1]
+        entries = array.array('q')
+        entries.frombytes(memoryview(buf)[idxs.offset*8:(idxs.offset+len(idxs))*8])
+        self._entries = entries
+
+    def __copy__(self):
+        ret = ArrowRows(self.n, self.first)
+        if self._entries is not None:
+            ret._entries = array.array('q', self._entries)
+        return ret
+
+
+class ArrowColumn(Column):
+    '''Column of values in *source*, a pyarrow Array or ChunkedArray, for rows which are positions into it.
+    Values are converted to Python a block of positions at a time, and only the most recently used blocks are kept.
+    Values put into cells are kept separately, by position.'''
+    blocksize = 4096
+    maxblocks = 16
+
+    def __init__(self, name=None, source=None, **kwargs):
+        super().__init__(name, source=source, **kwargs)
+        self._edits = {}  # [position] -> value put into this column
+        self._blocks = collections.OrderedDict()  # [blocknum] -> list of Python values, most recently used last
+        self._lock = threading.Lock()
+
+    def __copy__(self):
+        'Copy with its own kept blocks.  Values put into cells are shared, as the rows of a copied sheet are the same positions.'
+        ret = super().__copy__()
+        ret._blocks = collections.OrderedDict()
+        ret._lock = threading.Lock()
+        return ret
+
+    @property
+    def nvalues(self):
+        'Number of values in the column, which is the number of rows in the table.'
+        return len(self.source)
+
+    @property
+    def arrowtype(self):
+        'pyarrow DataType of the values.'
+        return self.source.type
+
+    def arrowSlice(self, start, n):
+        'Return pyarrow array of the *n* values from position *start*.  Overridable.'
+        return self.source.slice(start, n)
+
+    def hasValues(self, positions):
+        'Return True if all of *positions* (a pyarrow integer array) are of values in the column, not of added rows.  Overridable.'
+        return positionsWithin(positions, 0, self.nvalues)
+
+    def take(self, positions):
+        'Return pyarrow array of the values at *positions*.  Overridable.'
+        return self.source.take(positions)
+
+    def block(self, blocknum):
+        'Return list of Python values at positions in block *blocknum*.'
+        with self._lock:
+            vals = self._blocks.get(blocknum)
+            if vals is not None:
+                self._blocks.move_to_end(blocknum)
+                return vals
+
+        vals = self.arrowSlice(blocknum*self.blocksize, self.blocksize).to_pylist()
+        with self._lock:
+            self._blocks[blocknum] = vals
+            while len(self._blocks) > self.maxblocks:
+                self._blocks.popitem(last=False)
+        return vals
+
+    def calcValue(self, row):
+        if row in self._edits:
+            return self._edits[row]
+        if not 0 <= row < self.nvalues:  # added row
+            return None
+        blocknum, i = divmod(row, self.blocksize)
+        return self.block(blocknum)[i]
+
+    def putValue(self, row, val):
+        self._edits[row] = val
+
+    def getTypedValues(self, rows):
+        'Return list of typed values of this column for *rows*, converting the values of all of them from the Arrow array together.'
+        if self._cachedValues is not None or self.defer or not isinstance(self.sheet, ArrowSheet):
+            return Column.getTypedValues(self, rows)
+
+        positions = self.sheet.rowPositions(rows)
+        vals = self.sheet.arrowValues(self, positions, typed=False)
+        del positions
+        if vals is None:  # added rows
+            return Column.getTypedValues(self, rows)
+        vals = vals.to_pylist()
+
+        typ = self.type
+        ret = [wrapply(typ, v) for v in vals]
+        if self._edits:
+            edits = self._edits
+            for i, r in enumerate(rows):
+                if r in edits:
+                    ret[i] = wrapply(typ, edits[r])
+        return ret
+
+
 class ArrowSheet(Sheet):
-    def iterload(self):
+    # rowdef: int position in self.coldata (a pyarrow Table); added rows are negative
+
+    def openTable(self):
+        'Return pyarrow Table read from the source.  Overridable.'
         pa = vd.importExternal('pyarrow')
 
         try:
             with pa.OSFile(str(self.source), 'rb') as fp:
-                self.coldata = pa.ipc.open_file(fp).read_all()
+                return pa.ipc.open_file(fp).read_all()
         except pa.lib.ArrowInvalid as e:
             with pa.OSFile(str(self.source), 'rb') as fp:
-                self.coldata = pa.ipc.open_stream(fp).read_all()
+                return pa.ipc.open_stream(fp).read_all()
 
+    def setTable(self, tbl):
+        'Set columns for the pyarrow Table *tbl*, which has the values of the rows.'
+        self.coldata = tbl
         self.columns = []
-        for colnum, col in enumerate(self.coldata):
-            coltype = arrow_to_vdtype(self.coldata.schema.types[colnum])
-            colname = self.coldata.schema.names[colnum]
+        for colname, col in zip(tbl.column_names, tbl.columns):
+            self.addColumn(ArrowColumn(colname, type=arrow_to_vdtype(col.type), source=col))
+
+    def loader(self):
+        'Read the table, with its rows as positions without a row object each.'
+        self.setTable(self.openTable())
+        self.rows = ArrowRows(self.coldata.num_rows)
+
+    def iterload(self):
+        self.setTable(self.openTable())
+        yield from range(self.coldata.num_rows)
+
+    def newRow(self):
+        'Return position of a new row, which is negative, outside of the table, and not used by any copy of this sheet.'
+        return -next(self._addedRowNums)
 
-            self.addColumn(Column(colname, type=coltype, expr=colnum,
-                                  getter=lambda c,r: c.sheet.coldata[c.expr][r[0]].as_py()))
+    def rowid(self, row):
+        return row
 
-        for rownum in range(max(len(c) for c in self.coldata)):
-            yield [rownum]
+    def rowPositions(self, rows):
+        'Return pyarrow Int64Array of the positions of *rows*, or None if they are all table rows in order.'
+        if isinstance(rows, ArrowRows):
+            return rows.positions()
+        pa = vd.importExternal('pyarrow')
+        return pa.array(rows, type=pa.int64())
+
+    def arrowValues(self, col, positions, typed=True):
+        '''Return pyarrow array of the values of *col* at *positions* (all table rows in order if None).
+        Return None if some values are not in the table, or if *typed* and they are not in the table as they are edited and typed, so they must be computed in Python.'''
+        if not isinstance(col, ArrowColumn):
+            return None
+        if typed and (col._edits or col.defer or col.type is not arrow_to_vdtype(col.arrowtype)):
+            return None
+        if positions is None:
+            return col.source
+        if not col.hasValues(positions):  # added rows
+            return None
+        return col.take(positions)
+
+    def sortedRowIndexes(self, rows, prog=None):
+        'Return indexes into *rows* in order sorted according to the current internal ordering, with an Arrow sort kernel if all ordering columns have their values in the table.'
+        pa = vd.importExternal('pyarrow')
+        pc = vd.importExternal('pyarrow.compute', 'pyarrow')
+
+        ordering = [(self.column(col) if isinstance(col, str) else col, reverse) for col, reverse in self._ordering]
+        reverses = set(reverse for col, reverse in ordering)
+        if len(reverses) == 1:  # nulls are ordered first for ascending columns and last for descending
+            positions = self.rowPositions(rows)
+            arrays = [self.arrowValues(col, positions) for col, reverse in ordering]
+            del positions
+            if None not in arrays:
+                reverse = reverses.pop()
+                names = [str(i) for i in range(len(arrays))]
+                order = 'descending' if reverse else 'ascending'
+                try:
+                    idxs = pc.sort_indices(pa.table(arrays, names=names),
+                                           sort_keys=[(name, order) for name in names],
+                                           null_placement='at_end' if reverse else 'at_start')
+                except pa.ArrowException as e:  # like for nested types
+                    vd.debug(f'sorting in Python: {e}')
+                else:
+                    if prog:
+                        prog.addProgress(len(rows)*len(arrays))
+                    return idxs if isinstance(rows, ArrowRows) else idxs.to_pylist()
+
+        return super().sortedRowIndexes(rows, prog=prog)
+
+    def equalRowIndexes(self, col, val):
+        'Return list of indexes of rows with typed value *val* in *col*, compared with an Arrow kernel if the values are in the table.'
+        pa = vd.importExternal('pyarrow')
+        pc = vd.importExternal('pyarrow.compute', 'pyarrow')
+
+        positions = self.rowPositions(self.rows)
+        vals = self.arrowValues(col, positions)
+        del positions
+        if vals is not None and not isinstance(val, TypedWrapper):
+            try:
+                mask = pc.equal(vals, pa.scalar(val, type=vals.type))
+            except pa.ArrowException as e:
+                vd.debug(f'comparing in Python: {e}')
+            else:
+                if isinstance(mask, pa.Array):
+                    return pc.indices_nonzero(mask).to_pylist()
+                ret = []
+                start = 0
+                for chunk in mask.chunks:
+                    ret.extend(i+start for i in pc.indices_nonzero(chunk).to_pylist())
+                    start += len(chunk)
+                return ret
+
+        return [i for i, v in enumerate(col.getTypedValues(self.rows)) if v == val]
+
+
+ArrowSheet.addCommand('z,', 'select-exact-cell', 'selectByIdx(equalRowIndexes(cursorCol, cursorTypedValue))', 'select rows matching current cell in current column')
+
+
+ArrowSheet.init('_addedRowNums', lambda: itertools.count(1), copy=True)  # shared with copies, which put values into the same columns by position
+
+
+class ArrowStreamColumn(ArrowColumn):
+    'Column of an ArrowStreamSheet, with the values of column *colnum* in the record batches kept so far.'
+    arrowtype = None  # pyarrow DataType of the column in the stream
+
+    def __init__(self, name=None, colnum=0, **kwargs):
+        self._data = None
+        super().__init__(name, colnum=colnum, **kwargs)
+
+    def data(self):
+        'Return (position of first value, pyarrow ChunkedArray of values) of the batches kept so far.'
+        data = self._data
+        if data is None:
+            data = self._data = self.sheet.batchValues(self.colnum, self.arrowtype)
+        return data
+
+    def resetData(self):
+        'Forget the values, after record batches are added or dropped.'
+        with self._lock:
+            self._data = None
+            self._blocks.clear()
+
+    @property
+    def source(self):
+        return self.data()[1]
+
+    @source.setter
+    def source(self, v):
+        pass
+
+    @property
+    def nvalues(self):
+        first, vals = self.data()
+        return first+len(vals)
+
+    def arrowSlice(self, start, n):
+        pa = vd.importExternal('pyarrow')
+        first, vals = self.data()
+        lo = max(start, first)
+        vals = vals.slice(lo-first, max(start+n-lo, 0))
+        if lo > start:  # dropped rows
+            vals = pa.chunked_array([pa.nulls(lo-start, type=self.arrowtype)] + vals.chunks, type=self.arrowtype)
+        return vals
+
+    def hasValues(self, positions):
+        first, vals = self.data()
+        return positionsWithin(positions, first, first+len(vals))
+
+    def take(self, positions):
+        pc = vd.importExternal('pyarrow.compute', 'pyarrow')
+        first, vals = self.data()
+        return vals.take(pc.subtract(positions, first))
+
+
+class ArrowStreamSheet(ArrowSheet):
+    '''Sheet of the rows of an Arrow IPC stream, which are added as record batches arrive.
+    With options.arrows_window, only the rows of that many most recent batches are kept.'''
+    # rowdef: int position in the stream; added rows are negative
+    def iterbatches(self):
+        'Set columns from the schema of the stream, and generate its record batches as they arrive.'
+        pa = vd.importExternal('pyarrow')
+
+        self.batches = collections.deque()
+        self.firstPosition = 0  # position of first row in the first batch kept
+        self.endPosition = 0
+        self._batchLock = threading.Lock()
+
+        with self.source.open_bytes() as fp:
+            reader = pa.ipc.open_stream(fp)
+            self.columns = []
+            for colnum, field in enumerate(reader.schema):
+                self.addColumn(ArrowStreamColumn(field.name, type=arrow_to_vdtype(field.type), arrowtype=field.type, colnum=colnum))
+
+            with Progress(gerund='loading', total=filesize(self.source)) as prog:
+                for batch in reader:
+                    yield batch
+                    prog.addProgress(batch.nbytes)
+
+    def addBatch(self, batch, window=0):
+        'Add the rows of record *batch*, and drop the oldest batches beyond the most recent *window* batches.'
+        with self._batchLock:
+            self.batches.append(batch)
+            self.endPosition += batch.num_rows
+            while window and len(self.batches) > window:
+                self.firstPosition += self.batches.popleft().num_rows
+
+        for c in self.columns:
+            if isinstance(c, ArrowStreamColumn):
+                c.resetData()
+
+        if isinstance(self.rows, ArrowRows):
+            self.rows.drop(self.firstPosition)
+            self.rows.grow(self.endPosition)
+
+    def batchValues(self, colnum, arrowtype):
+        'Return (position of first value, pyarrow ChunkedArray) of the values of column *colnum* in the batches kept.'
+        pa = vd.importExternal('pyarrow')
+        with self._batchLock:
+            return self.firstPosition, pa.chunked_array([b.column(colnum) for b in self.batches], type=arrowtype)
+
+    def loader(self):
+        'Add rows as record batches arrive, without a row object each.'
+        self.rows = ArrowRows(0)
+        window = self.options.arrows_window
+        for batch in self.iterbatches():
+            self.addBatch(batch, window)
+
+    def iterload(self):
+        for batch in self.iterbatches():
+            start = self.endPosition
+            self.addBatch(batch)
+            yield from range(start, self.endPosition)
 
 
 @VisiData.api
@@ -97,28 +514,40 @@ def save_arrow(vd, p, sheet, streaming=False):
         if t not in typemap:
             typemap[t] = pa.float64()
 
-    databycol = defaultdict(list)   # col -> [values]
-
-    for typedvals in sheet.iterdispvals(format=False):
-        for col, val in typedvals.items():
-            if isinstance(val, TypedWrapper):
-                val = None
-
-            databycol[col].append(val)
-
-    data = [pa.array(vals, type=typemap.get(col.type, pa.string())) for col, vals in databycol.items()]
-
+    cols = sheet.visibleCols
     schema = pa.schema([
         (c.name, typemap.get(c.type, pa.string()))
-            for c in sheet.visibleCols
+            for c in cols
     ])
+
+    def recordBatch(databycol):
+        return pa.record_batch([pa.array(databycol[col], type=schema.field(i).type) for i, col in enumerate(cols)], schema=schema)
+
+    batchrows = max(sheet.options.arrows_batch_rows, 1)
     with p.open_bytes(mode='w') as outf:
-        if streaming:
-            with pa.ipc.new_stream(outf, schema) as writer:
-                writer.write_batch(pa.record_batch(data, names=[c.name for c in sheet.visibleCols]))
-        else:
-            with pa.ipc.new_file(outf, schema) as writer:
-                writer.write_batch(pa.record_batch(data, names=[c.name for c in sheet.visibleCols]))
+        newWriter = pa.ipc.new_stream if streaming else pa.ipc.new_file
+        with newWriter(outf, schema) as writer:
+            databycol = defaultdict(list)   # col -> [values]
+            nrows = 0
+            nbatches = 0
+            for typedvals in sheet.iterdispvals(format=False):
+                for col, val in typedvals.items():
+                    if isinstance(val, TypedWrapper):
+                        val = None
+
+                    databycol[col].append(val)
+
+                nrows += 1
+                if nrows >= batchrows:
+                    writer.write_batch(recordBatch(databycol))
+                    if streaming:
+                        outf.flush()
+                    databycol.clear()
+                    nrows = 0
+                    nbatches += 1
+
+            if nrows or not nbatches:
+                writer.write_batch(recordBatch(databycol))
 
 
 @VisiData.api
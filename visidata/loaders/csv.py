@@ -1,5 +1,11 @@
+import io
+import os
+import codecs
+import itertools
+
 from visidata import vd, VisiData, SequenceSheet, options, stacktrace
 from visidata import TypedExceptionWrapper, Progress
+from visidata.text_source import FilterFile, readTextRange
 
 vd.option('csv_dialect', 'excel', 'dialect passed to csv.reader', replay=True)
 vd.option('csv_delimiter', ',', 'delimiter passed to csv.reader', replay=True)
@@ -33,14 +39,97 @@ def removeNulls(fp):
     for line in fp:
         yield line.replace('\0', '')
 
+_range_end = '\0end of range\0'
+
+def parseCsvRange(path, start, end, encoding, encoding_errors, csvargs, regex_skip, regex_flags, safety_first):
+    'Return list of rows parsed from the bytes *start* to *end* of the CSV file at *path*, or None if *end* is inside a quoted field.  Runs in a worker process.'
+    import csv
+    csv.field_size_limit(2**31-1)  #288 Windows has max 32-bit
+
+    fp = io.StringIO(readTextRange(path, start, end, encoding, encoding_errors))
+    if regex_skip:
+        fp = FilterFile(fp, regex_skip, regex_flags)
+    if safety_first:
+        fp = removeNulls(fp)
+
+    checkend = end < os.path.getsize(path)
+    if checkend:
+        # parsed as its own row only if the range ends outside a quoted field
+        fp = itertools.chain(fp, [_range_end])
+
+    rows = []
+    rdr = csv.reader(fp, **csvargs)
+    while True:
+        try:
+            rows.append(next(rdr))
+        except csv.Error as e:
+            rows.append(e)
+        except StopIteration:
+            break
+
+    if checkend:
+        if rows and rows[-1] == [_range_end]:
+            rows.pop()
+        else:
+            return None
+
+    return rows
+
+
 class CsvSheet(SequenceSheet):
     _rowtype = list  # rowdef: list of values
 
+    def rowSplitQuote(self, csvargs):
+        '''Return (splittable, quote): whether the file can be split into rows at newlines after an even number of quote characters, and the quote character as bytes (None if fields are never quoted).'''
+        import csv
+        dialect = csv.reader([], **csvargs).dialect
+        if dialect.escapechar is not None:
+            return False, None
+        if dialect.quoting == csv.QUOTE_NONE:
+            return True, None
+        encoding = self.options.encoding
+        if codecs.lookup(encoding).name == 'utf-8-sig':
+            encoding = 'utf-8'  # without BOM
+        return True, dialect.quotechar.encode(encoding)
+
+    def loader(self):
+        import csv
+        csv.field_size_limit(2**31-1)  #288 Windows has max 32-bit
+
+        csvargs = dict(options.getall('csv_'))
+        splittable, quote = self.rowSplitQuote(csvargs)
+        safety_first = options.safety_first
+
+        def parse(lines):
+            try:
+                return next(csv.reader(removeNulls(lines) if safety_first else lines, **csvargs))
+            except csv.Error as e:
+                e.stacktrace=stacktrace()
+                return [TypedExceptionWrapper(None, exception=e)]
+            except StopIteration:
+                return []
+
+        if not (splittable and self.loadIndexed(parse, quote=quote, skip=self.options.regex_skip)):
+            super().loader()
+
     def iterload(self):
         'Convert from CSV, first handling header row specially.'
         import csv
         csv.field_size_limit(2**31-1)  #288 Windows has max 32-bit
 
+        csvargs = dict(options.getall('csv_'))
+        path = self.parallelSourcePath()
+        splittable, quote = self.rowSplitQuote(csvargs)
+        if path and splittable:
+            for row in self.iterloadParallel(path, parseCsvRange, csvargs,
+                                             self.options.regex_skip, self.regex_flags(), options.safety_first,
+                                             quote=quote):
+                if isinstance(row, csv.Error):
+                    row.stacktrace=stacktrace()
+                    row = [TypedExceptionWrapper(None, exception=row)]
+                yield row
+            return
+
         with self.open_text_source() as fp:
             if options.safety_first:
                 rdr = csv.reader(removeNulls(fp), **options.getall('csv_'))
@@ -69,9 +158,8 @@ def save_csv(vd, p, sheet):
         if ''.join(colnames):
             cw.writerow(colnames)
 
-        with Progress(gerund='saving'):
-            for dispvals in sheet.iterdispvals(format=True):
-                cw.writerow(dispvals.values())
+        for batch in sheet.iterdispbatches(format=True):
+            cw.writerows(zip(*batch))
 
 CsvSheet.options.regex_skip = '^#.*'
 
@@ -45,25 +45,48 @@ def columnize(rows):
     yield colstart, prev+1   # final column gets rest of line
 
 
+class FixedWidthRow(list):
+    'Row of an indexed fixed-width sheet: [line], as a list which can be weakly referenced.'
+
+
 class FixedWidthColumnsSheet(SequenceSheet):
     rowtype = 'lines'  # rowdef: [line] (wrapping in list makes it unique and modifiable)
     def addRow(self, row, index=None):
         Sheet.addRow(self, row, index=index)
 
-    def iterload(self):
-        itsource = iter(self.source)
-
-        # compute fixed width columns from first fixed_rows lines
+    def setFixedColumns(self, lines):
+        'Set fixed width columns found in *lines*.'
         maxcols = self.options.fixed_maxcols
         self.columns = []
-        fixedRows = list([x] for x in self.optlines(itsource, 'fixed_rows'))
-        for i, j in columnize(list(r[0] for r in fixedRows)):
+        for i, j in columnize(lines):
             if maxcols and self.nCols >= maxcols-1:
                 self.addColumn(FixedWidthColumn('', i, None))
                 break
             else:
                 self.addColumn(FixedWidthColumn('', i, j))
 
+    def loader(self):
+        rows = self.indexRows(lambda lines: FixedWidthRow([next(lines).rstrip('\n')]))
+        if rows is None:
+            return super().loader()
+
+        # compute fixed width columns from first fixed_rows lines
+        f = rows.file
+        lines = [f.parseRow(i)[0] for i in range(min(self.options.fixed_rows, len(f)))]
+        self.setFixedColumns(lines)
+
+        nskip = self.options.skip
+        rows.first = min(nskip+self.options.header, len(f))
+        self.setColNames([[L] for L in lines[nskip:rows.first]])
+        self.setIndexedRows(rows)
+
+    def iterload(self):
+        itsource = iter(self.source)
+
+        # compute fixed width columns from first fixed_rows lines
+        fixedRows = list([x] for x in self.optlines(itsource, 'fixed_rows'))
+        self.setFixedColumns(list(r[0] for r in fixedRows))
+
         yield from fixedRows
 
         self.setColNames(self.headerlines)
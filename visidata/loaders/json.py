@@ -1,6 +1,6 @@
 import json
 
-from visidata import vd, date, VisiData, PyobjSheet, AttrDict, stacktrace, TypedExceptionWrapper, options, visidata, ColumnItem, wrapply, TypedWrapper, Progress, Sheet, InferColumnsSheet
+from visidata import vd, date, VisiData, PyobjSheet, AttrDict, stacktrace, TypedExceptionWrapper, options, visidata, ColumnItem, TypedWrapper, Progress, Sheet, InferColumnsSheet
 
 vd.option('json_indent', None, 'indent to use when saving json')
 vd.option('json_sort_keys', False, 'sort object keys when saving to json')
@@ -33,6 +33,28 @@ VisiData.open_ndjson = VisiData.open_ldjson = VisiData.open_json = VisiData.open
 
 
 class JsonSheet(InferColumnsSheet):
+    def loader(self):
+        def parse(lines):
+            L = next(lines).strip()
+            try:
+                row = json.loads(L, object_hook=AttrDict)
+            except ValueError as e:
+                e.stacktrace = stacktrace()
+                row = TypedExceptionWrapper(json.loads, L, exception=e)
+            if not isinstance(row, dict):
+                row = visidata.AlwaysDict(row, **{options.default_colname: row})
+            return row
+
+        rows = self.indexRows(parse, skipEmpty=True)
+        if rows is None or isinstance(rows.file.parseRow(0), visidata.AlwaysDict):  # not one object per line
+            return super().loader()
+
+        # add columns for the keys in the first rows
+        for row in rows.sampleRows():
+            self.addKeyColumns(row)
+
+        self.setIndexedRows(rows)
+
     def iterload(self):
         with self.open_text_source() as fp:
             for L in fp:
@@ -82,25 +104,48 @@ class _vjsonEncoder(json.JSONEncoder):
         return str(obj)
 
 
-def _rowdict(cols, row, keep_nulls=False):
-    ret = {}
-    for col in cols:
-        o = wrapply(col.getTypedValue, row)
+def _jsonvals(saver, rows):
+    'Return list of values of the column of ColumnSaver *saver* for *rows*, as saved to json: typed, with errors as options.safe_error and dates as displayed.'
+    col = saver.col
+    ret = []
+    formatter = None
+    for row, o in zip(rows, saver.getTypedValues(rows)):
         if isinstance(o, TypedExceptionWrapper):
             o = col.sheet.options.safe_error or str(o.exception)
         elif isinstance(o, TypedWrapper):
             o = o.val
         elif isinstance(o, date):
-            o = col.getDisplayValue(row)
-        if keep_nulls or o is not None:
-            ret[col.name] = o
+            try:
+                formatter = formatter or col.make_formatter()
+                o = formatter(o, width=(col.width or 0)*2) or ''  # as in getDisplayValue
+            except Exception:
+                o = col.getDisplayValue(row)
+        ret.append(o)
     return ret
 
 
+@Sheet.api
+def iterrowdicts(vs, cols, rows=None):
+    'Generate dict of values for *cols* for each row in *rows* (by default, all rows in sheet), with values as _jsonvals has them.  Null values are included only for the first row.'
+    from visidata.save import ColumnSaver
+    names = [col.name for col in cols]
+    savers = [ColumnSaver(vs, col) for col in cols]
+    first = True
+    for batch in vs.iterrowbatches(rows):
+        colvals = [_jsonvals(saver, batch) for saver in savers]
+        for vals in (zip(*colvals) if colvals else [()]*len(batch)):
+            if first:
+                yield dict(zip(names, vals))
+                first = False
+            else:
+                yield {k: v for k, v in zip(names, vals) if v is not None}
+
+
 @VisiData.api
 def encode_json(vd, row, cols, enc=_vjsonEncoder(sort_keys=False)):
     'Return JSON string for given *row* and given *cols*.'
-    return enc.encode(_rowdict(cols, row))
+    rowdict = next(cols[0].sheet.iterrowdicts(cols, [row])) if cols else {}
+    return enc.encode({k: v for k, v in rowdict.items() if v is not None})
 
 
 @VisiData.api
@@ -118,14 +163,13 @@ def save_json(vd, p, *vsheets):
             fp.write('[\n')
             vs = vsheets[0]
             with Progress(gerund='saving'):
-                for i, row in enumerate(vs.iterrows()):
+                for i, rd in enumerate(vs.iterrowdicts(vs.visibleCols, vs.iterrows())):
                     if i > 0:
                         fp.write(',\n')
-                    rd = _rowdict(vs.visibleCols, row, keep_nulls=(i==0))
                     fp.write(jsonenc.encode(rd))
             fp.write('\n]\n')
         else:
-            it = {vs.name: [_rowdict(vs.visibleCols, row, keep_nulls=(i==0)) for i, row in enumerate(vs.iterrows())] for vs in vsheets}
+            it = {vs.name: list(vs.iterrowdicts(vs.visibleCols, vs.iterrows())) for vs in vsheets}
 
             with Progress(gerund='saving'):
                 for chunk in jsonenc.iterencode(it):
@@ -137,8 +181,7 @@ def write_jsonl(vs, fp):
         vcols = vs.visibleCols
         jsonenc = _vjsonEncoder()
         with Progress(gerund='saving'):
-            for i, row in enumerate(vs.iterrows()):
-                rowdict = _rowdict(vcols, row, keep_nulls=(i==0))
+            for rowdict in vs.iterrowdicts(vcols, vs.iterrows()):
                 fp.write(jsonenc.encode(rowdict) + '\n')
 
         if len(vs) == 0:
@@ -4,7 +4,7 @@ from visidata.loaders._pandas import PandasSheet
 from visidata.pivot import PivotSheet
 
 class DataFrameRowSliceAdapter:
-    """Tracks original dataframe and a boolean row mask
+    """Tracks original dataframe and a row mask (boolean, or integer positions)
 
     This is a workaround to (1) save memory (2) keep id(row)
     consistent when iterating, as id() is used significantly
@@ -15,25 +15,30 @@ class DataFrameRowSliceAdapter:
         np = vd.importExternal('numpy')
         if not isinstance(df, pd.DataFrame):
             vd.fail('%s is not a dataframe' % type(df).__name__)
-        if not isinstance(mask, pd.Series):
-            vd.fail('mask %s is not a Series' % type(mask).__name__)
-        if df.shape[0] != mask.shape[0]:
-            vd.fail('dataframe and mask have different shapes (%s vs %s)' % (df.shape[0], mask.shape[0]))
 
         self.df = df
-        self.mask_bool = mask  # boolean mask
-        self.mask_iloc = np.where(mask.values)[0]  # integer indexes corresponding to mask
-        self.mask_count = mask.sum()
+        if isinstance(mask, pd.Series):  # boolean mask
+            if df.shape[0] != mask.shape[0]:
+                vd.fail('dataframe and mask have different shapes (%s vs %s)' % (df.shape[0], mask.shape[0]))
+            self.mask_iloc = np.where(mask.values)[0]  # integer indexes corresponding to mask
+        else:  # integer indexes
+            self.mask_iloc = np.asarray(mask)
+        self.mask_count = len(self.mask_iloc)
+
+    @property
+    def mask_bool(self):
+        'Boolean mask of the rows.'
+        pd = vd.importExternal('pandas')
+        mask = pd.Series(False, index=self.df.index)
+        mask.iloc[self.mask_iloc] = True
+        return mask
 
     def __len__(self):
         return self.mask_count
 
     def __getitem__(self, k):
         if isinstance(k, slice):
-            import pandas as pd
-            new_mask = pd.Series(False, index=self.df.index)
-            new_mask.iloc[self.mask_iloc[k]] = True
-            return DataFrameRowSliceAdapter(self.df, new_mask)
+            return DataFrameRowSliceAdapter(self.df, self.mask_iloc[k])
         return self.df.iloc[self.mask_iloc[k]]
 
     def __iter__(self):
@@ -88,47 +93,25 @@ class PandasFreqTableSheet(PivotSheet):
 
     def loader(self):
         'Generate frequency table then reverse-sort by length.'
-        import pandas as pd
+        np = vd.importExternal('numpy')
 
         # Note: visidata's base FrequencyTable bins numeric data in ranges
         # (e.g. as a histogram). We currently don't provide support for this
         # for PandasSheet, although we could implement it with a pd.Grouper
         # that operates similarly to pd.cut.
-        df = self.source.df.copy()
 
-        # Implementation (special case): for one row, this degenerates
-        # to .value_counts(); however this does not order in a stable manner.
-        # if len(self.groupByCols) == 1:
-        #     this_column = df.loc[:, str(self.groupByCols[0].name)]
-        #     value_counts = this_column.value_counts()
+        # a shallow copy keeps the positions of the grouped rows if the source is sorted in place
+        df = self.source.df.copy(deep=False)
+
         if len(self.groupByCols) >= 1:
-            # Implementation (1): add a dummy column to aggregate over in a pd.pivot_table.
-            # Is there a way to avoid having to mutate the dataframe? We can delete the
-            # column afterwards but we do incur the overhead of block consolidation.
-            _pivot_count_column = "__vd_pivot_count"
-            if _pivot_count_column not in df.columns:
-                df[_pivot_count_column] = 1
-            # Aggregate count over columns to group, and then apply a stable sort
-            value_counts = df.pivot_table(
-                index=[c.name for c in self.groupByCols],
-                values=_pivot_count_column,
-                aggfunc="count"
-            )[_pivot_count_column].sort_values(ascending=False, kind="mergesort")
-            # TODO: it seems that the ascending=False causes this to do a "reversed stable sort"?
-            # TODO: possibly register something to delete this column as soon as
-            # we exit visidata?
-            # del df["__vd_pivot_count"]
-
-            # Implementation (2) which does not require adding a dummy column:
-            # Compute cross-tabulation to get counts, and sort/remove zero-entries.
-            # Note that this is not space-efficient: the initial cross-tabulation will
-            # have space on the order of product of number of unique elements for each
-            # column, even though its possible the combinations present are sparse
-            # and most combinations have zero count.
-            # this_column = df.loc[:, str(self.groupByCols[0].name)]
-            # value_counts = pd.crosstab(this_column, [df.df[c.name] for c in self.groupByCols[1:]])
-            # value_counts = value_counts.stack(list(range(len(self.groupByCols) - 1)))
-            # value_counts = value_counts.loc[value_counts > 0].sort_values(ascending=False)
+            # Number the groups (in sorted order of their keys) for every row in one pass,
+            # then find the rows of each group by a stable argsort of the group numbers.
+            names = [c.name for c in self.groupByCols]
+            gb = df.groupby(names[0] if len(names) == 1 else names, sort=True, observed=True)
+            sizes = gb.size()
+            groupnums = gb.ngroup().fillna(-1).to_numpy(dtype='int64')  # -1 for rows with null keys
+            order = np.argsort(groupnums, kind='stable')
+            bounds = np.searchsorted(groupnums[order], np.arange(len(sizes)+1))
         else:
             vd.fail("Unable to do FrequencyTable, no columns to group on provided")
 
@@ -142,20 +125,18 @@ class PandasFreqTableSheet(PivotSheet):
                     ]:
             self.addColumn(c)
 
-        for element in Progress(value_counts.index):
+        # groups by descending count, and by key for the same count
+        for g in Progress(np.argsort(-sizes.to_numpy(), kind='stable'), gerund='grouping'):
+            element = sizes.index[g]
             if len(self.groupByCols) == 1:
                 element = (element,)
             elif len(element) != len(self.groupByCols):
                 vd.fail('different number of index cols and groupby cols (%s vs %s)' % (len(element), len(self.groupByCols)))
 
-            mask = df[self.groupByCols[0].name] == element[0]
-            for i in range(1, len(self.groupByCols)):
-                mask = mask & (df[self.groupByCols[i].name] == element[i])
-
             self.addRow(PivotGroupRow(
                 element,
                 (0, 0),
-                DataFrameRowSliceAdapter(df, mask),
+                DataFrameRowSliceAdapter(df, order[bounds[g]:bounds[g+1]]),
                 {}
             ))
 
@@ -1,4 +1,11 @@
-from visidata import Sheet, VisiData, TypedWrapper, anytype, date, vlen, Column, vd
+import ast
+import bisect
+import collections
+import itertools
+import threading
+
+from visidata import Sheet, VisiData, TypedWrapper, anytype, date, vlen, Column, vd, Progress
+from visidata.loaders.arrow import ArrowSheet, ArrowColumn, ArrowRows, arrow_to_vdtype, positionsWithin
 from collections import defaultdict
 
 
@@ -7,25 +14,248 @@ def open_parquet(vd, p):
     return ParquetSheet(p.name, source=p)
 
 
-class ParquetColumn(Column):
-    def calcValue(self, row):
-        return self.source[row["__rownum__"]].as_py()
+class ParquetColumn(ArrowColumn):
+    '''Column of a ParquetSheet, read from the file only when its values are needed.
+    Values of rows on screen are read a row group at a time, and only the most recently used row groups are kept.
+    Computing over all rows (like sorting) reads and keeps the whole column.'''
+    maxgroups = 2
+    arrowtype = None  # pyarrow DataType of the column in the file
+    leafIndexes = ()  # indexes of the parquet leaf columns which store this column in the file, whatever its name
 
+    def __init__(self, name=None, **kwargs):
+        self._source = None
+        self._groups = collections.OrderedDict()  # [rowgroup] -> pyarrow array, most recently used last
+        super().__init__(name, **kwargs)
 
-class ParquetSheet(Sheet):
-    # rowdef: {'__rownum__':int, parquet_col:overridden_value, ...}
-    def iterload(self):
+    def __copy__(self):
+        ret = super().__copy__()
+        ret._groups = collections.OrderedDict()
+        return ret
+
+    @property
+    def source(self):
+        'pyarrow ChunkedArray of all values in the column, read when first used.'
+        if self._source is None:
+            self._source = self.sheet.readColumn(self.leafIndexes)
+        return self._source
+
+    @source.setter
+    def source(self, v):
+        self._source = v
+
+    @property
+    def nvalues(self):
+        return self.sheet.rowGroupStarts[-1]
+
+    def rowGroup(self, g):
+        'Return pyarrow array of the values in row group *g*.'
+        starts = self.sheet.rowGroupStarts
+        if self._source is not None:
+            return self._source.slice(starts[g], starts[g+1]-starts[g])
+
+        with self._lock:
+            vals = self._groups.get(g)
+            if vals is not None:
+                self._groups.move_to_end(g)
+                return vals
+
+        vals = self.sheet.readRowGroup(g, self.leafIndexes)
+        with self._lock:
+            self._groups[g] = vals
+            while len(self._groups) > self.maxgroups:
+                self._groups.popitem(last=False)
+        return vals
+
+    def arrowSlice(self, start, n):
+        if self._source is not None:
+            return self._source.slice(start, n)
+
+        pa = vd.importExternal('pyarrow')
+        starts = self.sheet.rowGroupStarts
+        end = min(start+n, starts[-1])
+        g = bisect.bisect_right(starts, start)-1
+        pieces = []
+        while start < end:
+            lo = start-starts[g]
+            hi = min(end, starts[g+1])-starts[g]
+            pieces.append(self.rowGroup(g).slice(lo, hi-lo))
+            start = starts[g+1]
+            g += 1
+        return pa.chunked_array(pieces, type=self.arrowtype)
+
+
+def numLeafColumns(t):
+    'Return the number of parquet leaf columns which store values of pyarrow DataType *t*.'
+    pa = vd.importExternal('pyarrow')
+    if pa.types.is_struct(t):
+        return sum(numLeafColumns(t[i].type) for i in range(t.num_fields))
+    if pa.types.is_map(t):
+        return numLeafColumns(t.key_type) + numLeafColumns(t.item_type)
+    if pa.types.is_list(t) or pa.types.is_large_list(t) or pa.types.is_fixed_size_list(t):
+        return numLeafColumns(t.value_type)
+    return 1
+
+
+_compareOps = {ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>='}
+_flippedOps = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+_nullMatches = {'==': False, '!=': True, '<': True, '<=': True, '>': False, '>=': False}  # as a null TypedWrapper compares in Python
+
+
+class ParquetSheet(ArrowSheet):
+    # rowdef: int position in the file, as ArrowSheet
+    def openFile(self):
+        'Read the schema and metadata of the file, and set a column for each of its columns.'
         pq = vd.importExternal("pyarrow.parquet", "pyarrow")
-        from visidata.loaders.arrow import arrow_to_vdtype
 
-        self.tbl = pq.read_table(str(self.source))
+        self.parquetFile = pq.ParquetFile(str(self.source))
+        self._readLock = threading.Lock()
+        md = self.parquetFile.metadata
+        self.rowGroupStarts = list(itertools.accumulate([0]+[md.row_group(g).num_rows for g in range(md.num_row_groups)]))
+
         self.columns = []
-        for colname, col in zip(self.tbl.column_names, self.tbl.columns):
-            c = ParquetColumn(colname, type=arrow_to_vdtype(col.type), source=col)
-            self.addColumn(c)
+        leafnum = 0
+        for field in self.parquetFile.schema_arrow:
+            n = numLeafColumns(field.type)
+            self.addColumn(ParquetColumn(field.name, type=arrow_to_vdtype(field.type), arrowtype=field.type, leafIndexes=list(range(leafnum, leafnum+n))))
+            leafnum += n
+
+    def loader(self):
+        'Read only the schema and metadata; row groups of columns are read when their values are used.'
+        self.openFile()
+        self.rows = ArrowRows(self.parquetFile.metadata.num_rows)
+
+    def iterload(self):
+        self.openFile()
+        yield from range(self.parquetFile.metadata.num_rows)
+
+    def readRowGroup(self, g, leafIndexes):
+        'Return pyarrow ChunkedArray of the values in row group *g* of the column stored in parquet leaf columns *leafIndexes*.'
+        with self._readLock:
+            return self.parquetFile.reader.read_row_group(g, column_indices=leafIndexes).column(0)
+
+    def readColumn(self, leafIndexes):
+        'Return pyarrow ChunkedArray of all values of the column stored in parquet leaf columns *leafIndexes*.'
+        with self._readLock:
+            return self.parquetFile.reader.read_all(column_indices=leafIndexes).column(0)
+
+    def canFilter(self, col):
+        'Return True if comparisons of *col* to constants can be evaluated with Arrow kernels and row group statistics.'
+        pa = vd.importExternal('pyarrow')
+        if not isinstance(col, ParquetColumn) or col._edits or col.defer:
+            return False
+        if col.type is not arrow_to_vdtype(col.arrowtype):
+            return False
+        if col.type is anytype:
+            return pa.types.is_string(col.arrowtype) or pa.types.is_large_string(col.arrowtype)
+        return col.type in (int, float, bool)
+
+    def exprPredicates(self, expr):
+        '''Return list of (col, op, value) for Python *expr*, if it compares a column to a constant, or is an `and` of such comparisons.
+        Return None if the expression is anything else.'''
+        try:
+            tree = ast.parse(expr, mode='eval').body
+        except SyntaxError:
+            return None
+
+        terms = tree.values if isinstance(tree, ast.BoolOp) and isinstance(tree.op, ast.And) else [tree]
+        preds = []
+        for term in terms:
+            if not isinstance(term, ast.Compare) or len(term.ops) != 1 or type(term.ops[0]) not in _compareOps:
+                return None
+            left, right, op = term.left, term.comparators[0], _compareOps[type(term.ops[0])]
+            if isinstance(right, ast.Name):
+                left, right, op = right, left, _flippedOps[op]
+            if not isinstance(left, ast.Name) or left.id not in self._ordered_colnames:
+                return None
+            try:
+                val = ast.literal_eval(right)
+            except ValueError:
+                return None
+            col = self._ordered_cols[self._ordered_colnames.index(left.id)]
+            if not self.canFilter(col):
+                return None
+            preds.append((col, op, val))
+        return preds
+
+    def rowGroupMayMatch(self, g, preds):
+        'Return False if the statistics of row group *g* show that no row in it matches all of *preds*.'
+        rg = self.parquetFile.metadata.row_group(g)
+        for col, op, val in preds:
+            if len(col.leafIndexes) != 1:
+                continue
+            stats = rg.column(col.leafIndexes[0]).statistics
+            if stats is None or not stats.has_min_max:
+                continue
+            if _nullMatches[op] and (not stats.has_null_count or stats.null_count):
+                continue
+            lo, hi = stats.min, stats.max
+            try:
+                if op == '==' and (val < lo or hi < val): return False
+                if op == '!=' and lo == hi == val and col.type is not float: return False  # min and max ignore NaN, which is != any value
+                if op == '<' and not lo < val: return False
+                if op == '<=' and not lo <= val: return False
+                if op == '>' and not hi > val: return False
+                if op == '>=' and not hi >= val: return False
+            except TypeError:
+                continue
+        return True
+
+    def matchingRowIndexes(self, preds):
+        '''Return list of indexes of rows which match all of *preds*, a list of (col, op, value), reading only row groups whose statistics do not rule them out.
+        Return None if they cannot be evaluated with Arrow kernels.'''
+        pa = vd.importExternal('pyarrow')
+        pc = vd.importExternal('pyarrow.compute', 'pyarrow')
+        funcs = {'==': pc.equal, '!=': pc.not_equal, '<': pc.less, '<=': pc.less_equal, '>': pc.greater, '>=': pc.greater_equal}
+
+        if not all(self.canFilter(col) for col, op, val in preds):
+            return None
+
+        starts = self.rowGroupStarts
+        positions = self.rowPositions(self.rows)
+        if positions is not None and not positionsWithin(positions, 0, starts[-1]):  # added rows
+            return None
+        del positions
+
+        matched = []
+        try:
+            for g in Progress(range(len(starts)-1), gerund='filtering'):
+                if not self.rowGroupMayMatch(g, preds):
+                    continue
+                mask = None
+                for col, op, val in preds:
+                    m = pc.fill_null(funcs[op](col.rowGroup(g), pa.scalar(val)), _nullMatches[op])
+                    mask = m if mask is None else pc.and_(mask, m)
+                for chunk, chunkstart in zip(mask.chunks, itertools.accumulate([starts[g]]+[len(c) for c in mask.chunks])):
+                    matched.append(pc.add(pc.indices_nonzero(chunk).cast(pa.int64()), chunkstart))
+        except pa.ArrowException as e:  # like comparing strings to numbers
+            vd.debug(f'filtering in Python: {e}')
+            return None
+
+        matched = pa.concat_arrays(matched) if matched else pa.array([], type=pa.int64())
+        positions = self.rowPositions(self.rows)
+        if positions is None:
+            return matched.to_pylist()
+        return pc.indices_nonzero(pc.is_in(positions, value_set=matched)).to_pylist()
+
+    def equalRowIndexes(self, col, val):
+        if not isinstance(val, TypedWrapper):
+            idxs = self.matchingRowIndexes([(col, '==', val)])
+            if idxs is not None:
+                return idxs
+        return super().equalRowIndexes(col, val)
+
+    def gatherExpr(self, expr):
+        'Generate rows for which Python *expr* is true.  If it compares columns to constants, read only the row groups which may match.'
+        preds = self.exprPredicates(expr)
+        idxs = self.matchingRowIndexes(preds) if preds else None
+        if idxs is None:
+            return self.gatherBy(lambda r: self.evalExpr(expr, r))
+        rows = self.rows
+        return (rows[i] for i in idxs)
+
 
-        for i in range(self.tbl.num_rows):
-            yield dict(__rownum__=i)
+ParquetSheet.addCommand('z|', 'select-expr', 'expr=inputExpr("select by expr: "); select(gatherExpr(expr), progress=False)', 'select rows matching Python expression in any visible column')
+ParquetSheet.addCommand('z\\', 'unselect-expr', 'expr=inputExpr("unselect by expr: "); unselect(gatherExpr(expr), progress=False)', 'unselect rows matching Python expression in any visible column')
 
 
 @VisiData.api
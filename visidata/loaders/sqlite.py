@@ -1,10 +1,15 @@
 from copy import copy
 import re
+import threading
+import collections
 
-from visidata import VisiData, vd, Sheet, options, Column, Progress, anytype, ColumnItem, asyncthread, TypedExceptionWrapper, TypedWrapper, IndexSheet, vlen
+from visidata import VisiData, vd, Sheet, options, Column, Progress, anytype, ColumnItem, asyncthread, TypedExceptionWrapper, TypedWrapper, IndexSheet, vlen, ScopedSetattr, wrapply
 from visidata.type_date import date
+from visidata.freqtbl import FreqTableSheet
+from visidata.pivot import PivotGroupRow
 
 vd.option('sqlite_onconnect', '', 'sqlite statement to execute after opening a connection')
+vd.option('sqlite_page_rows', 0, 'number of rows of a sqlite table fetched at a time as they are used, by queries run while drawing (0 to load all rows)')
 
 
 def requery(url, **kwargs):
@@ -36,6 +41,237 @@ def openurl_sqlite(vd, p, filetype=None):
 VisiData.open_sqlite3 = VisiData.open_sqlite
 VisiData.open_db = VisiData.open_sqlite
 
+
+def parse_sqlite_type(t):
+    'Return VisiData type for the declared sqlite column type *t*.'
+    m = re.match(r'(\w+)(\((\d+)(,(\d+))?\))?', t.upper())
+    if not m: return anytype
+    typename, _, i, _, f = m.groups()
+    if typename == 'DATE': return date
+    if 'INT' in typename: return int
+    if typename == 'REAL': return float
+    if typename == 'NUMBER':
+        return int if f == '0' else float
+    return anytype
+
+
+def sqlite_affinity(t):
+    'Return the type affinity of a column with declared sqlite type *t*: INTEGER, TEXT, BLOB, REAL, or NUMERIC.'
+    t = t.upper()
+    if 'INT' in t: return 'INTEGER'
+    if any(x in t for x in ('CHAR', 'CLOB', 'TEXT')): return 'TEXT'
+    if 'BLOB' in t or not t: return 'BLOB'
+    if any(x in t for x in ('REAL', 'FLOA', 'DOUB')): return 'REAL'
+    return 'NUMERIC'
+
+
+def sqlite_regexp(pattern, value):
+    'Return True if *value* matches regex *pattern*; for the REGEXP operator.'
+    return value is not None and re.search(pattern, str(value)) is not None
+
+
+def keysetCondition(keys, key, after=True):
+    '''Return (cond, parms) for the SQL condition that a row is after the row with sort *key* (or before it, unless *after*), in the order of *keys*, a list of (sqlexpr, rowidx, reverse) ending with a unique key.
+    NULL is less than any value, as when sqlite orders rows.'''
+    cond, parms = None, []
+    for (expr, _, reverse), v in reversed(list(zip(keys, key))):
+        if reverse != after:  # later rows have greater values
+            beyond, bparms = (f'{expr} IS NOT NULL', []) if v is None else (f'{expr} > ?', [v])
+        else:
+            beyond, bparms = ('0', []) if v is None else (f'({expr} < ? OR {expr} IS NULL)', [v])
+
+        if cond is None:
+            cond, parms = beyond, bparms
+        else:
+            cond = f'{beyond} OR ({expr} IS ? AND ({cond}))'
+            parms = bparms + [v] + parms
+    return cond, parms
+
+
+class SqliteRows(collections.abc.MutableSequence):
+    '''Rows of table *tableName* in a sqlite database, fetched with a connection from *connect()* a page of *pagesize* rows at a time as they are used.  Only the most recently used pages are kept.
+    The rows are those matching the SQL condition *where* with *parms*, ordered by *ordering*, a list of (sqlexpr, rowidx, reverse) with the index of each sort key in the row, and then by rowid.
+    A page is fetched after the last row of the page before it, or before the first row of the page after it (keyset pagination), and only by OFFSET if neither is known.
+    Once rows are added, deleted, or reordered, all of them are fetched and kept in a list.'''
+    maxpages = 32
+
+    def __init__(self, connect, tableName, pagesize, where='', parms=(), ordering=(), n=None):
+        self.connect = connect
+        self.tableName = tableName
+        self.pagesize = pagesize
+        self.where = where
+        self.parms = list(parms)
+        self.ordering = list(ordering)
+        self.n = n  # number of rows, or None until counted
+        self._list = None  # list of all rows, or None while they are fetched as used
+        self._local = threading.local()  # .conn for each thread, shared with rows derived from these
+        self._lock = threading.Lock()
+        self._pages = collections.OrderedDict()  # [pagenum] -> list of rows, most recently used last
+        self._firstkeys = {}  # [pagenum] -> sort key of first row on page
+        self._lastkeys = {}  # [pagenum] -> sort key of last row on page
+
+    def __repr__(self):
+        return f'<SqliteRows of {len(self)} rows in {self.tableName}>'
+
+    @property
+    def lazy(self):
+        'True if rows are fetched as they are used.'
+        return self._list is None
+
+    def derived(self, where='', parms=(), n=None):
+        ret = SqliteRows(self.connect, self.tableName, self.pagesize, where, parms, self.ordering, n)
+        ret._local = self._local
+        return ret
+
+    def execute(self, sql, parms=()):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        vd.debug(sql)
+        return conn.execute(sql, parms)
+
+    def sortKeys(self):
+        return self.ordering + [('rowid', 0, False)]
+
+    def sortKey(self, row):
+        return tuple(row[i] for _, i, _ in self.sortKeys())
+
+    def select(self, cond='', parms=(), reverse=False, limit=None, offset=0):
+        'Return cursor of the rows also matching SQL *cond* with *parms*, in order (or in reverse).'
+        sql = f'SELECT rowid, * FROM "{self.tableName}"'
+        conds = [c for c in (self.where, cond) if c]
+        if conds:
+            sql += ' WHERE ' + ' AND '.join(f'({c})' for c in conds)
+        sql += ' ORDER BY ' + ', '.join(expr + (' DESC' if rev != reverse else '') for expr, _, rev in self.sortKeys())
+        if limit is not None:
+            sql += f' LIMIT {limit}'
+            if offset:
+                sql += f' OFFSET {offset}'
+        return self.execute(sql, self.parms+list(parms))
+
+    def page(self, pagenum):
+        'Return list of rows on page *pagenum*, fetching them if they are not kept.'
+        with self._lock:
+            rows = self._pages.get(pagenum)
+            if rows is not None:
+                self._pages.move_to_end(pagenum)
+                return rows
+            prevkey = self._lastkeys.get(pagenum-1)
+            nextkey = self._firstkeys.get(pagenum+1)
+
+        keys = self.sortKeys()
+        if pagenum == 0:
+            rows = self.select(limit=self.pagesize).fetchall()
+        elif prevkey is not None:
+            rows = self.select(*keysetCondition(keys, prevkey), limit=self.pagesize).fetchall()
+        elif nextkey is not None:
+            rows = self.select(*keysetCondition(keys, nextkey, after=False), reverse=True, limit=self.pagesize).fetchall()
+            rows.reverse()
+        else:
+            rows = self.select(limit=self.pagesize, offset=pagenum*self.pagesize).fetchall()
+
+        with self._lock:
+            if rows:
+                self._firstkeys[pagenum] = self.sortKey(rows[0])
+                self._lastkeys[pagenum] = self.sortKey(rows[-1])
+            self._pages[pagenum] = rows
+            while len(self._pages) > self.maxpages:
+                self._pages.popitem(last=False)
+        return rows
+
+    def __len__(self):
+        if self._list is not None:
+            return len(self._list)
+        if self.n is None:
+            sql = f'SELECT COUNT(*) FROM "{self.tableName}"'
+            if self.where:
+                sql += ' WHERE ' + self.where
+            self.n = self.execute(sql, self.parms).fetchone()[0]
+        return self.n
+
+    def __getitem__(self, i):
+        if self._list is not None:
+            return self._list[i]
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('row index out of range')
+        pagenum, j = divmod(i, self.pagesize)
+        rows = self.page(pagenum)
+        if j >= len(rows):  # table changed since counted; count again for the next draw
+            with self._lock:
+                self.n = None
+                self._pages.clear()
+                self._firstkeys.clear()
+                self._lastkeys.clear()
+            return []
+        return rows[j]
+
+    def __iter__(self):
+        if self._list is not None:
+            yield from self._list
+        else:
+            yield from self.select()
+
+    def _materialize(self):
+        if self._list is None:
+            self._list = list(Progress(self.select(), gerund='fetching', total=len(self)))
+            with self._lock:
+                self._pages.clear()
+        return self._list
+
+    def __setitem__(self, i, row):
+        self._materialize()[i] = row
+
+    def __delitem__(self, i):
+        del self._materialize()[i]
+
+    def insert(self, i, row):
+        self._materialize().insert(i, row)
+
+    def clear(self):
+        self._list = []
+
+    def reorder(self, idxs):
+        'Put rows in the order given by the list of current row indexes *idxs*.'
+        rows = self._materialize()
+        self._list = [rows[i] for i in idxs]
+
+    def reorderBy(self, ordering):
+        'Order rows by *ordering*, a list of (sqlexpr, rowidx, reverse), and then as they were ordered before.'
+        exprs = set(expr for expr, _, _ in ordering)
+        self.ordering = list(ordering) + [k for k in self.ordering if k[0] not in exprs]
+        with self._lock:
+            self._pages.clear()
+            self._firstkeys.clear()
+            self._lastkeys.clear()
+
+    def filtered(self, cond, parms=(), n=None):
+        'Return SqliteRows of the rows which also match SQL *cond* with *parms*; *n* is the number of them, if known.'
+        where = f'({self.where}) AND ({cond})' if self.where else cond
+        return self.derived(where, self.parms+list(parms), n)
+
+    def groupCounts(self, exprs):
+        'Generate (values, count) for each distinct list of values of the SQL *exprs* in the rows; in order of first appearance, if the rows are in rowid order.'
+        sql = f'SELECT {", ".join(exprs)}, COUNT(*) FROM "{self.tableName}"'
+        if self.where:
+            sql += ' WHERE ' + self.where
+        sql += ' GROUP BY ' + ', '.join(exprs)
+        if not self.ordering:
+            sql += ' ORDER BY MIN(rowid)'
+        for *vals, n in self.execute(sql, self.parms):
+            yield vals, n
+
+    def __copy__(self):
+        ret = self.derived(self.where, self.parms, self.n)
+        if self._list is not None:
+            ret._list = list(self._list)
+        return ret
+
+
 # rowdef: list of values
 class SqliteSheet(Sheet):
     'Provide functionality for importing SQLite databases.'
@@ -43,6 +279,7 @@ class SqliteSheet(Sheet):
     defer = True
     query = ''
     tableName = ''
+    rowidColumn = None
 
     def resolve(self):
         'Resolve all the way back to the original source Path.'
@@ -56,6 +293,7 @@ class SqliteSheet(Sheet):
 
         con = sqlite3.connect(url, uri=True, **self.options.getall('sqlite_connect_'))
         con.text_factory = lambda s, enc=self.options.encoding, encerrs=self.options.encoding_errors: s.decode(enc, encerrs)
+        con.create_function('regexp', 2, sqlite_regexp)
         if self.options.sqlite_onconnect:
             con.execute(self.options.sqlite_onconnect)
         return con
@@ -75,38 +313,33 @@ class SqliteSheet(Sheet):
         vd.debug(sql)
         return conn.execute(sql, parms)
 
+    def addTableColumns(self, conn, tblname:str):
+        '''Add columns for `tblname`, with type information from table_xinfo(),
+        and a rowid column if available (for simpler updates).'''
+        self.rowidColumn = None
+        self.columns = []
+        for r in self.execute(conn, 'PRAGMA TABLE_XINFO("%s")' % tblname):
+            colnum, colname, coltype, nullable, defvalue, colkey, *_ = r
+            c = ColumnItem(colname, colnum+1, type=parse_sqlite_type(coltype), sqlname=colname, sqltype=coltype)
+            self.addColumn(c)
+
+            if colkey:
+                self.setKeys([c])
+
+        sql = self.row[5]  # SQL used to create table
+        if 'WITHOUT ROWID' not in sql and 'CREATE VIEW' not in sql:
+            self.rowidColumn = ColumnItem('rowid', 0, type=int, width=0, sqlname='rowid', sqltype='INTEGER')
+            self.addColumn(self.rowidColumn, index=0)
+
     def iterload_table(self, tblname:str):
         '''Generate all rows from `tblname` in database at self.source,
         including type information from table_xinfo(), and getting each rowid
         if available (for simpler updates).'''
 
-        def parse_sqlite_type(t):
-            m = re.match(r'(\w+)(\((\d+)(,(\d+))?\))?', t.upper())
-            if not m: return anytype
-            typename, _, i, _, f = m.groups()
-            if typename == 'DATE': return date
-            if 'INT' in typename: return int
-            if typename == 'REAL': return float
-            if typename == 'NUMBER':
-                return int if f == '0' else float
-            return anytype
-
         self.rowidColumn = None
         with self.conn() as conn:
             if not isinstance(self, SqliteIndexSheet):
-                self.columns = []
-                for r in self.execute(conn, 'PRAGMA TABLE_XINFO("%s")' % tblname):
-                    colnum, colname, coltype, nullable, defvalue, colkey, *_ = r
-                    c = ColumnItem(colname, colnum+1, type=parse_sqlite_type(coltype))
-                    self.addColumn(c)
-
-                    if colkey:
-                        self.setKeys([c])
-
-                sql = self.row[5]  # SQL used to create table
-                if 'WITHOUT ROWID' not in sql and 'CREATE VIEW' not in sql:
-                    self.rowidColumn = ColumnItem('rowid', 0, type=int, width=0)
-                    self.addColumn(self.rowidColumn, index=0)
+                self.addTableColumns(conn, tblname)
 
             if self.rowidColumn:
                 r = self.execute(conn, 'SELECT rowid, * FROM "%s"' % tblname)
@@ -132,6 +365,20 @@ class SqliteSheet(Sheet):
             for row in self.result:
                 yield row
 
+    def loader(self):
+        'Fetch rows of a table with rowids a page at a time as they are used, if options.sqlite_page_rows is set; otherwise load all rows.'
+        pagesize = self.options.sqlite_page_rows
+        if not self.tableName or not pagesize or isinstance(self, SqliteIndexSheet):
+            return super().loader()
+
+        with self.conn() as conn:
+            self.addTableColumns(conn, self.tableName)
+
+        if not self.rowidColumn:
+            return super().loader()
+
+        self.rows = SqliteRows(self.conn, self.tableName, pagesize)
+
     def iterload(self):
         if self.tableName:
             yield from self.iterload_table(self.tableName)
@@ -140,6 +387,81 @@ class SqliteSheet(Sheet):
         else:
             vd.fail('no query or tablename to load')
 
+    def rowid(self, row):
+        'Return the rowid in the table for rows fetched from it, so they are the same row when fetched again.'
+        if self.rowidColumn and type(row) is tuple:
+            return ~row[0]  # negative, unlike id()
+        return super().rowid(row)
+
+    def lazyRows(self):
+        'Return rows if they are fetched from the table as they are used, otherwise None.'
+        rows = self.rows
+        if isinstance(rows, SqliteRows) and rows.lazy:
+            return rows
+
+    def sqlExpr(self, col):
+        'Return SQL expression for the typed values of *col*, or None if they are not the values in the table as stored (computed, converted, or with pending changes).'
+        sqlname = getattr(col, 'sqlname', None)
+        if sqlname is None or self._deferredMods:
+            return None
+        if col.type not in (int, float, anytype) or col.type is not parse_sqlite_type(col.sqltype):
+            return None
+        if sqlite_affinity(col.sqltype) not in ('INTEGER', 'REAL', 'TEXT'):  # compared with conversions, like '5' = 5
+            return None
+        return 'rowid' if col.expr == 0 else '"%s"' % sqlname.replace('"', '""')
+
+    def textExpr(self, col):
+        'Return SQL expression for the displayed values of *col*, or None if they are not the text stored in the table.'
+        if col.fmtstr or sqlite_affinity(getattr(col, 'sqltype', '')) != 'TEXT':
+            return None
+        return self.sqlExpr(col)
+
+    def groupExpr(self, col):
+        'Return SQL expression to group rows by *col* as they would be grouped in a frequency table, or None if the database cannot group them.'
+        if self.options.group_typed or (col.type is int and not col.fmtstr):
+            return self.sqlExpr(col)
+        return self.textExpr(col)
+
+    def sort(self):
+        'Sort rows according to the current internal ordering, by the database with ORDER BY if it has the values of all ordering columns.'
+        rows = self.lazyRows()
+        ordering = []
+        for col, reverse in self._ordering:
+            col = self.column(col) if isinstance(col, str) else col
+            expr = self.sqlExpr(col)
+            if expr is None:
+                rows = None
+                break
+            ordering.append((expr, col.expr, reverse))
+
+        if rows is None:
+            return super().sort()
+        rows.reorderBy(ordering)
+
+    def equalRows(self, col, val, display=False):
+        'Generate rows with displayed value (if *display*) or typed value *val* in *col*, selected by the database with WHERE if it can compare them.'
+        expr = self.textExpr(col) if display else self.sqlExpr(col)
+        rows = self.lazyRows()
+        if rows is None or expr is None or isinstance(val, TypedWrapper) or val == '':  # '' is also displayed for NULL
+            if display:
+                return self.gatherBy(lambda r,c=col,v=val: c.getDisplayValue(r) == v)
+            return self.gatherBy(lambda r,c=col,v=val: c.getTypedValue(r) == v)
+        return iter(rows.filtered(f'{expr} = ?', [val]))
+
+    def regexRows(self, col, regex, flags):
+        'Generate rows with displayed value in *col* matching *regex* with *flags*, selected by the database with REGEXP if it has the displayed values.'
+        expr = self.textExpr(col)
+        rows = self.lazyRows()
+        if rows is None or expr is None:
+            return (self.rows[i] for i in vd.searchRegex(self, regex=regex, regex_flags=flags, columns=[col]))
+
+        pattern = f'(?{flags.lower()}){regex}' if flags else regex
+        try:
+            vd.searchContext.update(regex=re.compile(pattern), columns=[col])
+        except re.error as e:
+            vd.fail(f'invalid regex: {e}')
+        return iter(rows.filtered(f"coalesce({expr}, '') REGEXP ?", [pattern]))
+
     @asyncthread
     def putChanges(self):
         adds, mods, dels = self.getDeferredChanges()
@@ -205,6 +527,33 @@ class SqliteSheet(Sheet):
         self.reload()
 
 
+class SqliteFreqTableSheet(FreqTableSheet):
+    'Frequency table of a SqliteSheet, counted by the database with GROUP BY if it can group the values of all grouped columns.'
+    def loader(self):
+        rows = self.source.lazyRows()
+        exprs = [self.source.groupExpr(c) for c in self.groupByCols]
+        if rows is None or None in exprs or any(self.isNumericRange(c) for c in self.groupByCols):
+            return super().loader()
+
+        aggthread = self.addAggregateCols()
+        with ScopedSetattr(self, 'loading', True):
+            self.rows = []
+            cond = ' AND '.join(f'{expr} IS ?' for expr in exprs)
+            for vals, n in Progress(rows.groupCounts(exprs), gerund='grouping', total=0):
+                keys = [wrapply(c.type, v) for c, v in zip(self.groupByCols, vals)]
+                grouprow = PivotGroupRow(keys, (0, 0), rows.filtered(cond, vals, n=n), {})
+                self.addRow(grouprow)
+                self.updateLargest(grouprow)
+        vd.sync(aggthread)
+
+
+def makeSqliteFreqTable(sheet, *groupByCols):
+    return SqliteFreqTableSheet(sheet.name,
+                                '%s_freq' % '-'.join(col.name for col in groupByCols),
+                                groupByCols=groupByCols,
+                                source=sheet)
+
+
 class SqliteIndexSheet(SqliteSheet, IndexSheet):
     rowtype = 'tables'
     tableName = 'sqlite_master'
@@ -299,6 +648,12 @@ def save_sqlite(vd, p, *vsheets):
 
 
 SqliteSheet.addCommand('', 'exec-sql', 'vd.push(rawSql(input("execute SQL: ", type="sql")))', 'execute raw SQL statement')
+SqliteSheet.addCommand('F', 'freq-col', 'vd.push(makeSqliteFreqTable(sheet, cursorCol))', 'open Frequency Table grouped on current column, with aggregations of other columns')
+SqliteSheet.addCommand('gF', 'freq-keys', 'vd.push(makeSqliteFreqTable(sheet, *keyCols))', 'open Frequency Table grouped by all key columns on source sheet, with aggregations of other columns')
+SqliteSheet.addCommand(',', 'select-equal-cell', 'select(equalRows(cursorCol, cursorDisplay, display=True), progress=False)', 'select rows matching current cell in current column')
+SqliteSheet.addCommand('z,', 'select-exact-cell', 'select(equalRows(cursorCol, cursorTypedValue), progress=False)', 'select rows matching current cell in current column')
+SqliteSheet.addCommand('|', 'select-col-regex', 'select(regexRows(cursorCol, **inputRegex("select")), progress=False)', 'select rows matching regex in current column')
+SqliteSheet.addCommand('\\', 'unselect-col-regex', 'unselect(regexRows(cursorCol, **inputRegex("unselect")), progress=False)', 'unselect rows matching regex in current column')
 
 SqliteIndexSheet.addCommand('a', 'add-table', 'fail("create a new table by saving a sheet to this database file")', 'stub; add table by saving a sheet to the db file instead')
 SqliteIndexSheet.bindkey('ga', 'add-table')
@@ -312,4 +667,7 @@ vd.addMenuItems('''
 vd.addGlobals({
     'SqliteIndexSheet': SqliteIndexSheet,
     'SqliteSheet': SqliteSheet,
+    'SqliteRows': SqliteRows,
+    'SqliteFreqTableSheet': SqliteFreqTableSheet,
+    'makeSqliteFreqTable': makeSqliteFreqTable,
 })
@@ -1,4 +1,5 @@
 import os
+import codecs
 import contextlib
 import itertools
 import collections
@@ -7,11 +8,13 @@ import time
 
 from visidata import vd, asyncthread, options, Progress, ColumnItem, SequenceSheet, Sheet, VisiData
 from visidata import namedlist, filesize
+from visidata.text_source import readTextRange
 
 vd.option('delimiter', '\t', 'field delimiter to use for tsv/usv filetype', replay=True)
 vd.option('row_delimiter', '\n', 'row delimiter to use for tsv/usv filetype', replay=True)
 vd.option('tsv_safe_newline', '\u001e', 'replacement for newline character when saving to tsv', replay=True)
 vd.option('tsv_safe_tab', '\u001f', 'replacement for tab character when saving to tsv', replay=True)
+vd.option('tsv_mmap', False, 'read local uncompressed tsv files from a memory map (a file truncated while loading will crash visidata)', max_help=-1)
 
 
 @VisiData.api
@@ -67,15 +70,92 @@ def splitter(stream, delim='\n'):
         yield from buf.rstrip(delim).split(delim)
 
 
+def mmapSplitter(path, delim, rowdelim, encoding, encoding_errors, blocksize=2**22):
+    '''Generate rows of fields from the local file at *path*, memory-mapped and split at *rowdelim* in the mapped bytes.
+    Each block of rows is copied out and decoded once, instead of appending to and splitting a growing buffer.  Newlines are translated as in a file opened in text mode.'''
+    import mmap
+
+    bom = b''
+    if codecs.lookup(encoding).name == 'utf-8-sig':
+        bom = codecs.BOM_UTF8
+        encoding = 'utf-8'
+
+    browdelim = rowdelim.encode(encoding)
+
+    with open(path, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        pos = len(bom) if bom and mm[:len(bom)] == bom else 0
+        with Progress(gerund='reading', total=size) as prog:
+            prog.addProgress(pos)
+            while pos < size:
+                # end the block after its last row delimiter, growing it for very long rows
+                n = blocksize
+                while True:
+                    end = mm.rfind(browdelim, pos, pos+n)
+                    if end >= 0:
+                        end += len(browdelim)
+                        break
+                    if pos+n >= size:
+                        end = size
+                        break
+                    n *= 2
+
+                text = mm[pos:end].decode(encoding, encoding_errors)
+                if '\r' in text:
+                    text = text.replace('\r\n', '\n').replace('\r', '\n')
+                yield from [line.split(delim) for line in text.split(rowdelim) if line]
+
+                prog.addProgress(end-pos)
+                pos = end
+
+
+def parseTsvRange(path, start, end, encoding, encoding_errors, delim):
+    'Return list of rows split from the bytes *start* to *end* of the file at *path*.  Runs in a worker process.'
+    text = readTextRange(path, start, end, encoding, encoding_errors)
+    return [line.split(delim) for line in text.split('\n') if line]
+
+
 # rowdef: list
 class TsvSheet(SequenceSheet):
     delimiter = ''
     row_delimiter = ''
 
+    def loader(self):
+        delim = self.delimiter or self.options.delimiter
+        rowdelim = self.row_delimiter or self.options.row_delimiter
+
+        def parse(lines):
+            line = next(lines)
+            if line.endswith('\n'):
+                line = line[:-1]
+            return line.split(delim)
+
+        if not (rowdelim == '\n' and self.loadIndexed(parse, skipEmpty=True)):
+            super().loader()
+
     def iterload(self):
         delim = self.delimiter or self.options.delimiter
         rowdelim = self.row_delimiter or self.options.row_delimiter
 
+        path = self.parallelSourcePath()
+        if path and rowdelim == '\n':
+            for row in self.iterloadParallel(path, parseTsvRange, delim):
+                if len(row) < self.nVisibleCols:
+                    # extend rows that are missing entries
+                    row.extend([None]*(self.nVisibleCols-len(row)))
+                yield row
+            return
+
+        path = self.options.tsv_mmap and self.localSourcePath()
+        if path and os.path.getsize(path) > 0 and '\r' not in rowdelim:
+            for row in mmapSplitter(path, delim, rowdelim, self.options.encoding, self.options.encoding_errors):
+                if len(row) < self.nVisibleCols:
+                    # extend rows that are missing entries
+                    row.extend([None]*(self.nVisibleCols-len(row)))
+                yield row
+            return
+
+        # pipes and slow streams
         with self.open_text_source() as fp:
                 for line in splitter(adaptive_bufferer(fp), rowdelim):
                     if not line:
@@ -101,8 +181,8 @@ def save_tsv(vd, p, vs, delimiter='', row_delimiter=''):
         colhdr = unitsep.join(col.name.translate(trdict) for col in vs.visibleCols) + rowsep
         fp.write(colhdr)
 
-        for dispvals in vs.iterdispvals(format=True):
-            fp.write(unitsep.join(dispvals.values()))
+        for dispvals in vs.iterdisprows(format=True):
+            fp.write(unitsep.join(dispvals))
             fp.write(rowsep)
 
     vd.status('%s save finished' % p)
@@ -1,10 +1,18 @@
+import os
+import sys
 import collections
+import concurrent.futures
 from copy import copy
-from visidata import ScopedSetattr, Column, Sheet, asyncthread, Progress, forward, wrapply, INPROGRESS
-from visidata import vlen, vd, date, setitem
+from visidata import ScopedSetattr, Column, Sheet, asyncthread, Progress, forward, wrapply, INPROGRESS, UNLOADED
+from visidata import vlen, vd, date, setitem, drawcache_property
 import visidata
 
 
+vd.option('group_typed', False, 'group rows in pivot and frequency tables by their typed values instead of their formatted values', replay=True)
+vd.option('group_workers', 0, 'number of threads grouping rows for pivot and frequency tables (0 for one per cpu if Python has no GIL, otherwise 1)')
+vd.option('group_chunk_size', 100000, 'number of source rows grouped together in each chunk')
+
+
 # discrete_keys = tuple of formatted discrete keys that group the row
 # numeric_key is a range
 # sourcerows is list(all source.rows in group)
@@ -23,6 +31,31 @@ def makeErrorKey(col):
     else:
         return col.type()
 
+def typedGroupKey(col, v):
+    'Return key to group typed value *v* of *col* by: *v* itself if hashable, otherwise its formatted value.'
+    try:
+        hash(v)
+    except TypeError:
+        return wrapply(col.format, v)
+    if v != v:  # NaN
+        return str(v)
+    return v
+
+def formattedGroupKeyFunc(col):
+    'Return func(v) which returns the formatted value of *col* for typed value *v*, formatting each distinct value only once.'
+    memo = {}  # [(type(v), v)] -> formatted value
+    def _formatted(v):
+        k = (type(v), v)
+        try:
+            return memo[k]
+        except KeyError:
+            # wrapply will pass-through a key-able TypedWrapper
+            r = memo[k] = wrapply(col.format, v)
+            return r
+        except TypeError:  # unhashable
+            return wrapply(col.format, v)
+    return _formatted
+
 def formatRange(col, numeric_key):
     a, b = numeric_key
     nankey = makeErrorKey(col)
@@ -53,7 +86,10 @@ class AggrColumn(Column):
     def calcValue(col, row):
         if col.sheet.loading:
             return visidata.INPROGRESS
-        return col.aggregator(col.origCol, row.sourcerows)
+        aggs = col.sheet.rowAggregates(row)
+        if col not in aggs:
+            return col.aggregator(col.origCol, row.sourcerows)
+        return aggs[col]
 
 
 def makeAggrColumn(aggcol, aggregator):
@@ -100,6 +136,19 @@ class PivotSheet(Sheet):
 
         self.setKeys(self.columns)
 
+    @drawcache_property
+    def _aggregates(self):
+        return {}  # [id(row)] -> {AggrColumn: aggregated value}; cleared every frame
+
+    def rowAggregates(self, row):
+        'Return dict of [AggrColumn] -> value for *row*, aggregating all AggrColumns together in one pass over its source rows.'
+        aggs = self._aggregates.get(id(row))
+        if aggs is None:
+            aggcols = [c for c in self.columns if isinstance(c, AggrColumn)]
+            vals = self.source.aggregateRows([(c.origCol, c.aggregator) for c in aggcols], row.sourcerows)
+            aggs = self._aggregates[id(row)] = dict(zip(aggcols, vals))
+        return aggs
+
     def openRow(self, row):
         'open sheet of source rows aggregated in current pivot row'
         vs = copy(self.source)
@@ -219,65 +268,136 @@ class PivotSheet(Sheet):
             else:
                 numericBins = [(minval+width*i, minval+width*(i+1)) for i in range(nbins)]
 
-        # group rows by their keys (groupByCols), and separate by their pivot values (pivotCols)
-        groups = {}  # [formattedDiscreteKeys] -> (numericGroupRows:dict(formattedNumericKeyRange -> PivotGroupRow), groupRow:PivotGroupRow)  # groupRow is main/error row
+        # numeric bins which format the same are one bin, as the last of them
+        binIndex = {formatRange(numericCols[0], numRange): i for i, numRange in enumerate(numericBins)}
+        canonicalBins = [binIndex[formatRange(numericCols[0], numRange)] for numRange in numericBins]
+        degenerateBins = {a: i for i, (a, b) in enumerate(numericBins)} if degenerateBinning else {}
+
+        def binKey(sourcerow):
+            'Return (binkey, numeric_key) of the numeric bin *sourcerow* belongs in.'
+            val = None
+            try:
+                val = numericCols[0].getValue(sourcerow)
+                val = wrapply(numericCols[0].type, val)
+                if not val:
+                    return binIndex.get(str(val), str(val)), val
+                if not width:
+                    binidx = 0
+                elif degenerateBinning:
+                    # in degenerate binning, each val has its own bin
+                    binidx = degenerateBins[val]
+                else:
+                    binidx = int((val-minval)//width)
+                return canonicalBins[min(binidx, nbins-1)], None
+            except Exception as e:
+                vd.exceptionCaught(e)
+                return str(val), val
+
+        def groupChunk(sourcerows, pos):
+            '''Return partial group map for *sourcerows* (starting at source row *pos*):
+               [(discreteGroupKeys, binkey)] -> ((firstpos, binidx), PivotGroupRow), in order of first appearance.'''
+            groups = {}
+            if self.source.options.group_typed:
+                groupKeys = [lambda v, c=c: typedGroupKey(c, v) for c in discreteCols]
+            else:
+                groupKeys = [formattedGroupKeyFunc(c) for c in discreteCols]
 
-        for sourcerow in Progress(self.source.iterrows(), 'grouping', total=self.source.nRows):
-            discreteKeys = list(forward(origcol.getTypedValue(sourcerow)) for origcol in discreteCols)
+            # typed values of each discrete column for the whole chunk, converted together by columns which can
+            colvals = [origcol.getTypedValues(sourcerows) for origcol in discreteCols]
+            for sourcerow, *typedvals in zip(sourcerows, *colvals):
+                discreteKeys = list(forward(v) for v in typedvals)
 
-            # wrapply will pass-through a key-able TypedWrapper
-            formattedDiscreteKeys = tuple(wrapply(c.format, v) for v, c in zip(discreteKeys, discreteCols))
-
-            numericGroupRows, groupRow = groups.get(formattedDiscreteKeys, (None, None))
-            if numericGroupRows is None:
-                # add new group rows
-                numericGroupRows = {formatRange(numericCols[0], numRange): PivotGroupRow(discreteKeys, numRange, [], {}) for numRange in numericBins}
-                groups[formattedDiscreteKeys] = (numericGroupRows, None)
-                for r in numericGroupRows.values():
-                    self.addRow(r)
-
-            # find the grouprow this sourcerow belongs in, by numericbin
-            if numericCols:
-                try:
-                    val = numericCols[0].getValue(sourcerow)
-                    val = wrapply(numericCols[0].type, val)
-                    if not val:
-                        groupRow = numericGroupRows.get(str(val), None)
-                    else:
-                        if not width:
-                            binidx = 0
-                        elif degenerateBinning:
-                            # in degenerate binning, each val has its own bin
-                            binidx = numericBins.index((val, val))
-                        else:
-                            binidx = int((val-minval)//width)
-                        groupRow = numericGroupRows[formatRange(numericCols[0], numericBins[min(binidx, nbins-1)])]
-                except Exception as e:
-                    vd.exceptionCaught(e)
+                discreteGroupKeys = tuple(keyfunc(v) for keyfunc, v in zip(groupKeys, discreteKeys))
 
-            # add the main bin if no numeric bin (error, or no numeric cols)
-            if groupRow is None:
                 if numericCols:
-                    groupRow = PivotGroupRow(discreteKeys, val, [], {})
-                    numericGroupRows[str(val)] = groupRow
+                    if (discreteGroupKeys, None) not in groups:
+                        # all numeric bins of a group are added together, when the group first appears
+                        groups[(discreteGroupKeys, None)] = None
+                        for i, numRange in enumerate(numericBins):
+                            if canonicalBins[i] == i:
+                                groups[(discreteGroupKeys, i)] = ((pos, i), PivotGroupRow(discreteKeys, numRange, [], {}))
+                    binkey, numericKey = binKey(sourcerow)
                 else:
-                    groupRow = PivotGroupRow(discreteKeys, (0, 0), [], {})
-                    groups[formattedDiscreteKeys] = (numericGroupRows, groupRow)
-                self.addRow(groupRow)
-
-            # add the sourcerow to its all bin
-            groupRow.sourcerows.append(sourcerow)
-
-            # separate by pivot value
-            for col in self.pivotCols:
-                varval = col.getTypedValue(sourcerow)
-                matchingRows = groupRow.pivotrows.get(varval)
-                if matchingRows is None:
-                    matchingRows = groupRow.pivotrows[varval] = []
-                matchingRows.append(sourcerow)
-
-            if rowfunc:
-                rowfunc(groupRow)
+                    binkey, numericKey = (), (0, 0)
+
+                k = (discreteGroupKeys, binkey)
+                entry = groups.get(k)
+                if entry is None:
+                    entry = groups[k] = ((pos, len(numericBins)), PivotGroupRow(discreteKeys, numericKey, [], {}))
+                groupRow = entry[1]
+
+                groupRow.sourcerows.append(sourcerow)
+
+                # separate by pivot value
+                for col in self.pivotCols:
+                    varval = col.getTypedValue(sourcerow)
+                    matchingRows = groupRow.pivotrows.get(varval)
+                    if matchingRows is None:
+                        matchingRows = groupRow.pivotrows[varval] = []
+                    matchingRows.append(sourcerow)
+
+                pos += 1
+
+            return groups
+
+        # group rows by their keys (groupByCols) and numeric bin, and separate by their pivot values (pivotCols)
+        groups = {}  # [(discreteGroupKeys, binkey)] -> PivotGroupRow
+        sourcerows = self.source.rows
+        if sourcerows is UNLOADED:
+            sourcerows = list(self.source.iterrows())
+
+        with Progress(gerund='grouping', total=len(sourcerows)) as prog:
+            for chunk, partial in self.iterChunks(groupChunk, sourcerows):
+                # merge partial group map, in order of source rows
+                newrows = []
+                for k, entry in partial.items():
+                    if entry is None:
+                        continue
+                    sortkey, partialRow = entry
+                    groupRow = groups.get(k)
+                    if groupRow is None:
+                        groups[k] = partialRow
+                        newrows.append((sortkey, partialRow))
+                    else:
+                        groupRow.sourcerows.extend(partialRow.sourcerows)
+                        for varval, rows in partialRow.pivotrows.items():
+                            groupRow.pivotrows.setdefault(varval, []).extend(rows)
+
+                for sortkey, groupRow in sorted(newrows, key=lambda x: x[0]):
+                    self.addRow(groupRow)
+
+                if rowfunc:
+                    for k, entry in partial.items():
+                        if entry is not None:
+                            rowfunc(groups[k])
+
+                prog.addProgress(len(chunk))
+
+    def iterChunks(self, func, rows):
+        '''Generate (chunk, func(chunk, startidx)) for consecutive chunks of *rows*, in order.
+        With more than one worker per options.group_workers, chunks are computed in a pool of threads, which run concurrently on interpreters without a GIL.'''
+        nworkers = self.options.group_workers
+        if not nworkers:
+            nworkers = 1 if getattr(sys, '_is_gil_enabled', lambda: True)() else (os.cpu_count() or 1)
+        chunksize = max(self.options.group_chunk_size, 1)
+        chunks = ((rows[i:i+chunksize], i) for i in range(0, len(rows), chunksize))
+
+        if nworkers <= 1:
+            for chunk, i in chunks:
+                yield chunk, func(chunk, i)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=nworkers) as executor:
+            pending = collections.deque()
+            for chunk, i in chunks:
+                pending.append((chunk, executor.submit(func, chunk, i)))
+                if len(pending) > nworkers*2:  # bound the number of chunks in flight
+                    chunk, fut = pending.popleft()
+                    yield chunk, fut.result()
+
+            while pending:
+                chunk, fut = pending.popleft()
+                yield chunk, fut.result()
 
     def afterLoad(self):
         super().afterLoad()
@@ -30,12 +30,15 @@ class InferColumnsSheet(Sheet):
 
     def addRow(self, row, index=None):
         ret = super().addRow(row, index=index)
+        self.addKeyColumns(row)
+        return ret
+
+    def addKeyColumns(self, row):
+        'Add columns for the keys of *row* which do not have one yet.'
         for k in row:
             if k not in self._knownKeys:
                 self.addColumn(ColumnItem(k, type=deduceType(row[k])))
 
-        return ret
-
 
 InferColumnsSheet.init('_knownKeys', set, copy=True)  # set of row keys already seen
 InferColumnsSheet.init('_ordering', list, copy=True)
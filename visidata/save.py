@@ -1,10 +1,13 @@
 import collections
+import itertools
 from copy import copy
 
 from visidata import vd
-from visidata import Sheet, BaseSheet, VisiData, IndexSheet, Path, Progress, TypedExceptionWrapper
+from visidata import Sheet, BaseSheet, Column, VisiData, IndexSheet, Path, Progress, TypedExceptionWrapper, wrapply
 
 vd.option('safe_error', '#ERR', 'error string to use while saving', replay=True)
+vd.option('save_batch_rows', 10000, 'number of rows fetched and formatted together when saving', max_help=-1)
+vd.option('save_workers', 0, 'number of worker processes formatting values when saving (0 to format in this process)', replay=True)
 vd.option('save_encoding', 'utf-8', 'encoding passed to codecs.open when saving a file', replay=True, help=vd.help_encoding)
 
 @Sheet.api
@@ -21,57 +24,229 @@ def safe_trdict(vs):
     return {}
 
 
+class ColumnSaver:
+    '''Typed (and if *format*, formatted) values of *col* to save, for a batch of rows at a time.
+    Results for str values are memoized, since the same text (like dates or categories) usually recurs, and converting and formatting it is most of the work.'''
+    maxmemo = 100000  # distinct values to remember per column
+
+    def __init__(self, sheet, col, format=False):
+        self.col = col
+        self.format = format
+        self.safe_error = sheet.options.safe_error
+        self.formatterName = col.formatter or sheet.options.disp_formatter
+        self.memo = {}  # [str value] -> saved value
+        self.memoize = True
+
+        self.transforms = [ col.type ]  # applied in order to each value
+        if format:
+            formatMaker = getattr(col, 'formatter_'+self.formatterName)
+            self.transforms.append(formatMaker(col._formatdict))
+        self.trdict = sheet.safe_trdict()
+        if self.trdict:
+            self.transforms.append(lambda v,trdict=self.trdict: v.translate(trdict))
+
+    def getValues(self, rows):
+        'Return list of values of this column for *rows*, with exceptions replaced by options.safe_error.'
+        getValue = self.col.getValue
+        vals = [wrapply(getValue, r) for r in rows]
+        for i, v in enumerate(vals):
+            if isinstance(v, TypedExceptionWrapper) and v.type is getValue:  # raised by getValue, not a cached error value
+                vd.exceptionCaught(v.exception)
+                vals[i] = self.safe_error or str(v.exception)
+        return vals
+
+    def saveValue(self, v):
+        'Return *v* as it is saved: typed, formatted, and with unsafe characters translated.'
+        try:
+            for t in self.transforms:
+                if v is None:
+                    break
+                elif isinstance(v, TypedExceptionWrapper):
+                    v = self.safe_error or str(v)
+                    break
+                else:
+                    v = t(v)
+
+            if v is None and self.format:
+                v = ''
+        except Exception as e:
+            v = str(v)
+        return v
+
+    def saveValues(self, vals):
+        'Return list of saved values for the list of values *vals*.'
+        return self.memoized(self.saveValue, vals)
+
+    def getTypedValues(self, rows):
+        'Return list of typed values of this column for *rows*, as Column.getTypedValues.'
+        col = self.col
+        if type(col).getTypedValues is not Column.getTypedValues:  # computed for all rows together, like ExprColumn
+            return col.getTypedValues(rows)
+        typ = col.type
+        return self.memoized(lambda v: wrapply(typ, v), [wrapply(col.getValue, r) for r in rows])
+
+    def memoized(self, func, vals):
+        'Return list of func(v) for each of *vals*, remembering the result for each str value.'
+        if not self.memoize:
+            return [func(v) for v in vals]
+
+        memo = self.memo
+        if len(memo) > self.maxmemo:
+            memo.clear()
+
+        ret = []
+        misses = 0
+        for v in vals:
+            if type(v) is str:
+                try:
+                    ret.append(memo[v])
+                    continue
+                except KeyError:
+                    misses += 1
+                    memo[v] = r = func(v)
+                    ret.append(r)
+                    continue
+            ret.append(func(v))
+
+        if misses > len(vals)//2:  # mostly distinct values
+            self.memoize = False
+            memo.clear()
+        return ret
+
+    def workerArgs(self):
+        '''Return tuple of args for formatValuesInWorker, to format the values of this column in another process.
+        Return None if only this process can format them (like with a custom type or formatter).'''
+        col = self.col
+        formatterName = 'formatter_'+self.formatterName
+        if not self.format or getattr(type(col), formatterName) is not getattr(Column, formatterName, None):
+            return None
+        typename = getattr(col.type, '__name__', None)
+        if vd.getGlobals().get(typename, None) is not col.type:
+            return None
+        opts = {k: col.sheet.options[k] for k in vd.options.keys() if k.startswith('disp_') or k in workerOptions}
+        return (typename, col._fmtstr, self.formatterName, opts)
+
+
+workerOptions = 'safe_error safety_first delimiter tsv_safe_tab tsv_safe_newline encoding encoding_errors'.split()
+
+def formatValuesInWorker(typename, fmtstr, formatterName, opts, vals):
+    'Return list of saved values for *vals*, as ColumnSaver would for a Column of the given type and formatter, with the given options.  Called in worker processes.'
+    for k, v in opts.items():
+        if vd.options[k] != v:
+            vd.options.set(k, v, 'global')
+
+    vs = Sheet('save')
+    col = Column('', type=vd.getGlobals()[typename], fmtstr=fmtstr, formatter=formatterName)
+    vs.addColumn(col)
+    return ColumnSaver(vs, col, format=True).saveValues(vals)
+
+
+@Sheet.api
+def iterrowbatches(sheet, rows=None):
+    'Generate lists of up to options.save_batch_rows consecutive rows from *rows* (by default, all rows in sheet).'
+    batchrows = max(sheet.options.save_batch_rows, 1)
+    it = iter(sheet.rows if rows is None else rows)
+    while True:
+        batch = list(itertools.islice(it, batchrows))
+        if not batch:
+            return
+        yield batch
+
+
+@Sheet.api
+def iterdispbatches(sheet, *cols, format=False):
+    '''Generate batches of values for given *cols*, for up to options.save_batch_rows rows at a time: a list of values for each column, in the order of *cols*.
+    Values are typed if format=False, or a formatted display string if format=True.'''
+    if not cols:
+        cols = sheet.visibleCols
+
+    savers = [ColumnSaver(sheet, col, format=format) for col in cols]
+    nworkers = sheet.options.save_workers if format else 0
+
+    with Progress(gerund='saving', total=sheet.nRows) as prog:
+        if nworkers < 1 or sheet.nRows <= sheet.options.save_batch_rows*nworkers:
+            for rows in sheet.iterrowbatches():
+                yield [saver.saveValues(saver.getValues(rows)) for saver in savers]
+                prog.addProgress(len(rows))
+            return
+
+        yield from _iterdispbatchesParallel(savers, sheet.iterrowbatches(), nworkers, prog)
+
+
+def _iterdispbatchesParallel(savers, batches, nworkers, prog):
+    import concurrent.futures
+    import multiprocessing
+
+    workerargs = [saver.workerArgs() for saver in savers]
+
+    # spawn instead of fork, since other threads may be holding locks
+    mpctx = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=nworkers, mp_context=mpctx) as executor:
+        def _submit(rows):
+            ret = []
+            for saver, args in zip(savers, workerargs):
+                vals = saver.getValues(rows)
+                if args:
+                    ret.append((vals, executor.submit(formatValuesInWorker, *args, vals)))
+                else:
+                    ret.append((vals, None))
+            return len(rows), ret
+
+        def _results(nrows, colvals):
+            batch = []
+            for saver, (vals, fut) in zip(savers, colvals):
+                try:
+                    batch.append(fut.result() if fut else saver.saveValues(vals))
+                except Exception as e:  # like values which cannot be pickled
+                    vd.debug(f'formatting {saver.col.name} in worker failed: {e}')
+                    batch.append(saver.saveValues(vals))
+            prog.addProgress(nrows)
+            return batch
+
+        pending = collections.deque()
+        try:
+            for rows in batches:
+                pending.append(_submit(rows))
+                if len(pending) > nworkers*2:  # bound the number of batches held in memory
+                    yield _results(*pending.popleft())
+
+            while pending:
+                yield _results(*pending.popleft())
+        finally:
+            for _, colvals in pending:
+                for _, fut in colvals:
+                    if fut:
+                        fut.cancel()
+
+
+@Sheet.api
+def iterdisprows(sheet, *cols, format=False):
+    'For each row in sheet, yield tuple of values for given cols.  Values are typed if format=False, or a formatted display string if format=True.'
+    if not cols:
+        cols = sheet.visibleCols
+
+    if not cols:
+        yield from (() for r in sheet.rows)
+        return
+
+    for batch in sheet.iterdispbatches(*cols, format=format):
+        yield from zip(*batch)
+
+
 @Sheet.api
 def iterdispvals(sheet, *cols, format=False):
-    'For each row in sheet, yield OrderedDict of values for given cols.  Values are typed if format=False, or a formatted display string if format=True.'
+    'For each row in sheet, yield dict of values for given cols.  Values are typed if format=False, or a formatted display string if format=True.'
     if not cols:
         cols = sheet.visibleCols
 
-    transformers = collections.OrderedDict()  # list of transformers for each column in order
-    for col in cols:
-        transformers[col] = [ col.type ]
-        if format:
-            formatMaker = getattr(col, 'formatter_'+(col.formatter or sheet.options.disp_formatter))
-            transformers[col].append(formatMaker(col._formatdict))
-        trdict = sheet.safe_trdict()
-        if trdict:
-            transformers[col].append(lambda v,trdict=trdict: v.translate(trdict))
-
-    options_safe_error = sheet.options.safe_error
-    for r in Progress(sheet.rows):
-        dispvals = collections.OrderedDict()  # [col] -> value
-        for col, transforms in transformers.items():
-            try:
-                dispval = col.getValue(r)
-
-            except Exception as e:
-                vd.exceptionCaught(e)
-                dispval = options_safe_error or str(e)
-
-            try:
-                for t in transforms:
-                    if dispval is None:
-                        break
-                    elif isinstance(dispval, TypedExceptionWrapper):
-                        dispval = options_safe_error or str(dispval)
-                        break
-                    else:
-                        dispval = t(dispval)
-
-                if dispval is None and format:
-                    dispval = ''
-            except Exception as e:
-                dispval = str(dispval)
-
-            dispvals[col] = dispval
-
-        yield dispvals
+    for dispvals in sheet.iterdisprows(*cols, format=format):
+        yield dict(zip(cols, dispvals))
 
 
 @Sheet.api
 def itervals(sheet, *cols, format=False):
-    for row in sheet.iterdispvals(*cols, format=format):
-        yield [row[c] for c in cols]
+    for dispvals in sheet.iterdisprows(*cols, format=format):
+        yield list(dispvals)
 
 @BaseSheet.api
 def getDefaultSaveName(sheet):
@@ -174,8 +349,8 @@ def save_txt(vd, p, *vsheets):
         for vs in vsheets:
             unitsep = vs.options.delimiter
             rowsep = vs.options.row_delimiter
-            for dispvals in vs.iterdispvals(*vs.visibleCols, format=True):
-                fp.write(unitsep.join(dispvals.values()))
+            for dispvals in vs.iterdisprows(*vs.visibleCols, format=True):
+                fp.write(unitsep.join(dispvals))
                 fp.write(rowsep)
     vd.status('%s save finished' % p)
 
@@ -18,16 +18,26 @@ def moveRegex(vd, sheet, *args, **kwargs):
     list(vd.searchRegex(sheet, *args, moveCursor=True, **kwargs))
 
 
+@Sheet.api
+def iterMatches(sheet, regex, columns, backward=False):
+    '''Generate (rowidx, col) for each row with a displayed value matching *regex* in any of *columns*, starting after the cursor and wrapping around.
+    *col* is the first of *columns* which matches in that row.'''
+    def findMatchingColumn(sheet, row, columns, func):
+        'Find column for which func matches the displayed value in this row'
+        for c in columns:
+            if func(c.getDisplayValue(row)):
+                return c
+
+    for rowidx in rotateRange(len(sheet.rows), sheet.cursorRowIndex, reverse=backward):
+        c = findMatchingColumn(sheet, sheet.rows[rowidx], columns, regex.search)
+        if c:
+            yield rowidx, c
+
+
 # kwargs: regex=None, columns=None, backward=False
 @VisiData.api
 def searchRegex(vd, sheet, moveCursor=False, reverse=False, regex_flags=None, **kwargs):
         'Set row index if moveCursor, otherwise return list of row indexes.'
-        def findMatchingColumn(sheet, row, columns, func):
-            'Find column for which func matches the displayed value in this row'
-            for c in columns:
-                if func(c.getDisplayValue(row)):
-                    return c
-
         vd.searchContext.update(kwargs)
 
         regex = kwargs.get("regex")
@@ -55,33 +65,33 @@ def searchRegex(vd, sheet, moveCursor=False, reverse=False, regex_flags=None, **
             searchBackward = not searchBackward
 
         matchingRowIndexes = 0
-        for rowidx in rotateRange(len(sheet.rows), sheet.cursorRowIndex, reverse=searchBackward):
-            c = findMatchingColumn(sheet, sheet.rows[rowidx], columns, regex.search)
-            if c:
-                if moveCursor:
-                    sheet.cursorRowIndex = rowidx
-                    sheet.cursorVisibleColIndex = sheet.visibleCols.index(c)
-                    return
-                else:
-                    matchingRowIndexes += 1
-                    yield rowidx
+        for rowidx, c in sheet.iterMatches(regex, columns, backward=searchBackward):
+            if moveCursor:
+                sheet.cursorRowIndex = rowidx
+                sheet.cursorVisibleColIndex = sheet.visibleCols.index(c)
+                return
+            else:
+                matchingRowIndexes += 1
+                yield rowidx
 
         if kwargs.get('printStatus', True):
             vd.status('%s matches for /%s/' % (matchingRowIndexes, regex.pattern))
 
 
 @Sheet.api
-def searchInputRegex(sheet, action:str, columns:str='cursorCol'):
-    r = vd.inputMultiple(regex=dict(prompt=f"{action} regex: ", type="regex", defaultLast=True, help=vd.help_regex),
-                         flags=dict(prompt="regex flags: ", type="regex_flags", value=sheet.options.regex_flags, help=vd.help_regex_flags))
+def inputRegex(sheet, action:str, type="regex"):
+    'Input regex and regex flags for *action*.  Return dict(regex=, flags=).'
+    return vd.inputMultiple(regex=dict(prompt=f"{action} regex: ", type=type, defaultLast=True, help=vd.help_regex),
+                            flags=dict(prompt="regex flags: ", type="regex_flags", value=sheet.options.regex_flags, help=vd.help_regex_flags))
 
+@Sheet.api
+def searchInputRegex(sheet, action:str, columns:str='cursorCol'):
+    r = sheet.inputRegex(action)
     return vd.searchRegex(sheet, regex=r['regex'], regex_flags=r['flags'], columns=columns)
 
 @Sheet.api
 def moveInputRegex(sheet, action:str, type="regex", **kwargs):
-    r = vd.inputMultiple(regex=dict(prompt=f"{action} regex: ", type=type, defaultLast=True, help=vd.help_regex),
-                         flags=dict(prompt="regex flags: ", type="regex_flags", value=sheet.options.regex_flags, help=vd.help_regex_flags))
-
+    r = sheet.inputRegex(action, type=type)
     return vd.moveRegex(sheet, regex=r['regex'], regex_flags=r['flags'], **kwargs)
 
 @Sheet.api
@@ -4,7 +4,62 @@ from visidata import vd, Sheet, Progress, asyncthread, options, rotateRange, Fan
 vd.option('bulk_select_clear', False, 'clear selected rows before new bulk selections', replay=True)
 vd.option('some_selected_rows', False, 'if no rows selected, if True, someSelectedRows returns all rows; if False, fails')
 
-Sheet.init('_selectedRows', dict)  # rowid(row) -> row
+
+class SelectedRows(dict):
+    '''Selected rows by rowid, with the index in sheet.rows where each was last seen.
+    The indexes are hints, which can be out of date after rows are sorted, added, or deleted.'''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.positions = {}  # rowid(row) -> index into sheet.rows
+
+    def __copy__(self):
+        ret = SelectedRows(self)
+        ret.positions = self.positions.copy()
+        return ret
+
+    def clear(self):
+        super().clear()
+        self.positions.clear()
+
+    def inorder(self, sheet):
+        'Return list of selected rows in the order of *sheet.rows*.  Sort by the known indexes if they are still correct; otherwise find the selected rows in sheet.rows and update the indexes.'
+        rows = sheet.rows
+        rowid = sheet.rowid
+        positions = self.positions
+        nrows = len(rows)
+        try:
+            idxs = sorted((positions[k], k) for k in self)
+            if idxs[-1][0] < nrows:
+                ret = [rows[i] for i, k in idxs]
+                if all(rowid(r) == k for r, (i, k) in zip(ret, idxs)):
+                    return ret
+        except KeyError:  # index not known
+            pass
+
+        positions.clear()
+        ret = []
+        for i, r in enumerate(rows):
+            k = rowid(r)
+            if k in self:
+                positions[k] = i
+                ret.append(r)
+                if len(ret) == len(self):
+                    break
+        return ret
+
+
+def iterNotingPositions(sheet, idxrows):
+    'Generate rows from the (index, row) pairs in *idxrows*, noting the index of each row which the caller then selects.'
+    for i, r in idxrows:
+        yield r
+        sel = sheet._selectedRows
+        if isinstance(sel, SelectedRows):
+            k = sheet.rowid(r)
+            if k in sel:
+                sel.positions[k] = i
+
+
+Sheet.init('_selectedRows', SelectedRows)  # rowid(row) -> row
 
 vd.rowNoters.append(
         lambda sheet, row: sheet.isSelected(row) and sheet.options.disp_selected_note
@@ -18,11 +73,25 @@ def isSelected(self, row):
     'Return True if *row* is selected.'
     return self.rowid(row) in self._selectedRows
 
+@Sheet.api
+def hasDefaultSelection(self):
+    'Return True if selectRow and unselectRow are not overridden, so rows can be added to and removed from ``_selectedRows`` directly.'
+    return type(self).selectRow is Sheet.selectRow and type(self).unselectRow is Sheet.unselectRow
+
 @Sheet.api
 @asyncthread
 def toggle(self, rows):
     'Toggle selection of given *rows*.  Async.'
     self.addUndoSelection()
+    if self.hasDefaultSelection():
+        sel = self._selectedRows
+        rowid = self.rowid
+        for r in Progress(rows, 'toggling', total=len(self.rows)):
+            k = rowid(r)
+            if sel.pop(k, None) is None:
+                sel[k] = r
+        return
+
     for r in Progress(rows, 'toggling', total=len(self.rows)):
         if not self.unselectRow(r):
             self.selectRow(r)
@@ -79,8 +148,13 @@ def select(self, rows, status=True, progress=True):
     before = self.nSelectedRows
     if self.options.bulk_select_clear:
         self.clearSelected()
-    for r in (Progress(rows, 'selecting') if progress else rows):
-        self.selectRow(r)
+    rows = Progress(rows, 'selecting') if progress else rows
+    if self.hasDefaultSelection():
+        rowid = self.rowid
+        self._selectedRows.update((rowid(r), r) for r in rows)
+    else:
+        for r in rows:
+            self.selectRow(r)
     if status:
         if options.bulk_select_clear:
             msg = 'selected %s %s%s' % (self.nSelectedRows, self.rowtype, ' instead' if before > 0 else '')
@@ -94,15 +168,22 @@ def unselect(self, rows, status=True, progress=True):
     "Remove *rows* from set of selected rows. Async. Don't show progress if *progress* is False; don't show status if *status* is False."
     self.addUndoSelection()
     before = self.nSelectedRows
-    for r in (Progress(rows, 'unselecting') if progress else rows):
-        self.unselectRow(r)
+    rows = Progress(rows, 'unselecting') if progress else rows
+    if self.hasDefaultSelection():
+        sel = self._selectedRows
+        rowid = self.rowid
+        for r in rows:
+            sel.pop(rowid(r), None)
+    else:
+        for r in rows:
+            self.unselectRow(r)
     if status:
         vd.status('unselected %s/%s %s' % (before-self.nSelectedRows, before, self.rowtype))
 
 @Sheet.api
 def selectByIdx(self, rowIdxs):
     'Add rows indicated by row indexes in *rowIdxs* to set of selected rows.  Async.'
-    self.select((self.rows[i] for i in rowIdxs), progress=False)
+    self.select(iterNotingPositions(self, ((i, self.rows[i]) for i in rowIdxs)), progress=False)
 
 @Sheet.api
 def unselectByIdx(self, rowIdxs):
@@ -112,19 +193,24 @@ def unselectByIdx(self, rowIdxs):
 @Sheet.api
 def gatherBy(self, func, gerund='gathering'):
     'Generate rows for which ``func(row)`` returns True, starting from the cursor.'
-    for i in Progress(rotateRange(self.nRows, self.cursorRowIndex-1), total=self.nRows, gerund=gerund):
-        try:
-            r = self.rows[i]
-            if func(r):
-                yield r
-        except Exception as e:
-            vd.exceptionCaught(e, status=False)
+    def _gather():
+        for i in Progress(rotateRange(self.nRows, self.cursorRowIndex-1), total=self.nRows, gerund=gerund):
+            try:
+                r = self.rows[i]
+                if func(r):
+                    yield i, r
+            except Exception as e:
+                vd.exceptionCaught(e, status=False)
+
+    yield from iterNotingPositions(self, _gather())
 
 @Sheet.property
 def selectedRows(self):
     'List of selected rows in sheet order.'
     if self.nSelectedRows <= 1:
         return Fanout(self._selectedRows.values())
+    if isinstance(self._selectedRows, SelectedRows):
+        return Fanout(self._selectedRows.inorder(self))
     return Fanout((r for r in self.rows if self.rowid(r) in self._selectedRows))
 
 @Sheet.property
@@ -167,6 +253,9 @@ def addUndoSelection(sheet):
     vd.addUndo(undoAttrCopyFunc([sheet], '_selectedRows'))
 
 
+vd.addGlobals(SelectedRows=SelectedRows)
+
+
 Sheet.addCommand('t', 'stoggle-row', 'toggle_row(cursorRow); cursorDown(1)', 'toggle selection of current row')
 Sheet.addCommand('s', 'select-row', 'select_row(cursorRow); cursorDown(1)', 'select current row')
 Sheet.addCommand('u', 'unselect-row', 'unselect_row(cursorRow); cursorDown(1)', 'unselect current row')
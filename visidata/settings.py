@@ -1,4 +1,5 @@
 import collections
+import weakref
 import sys
 import inspect
 import argparse
@@ -126,11 +127,24 @@ class Option:
 
 @VisiData.api
 class OptionsObject:
-    'minimalist options framework'
+    '''minimalist options framework.
+    Options bound to a sheet (or sheet class) keep each value as a plain attribute once resolved, so that ``options.foo`` on the draw path is an attribute lookup.  Setting an option only invalidates that option, on all options objects.'''
+    _instances = weakref.WeakSet()
+    _cachedFor = weakref.WeakKeyDictionary()  # [obj] -> WeakSet of options objects with values resolved for obj
+    _members = ('_opts', '_cache', '_obj')
+    _version = 0  # incremented whenever any resolved option value is forgotten
+
     def __init__(self, mgr, obj=None):
         object.__setattr__(self, '_opts', mgr)
-        object.__setattr__(self, '_cache', {})
+        object.__setattr__(self, '_cache', {})  # [optname] -> {obj: Option}
         object.__setattr__(self, '_obj', obj)
+        OptionsObject._instances.add(self)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def keys(self, obj=None):
         for k, d in self._opts.items():
@@ -138,18 +152,51 @@ class OptionsObject:
                 yield k
 
     def _get(self, k, obj=None):
-        'Return Option object for k in context of obj. Cache result until any set().'
-        opt = self._cache.get((k, obj or vd.activeSheet), None)
+        'Return Option object for k in context of obj. Cache result until k is set.'
+        obj = obj or vd.activeSheet
+        d = self._cache.get(k, None)
+        if d is None:
+            d = self._cache[k] = {}
+        opt = d.get(obj, None)
         if opt is None:
             opt = self._opts._get(k, obj)
-            self._cache[(k, obj or vd.activeSheet)] = opt
+            d[obj] = opt
+            try:
+                holders = OptionsObject._cachedFor.get(obj, None)
+                if holders is None:
+                    holders = OptionsObject._cachedFor[obj] = weakref.WeakSet()
+                holders.add(self)
+            except TypeError:  # like 'default', which is never renamed
+                pass
         return opt
 
+    def _invalidate(self, k):
+        'Forget resolved values of option *k* on all options objects.'
+        OptionsObject._version += 1
+        for o in list(OptionsObject._instances):
+            o._cache.pop(k, None)
+            o.__dict__.pop(k, None)
+
+    def _clear(self, obj):
+        'Forget all resolved values for *obj* (like after it was renamed), on the options objects which have any.'
+        holders = OptionsObject._cachedFor.pop(obj, None)
+        if not holders:
+            return
+
+        OptionsObject._version += 1
+        for o in list(holders):
+            for d in list(o._cache.values()):  # might be added to by another thread
+                d.pop(obj, None)
+            if o._obj is obj:
+                for k in list(o.__dict__.keys()):
+                    if k not in OptionsObject._members:
+                        o.__dict__.pop(k, None)
+
     def _set(self, k, v, obj=None, helpstr='', module=None):
         k, v = vd._resolve_optalias(k, v)  # to set deprecated and abbreviated options
 
         opt = self._get(k) or Option(k, v, '', module)
-        self._cache.clear()  # invalidate entire cache on any change
+        self._invalidate(k)
         return self._opts.set(k, Option(k, v, opt.helpstr or helpstr, opt.module or module), obj)
 
     def is_set(self, k, obj=None):
@@ -212,10 +259,10 @@ class OptionsObject:
     def unset(self, optname, obj=None):
         'Remove setting value for given context.'
         v = self._opts.unset(optname, obj)
+        self._invalidate(optname)
         opt = self._get(optname)
         if vd.cmdlog and opt and opt.replayable:
             self.add_option_to_cmdlogs(obj, optname, value='', longname='unset-option')
-        self._cache.clear()  # invalidate entire cache on any change
         return v
 
     def add_option_to_cmdlogs(self, obj, optname, value='', longname='set-option'):
@@ -248,7 +295,16 @@ class OptionsObject:
 
     def __getattr__(self, optname):      # options.foo
         'Return value of option `optname` for stored options context.'
-        return self.__getitem__(optname)
+        if self._obj is None:  # global options are resolved in context of the active sheet
+            vs = vd.activeSheet
+            if isinstance(vs, BaseSheet):
+                return getattr(vs.options, optname)
+            return self.__getitem__(optname)
+
+        v = self.__getitem__(optname)
+        if not hasattr(OptionsObject, optname):
+            self.__dict__[optname] = v  # until _invalidate(optname)
+        return v
 
     def __setattr__(self, optname, value):   # options.foo = value
         'Set *value* of option *optname* for stored options context.'
@@ -15,6 +15,12 @@ vd.activePane = 1   # pane numbering starts at 1; pane 0 means active pane
 
 vd.option('name_joiner', '_', 'string to join sheet or column names', max_help=0)
 vd.option('value_joiner', ' ', 'string to join display values', max_help=0)
+vd.option('disp_cell_cache', True, 'reuse cells rendered in the previous frame, until a command, option, or recalc might have changed them', max_help=1)
+
+vd.drawnCellsVersion = 0  # cells rendered with a different version must be rendered again
+
+# longname prefixes of commands which only move the cursor or change the selection, and so keep rendered cells
+vd.cellPreservingCommands = 'go- scroll- search next- prev- page- select- unselect- stoggle- no-op'.split()
 
 
 @drawcache
@@ -157,6 +163,9 @@ class TableSheet(BaseSheet):
         # as computed during draw()
         self._rowLayout = {}      # [rowidx] -> (y, w)
         self._visibleColLayout = {}      # [vcolidx] -> (x, w)
+        self._drawnCells = {}     # [(id(row), col, colwidth, maxheight)] -> (row, cellval, lines)
+        self._prevCells = {}      # _drawnCells of previous frame, if still valid
+        self._drawnCellsVersion = None
 
         # list of all columns in display order
         self.initialCols = kwargs.pop('columns', None) or type(self).columns
@@ -735,6 +744,9 @@ class TableSheet(BaseSheet):
         self._rowLayout = {}  # [rowidx] -> (y, height)
         self.calcColLayout()
 
+        self._prevCells = self.reusableCells()
+        self._drawnCells = {}
+
         numHeaderRows = self.nHeaderRows
         vcolidx = 0
 
@@ -758,6 +770,19 @@ class TableSheet(BaseSheet):
         if vcolidx+1 < self.nVisibleCols:
             scr.addstr(headerRow, self.windowWidth-2, self.options.disp_more_right, colors.color_column_sep.attr)
 
+    def reusableCells(self):
+        'Return the cells rendered in the previous frame, or an empty dict if anything might have changed them since.'
+        version = (vd.drawnCellsVersion, vd.OptionsObject._version)
+        if version != self._drawnCellsVersion or not self.options.disp_cell_cache:
+            self._drawnCellsVersion = version
+            return {}
+
+        if any(t.is_alive() for t in vd.unfinishedThreads):  # threads can change values at any time, also after they were drawn
+            self._drawnCellsVersion = None
+            return {}
+
+        return self._drawnCells
+
     def calc_height(self, row, displines=None, isNull=None, maxheight=1):
             'render cell contents ifor row into displines'
             if displines is None:
@@ -769,6 +794,14 @@ class TableSheet(BaseSheet):
                     if vcolidx >= len(vcols):
                         continue
                     col = vcols[vcolidx]
+
+                    key = (id(row), col, colwidth, maxheight)
+                    drawn = self._prevCells.get(key, None)
+                    if drawn is not None and drawn[0] is row:
+                        _, cellval, lines = self._drawnCells[key] = drawn
+                        displines[vcolidx] = (col, cellval, lines)
+                        continue
+
                     cellval = col.getCell(row)
 
                     cellval.display = col.display(cellval, colwidth)
@@ -785,6 +818,7 @@ class TableSheet(BaseSheet):
                     else:
                         lines = [cellval.display]
                     displines[vcolidx] = (col, cellval, lines)
+                    self._drawnCells[key] = (row, cellval, lines)
 
             if len(displines) == 0:
                 return 0
@@ -1094,6 +1128,37 @@ BaseSheet.init('pane', lambda: 1)
 Sheet.init('_ordering', list, copy=True)  # (col:Column, reverse:bool)
 
 
+@VisiData.api
+def invalidateCells(vd):
+    'Render all cells of every sheet again in its next frame.'
+    vd.drawnCellsVersion += 1
+
+
+@VisiData.api
+def isCellPreservingCommand(vd, longname):
+    return longname.startswith(tuple(vd.cellPreservingCommands))
+
+
+def _invalidateCellsBeforeExec(sheet, cmd, args, keystrokes):
+    if not vd.isCellPreservingCommand(cmd.longname):
+        vd.invalidateCells()
+
+vd.beforeExecHooks.append(_invalidateCellsBeforeExec)
+
+
+@BaseSheet.after
+def execCommand(sheet, longname, vdglobals=None, keystrokes=None):
+    # again afterwards, in case cells were drawn while the command was waiting for input
+    cmd = sheet.getCommand(longname.split(' ', 1)[0] if longname else keystrokes)
+    if not cmd or not vd.isCellPreservingCommand(cmd.longname):
+        vd.invalidateCells()
+
+
+@Column.after
+def recalc(col, sheet=None):
+    vd.invalidateCells()
+
+
 BaseSheet.addCommand('^R', 'reload-sheet', 'preloadHook(); reload()', 'Reload current sheet')
 Sheet.addCommand('^G', 'show-cursor', 'status(statusLine)', 'show cursor position and bounds of current sheet on status line')
 
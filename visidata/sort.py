@@ -1,5 +1,7 @@
 from copy import copy
-from visidata import vd, asyncthread, Progress, Sheet, options, UNLOADED
+from visidata import vd, asyncthread, Progress, Sheet, options, UNLOADED, TypedWrapper, TypedExceptionWrapper
+
+vd.option('sort_on_edit', False, 'move edited rows to keep sheet in sorted order', replay=True)
 
 @Sheet.api
 def orderBy(sheet, *cols, reverse=False):
@@ -49,6 +51,52 @@ def sortkey(self, r, prog=None):
 
     return ret
 
+def _sortedIndexes(idxs, vals, reverse=False):
+    'Return list of *idxs* stably sorted by ``vals[i]``.  Errors and nulls (TypedWrapper) are kept in their own lanes, ordered before all other values (after, if *reverse*).'
+    errors = []
+    nulls = []
+    others = []
+    for i in idxs:
+        v = vals[i]
+        if isinstance(v, TypedExceptionWrapper):
+            errors.append(i)
+        elif isinstance(v, TypedWrapper):
+            nulls.append(i)
+        else:
+            others.append(i)
+
+    others.sort(key=vals.__getitem__, reverse=reverse)
+    if reverse:
+        return others + nulls + errors
+    return errors + nulls + others
+
+
+@Sheet.api
+def sortedRowIndexes(self, rows, prog=None):
+    'Return list of indexes into *rows* in order sorted according to the current internal ordering.'
+    ordering = [(self.column(col) if isinstance(col, str) else col, reverse) for col, reverse in self._ordering]
+
+    # extract the typed values for each sort column in one pass per column
+    keyvals = []
+    for col, reverse in ordering:
+        keyvals.append((col.getTypedValues(rows), reverse))
+        if prog:
+            prog.addProgress(len(rows))
+
+    # stable sort on the least significant key first
+    idxs = range(len(rows))
+    for vals, reverse in reversed(keyvals):
+        idxs = _sortedIndexes(idxs, vals, reverse)
+
+    return idxs
+
+
+@Sheet.api
+def sortedRows(self, rows, prog=None):
+    'Return new list of *rows* sorted according to the current internal ordering.'
+    return [rows[i] for i in self.sortedRowIndexes(rows, prog=prog)]
+
+
 @Sheet.api
 @asyncthread
 def sort(self):
@@ -56,14 +104,117 @@ def sort(self):
     if self.rows is UNLOADED:
         return
     try:
-        with Progress(gerund='sorting', total=self.nRows) as prog:
-            # must not reassign self.rows: use .sort() instead of sorted()
-            self.rows.sort(key=lambda r,self=self,prog=prog: self.sortkey(r, prog=prog))
+        with Progress(gerund='sorting', total=self.nRows*len(self._ordering)) as prog:
+            idxs = self.sortedRowIndexes(self.rows, prog=prog)
+            reorder = getattr(self.rows, 'reorder', None)
+            if reorder:  # reorder without parsing all rows again
+                reorder(idxs)
+            else:
+                # must not reassign self.rows: replace contents instead
+                self.rows[:] = [self.rows[i] for i in idxs]
     except TypeError as e:
         vd.warning('sort incomplete due to TypeError; change column type')
         vd.exceptionCaught(e, status=False)
 
 
+def _lane(v):
+    'Return sort lane of typed value *v*: 0 for errors, 1 for nulls, 2 for regular values.'
+    if isinstance(v, TypedExceptionWrapper):
+        return 0
+    if isinstance(v, TypedWrapper):
+        return 1
+    return 2
+
+
+def _keyLessThan(ka, kb, reverses):
+    'Return True if key *ka* orders before key *kb*, in the same order as _sortedIndexes.'
+    for a, b, reverse in zip(ka, kb, reverses):
+        la, lb = _lane(a), _lane(b)
+        if la != lb:
+            return la > lb if reverse else la < lb
+        if la < 2 or a == b:
+            continue
+        return b < a if reverse else a < b
+    return False
+
+
+@Sheet.api
+def sortedIndex(self, row):
+    'Return index into rows at which to insert *row* to keep the current ordering; after any equal rows, like a stable sort.'
+    cols = [self.column(col) if isinstance(col, str) else col for col, _ in self._ordering]
+    reverses = [reverse for _, reverse in self._ordering]
+
+    key = [c.getTypedValue(row) for c in cols]
+    rows = self.rows
+    lo, hi = 0, len(rows)
+    while lo < hi:
+        mid = (lo+hi)//2
+        if _keyLessThan(key, [c.getTypedValue(rows[mid]) for c in cols], reverses):
+            hi = mid
+        else:
+            lo = mid+1
+    return lo
+
+
+def _fewEnough(k, n):
+    'Return True if inserting *k* rows one at a time into *n* sorted rows is cheaper than sorting all of them.'
+    return k*max(n.bit_length(), 1) < n
+
+
+@Sheet.api
+def addSortedRows(self, rows):
+    'Add *rows* in their sorted position according to the current ordering.  The cost is proportional to the number of *rows*, unless there are enough to make sorting all rows again cheaper.'
+    rows = list(rows)
+    if not self._ordering:
+        for r in rows:
+            self.addRow(r)
+        return
+
+    if _fewEnough(len(rows), self.nRows):
+        for r in self.sortedRows(rows):
+            self.addRow(r, index=self.sortedIndex(r))
+    else:
+        for r in rows:
+            self.addRow(r)
+        vd.sync(self.sort())  # for a single sort key, the existing rows are one sorted run which the sort merges in linear time; for more keys, this is a full sort
+
+
+@Sheet.api
+def repositionRows(self, rows, col=None):
+    'Move *rows* to their sorted position after their values in *col* have changed.  Noop unless options.sort_on_edit is set and *col* is one of the ordering columns.'
+    if not self._ordering or not self.options.sort_on_edit:
+        return
+
+    sortcols = [self.column(c) if isinstance(c, str) else c for c, _ in self._ordering]
+    if col is not None and col not in sortcols:
+        return
+
+    rows = list(rows)
+    if not _fewEnough(len(rows), self.nRows):
+        vd.sync(self.sort())
+        return
+
+    cursorRow = self.cursorRow
+    if len(rows) == 1 and rows[0] is cursorRow:
+        idxs = [self.cursorRowIndex]
+    else:
+        rowids = set(self.rowid(r) for r in rows)
+        idxs = [i for i, r in enumerate(self.rows) if self.rowid(r) in rowids]
+
+    for i in reversed(idxs):
+        del self.rows[i]
+        if self.cursorRowIndex > i:
+            self.cursorRowIndex -= 1
+
+    for r in rows:
+        idx = self.sortedIndex(r)
+        self.rows.insert(idx, r)
+        if r is cursorRow:
+            self.cursorRowIndex = idx
+        elif self.cursorRowIndex >= idx:
+            self.cursorRowIndex += 1
+
+
 # replace existing sort criteria
 Sheet.addCommand('[', 'sort-asc', 'orderBy(None, cursorCol)', 'sort ascending by current column; replace any existing sort criteria')
 Sheet.addCommand(']', 'sort-desc', 'orderBy(None, cursorCol, reverse=True)', 'sort descending by current column; replace any existing sort criteria ')
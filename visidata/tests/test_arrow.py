@@ -0,0 +1,55 @@
+from copy import copy
+
+from visidata.loaders.arrow import ArrowRows, ArrowSheet, ArrowColumn
+
+
+class TestArrowRows:
+    def test_positions(self):
+        'rows are positions, stored only once they are changed'
+        rows = ArrowRows(5)
+        assert len(rows) == 5 and list(rows) == [0, 1, 2, 3, 4]
+        assert rows[-1] == 4 and rows[1:3] == [1, 2]
+        assert rows._entries is None
+
+        rows.reorder([4, 3, 2, 1, 0])
+        assert list(rows) == [4, 3, 2, 1, 0]
+        rows.reorder([1, 0, 2, 3, 4])
+        assert list(rows) == [3, 4, 2, 1, 0]
+
+        old = copy(rows)
+        rows.append(5)
+        del rows[0]
+        rows.insert(0, 6)
+        assert list(rows) == [6, 4, 2, 1, 0, 5]
+        assert rows.index(2) == 2
+        assert list(old) == [3, 4, 2, 1, 0]
+
+        rows.clear()
+        assert len(rows) == 0
+
+    def test_window(self):
+        'rows grow as batches arrive, and the oldest are dropped'
+        rows = ArrowRows(0)
+        rows.grow(4)
+        rows.drop(2)
+        assert list(rows) == [2, 3]
+        rows.grow(6)
+        assert list(rows) == [2, 3, 4, 5] and rows[0] == 2 and rows.index(4) == 2
+
+        rows.reorder([3, 2, 1, 0])
+        rows.append(-1)  # added row
+        rows.drop(4)
+        rows.grow(7)
+        assert list(rows) == [5, 4, -1, 6]
+
+
+class TestArrowSheet:
+    def test_copy(self):
+        'rows added to a sheet and to its copy have different positions, and copied columns keep their own blocks'
+        vs = ArrowSheet('arrow', columns=[ArrowColumn('a')])
+        vs2 = copy(vs)
+        assert [vs.newRow(), vs2.newRow(), vs.newRow()] == [-1, -2, -3]
+
+        col, col2 = vs.columns[0], vs2.columns[0]
+        assert col2._edits is col._edits
+        assert col2._blocks is not col._blocks and col2._lock is not col._lock
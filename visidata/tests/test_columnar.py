@@ -0,0 +1,18 @@
+from visidata import date
+from visidata.features.columnar import makeBuffer, ArrayBuffer
+
+
+class TestColumnar:
+    def test_bigints(self):
+        'ints which do not fit in 64 bits are kept as they are'
+        vals = ['1', '99999999999999999999', '3']
+        buf = makeBuffer(vals, int)
+        assert isinstance(buf, ArrayBuffer)
+        assert [buf[i] for i in range(3)] == [1, '99999999999999999999', 3]
+
+    def test_dates(self):
+        'dates are stored exactly, without conversion to local time'
+        vals = ['2021-03-28 02:30:00', '2021-10-31 02:30:00.000001', '0001-01-01', '9999-12-31 23:59:59']
+        buf = makeBuffer(vals, date)
+        assert isinstance(buf, ArrayBuffer) and not buf.others
+        assert [buf[i] for i in range(len(vals))] == [date(v) for v in vals]
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from visidata import vd, Sheet, ColumnItem
+import visidata.features.dedupe as dedupe
+from visidata.features.dedupe import Deduper, DuplicateGroupsSheet
+
+
+def naive(rows, keep='first'):
+    'Return list of is_dupe for each of *rows*, by remembering every tuple.'
+    order = list(range(len(rows)))
+    if keep == 'last':
+        order.reverse()
+    seen = set()
+    isdupe = [False]*len(rows)
+    for i in order:
+        vals = tuple(rows[i])
+        isdupe[i] = vals in seen
+        seen.add(vals)
+    return isdupe
+
+
+class TestDedupe:
+    def setup_method(self):
+        rnd = random.Random(1)
+        self.vs = Sheet('dupes', rows=[[rnd.randrange(20), rnd.choice('abc')] for i in range(300)])
+        self.vs.addColumn(ColumnItem('n', 0))
+        self.vs.addColumn(ColumnItem('s', 1))
+
+    def dupes(self, **kwargs):
+        return [bool(x) for x in Deduper(self.vs, self.vs.visibleCols, **kwargs).run().isdupe]
+
+    @pytest.mark.parametrize('keep', ['first', 'last'])
+    def test_same_as_set(self, keep):
+        assert self.dupes(keep=keep) == naive(self.vs.rows, keep)
+
+    def test_spill(self):
+        'with a budget for only a few fingerprints, partitions give the same result'
+        deduper = Deduper(self.vs, self.vs.visibleCols, budget=1000).run()
+        assert deduper.spilled
+        assert [bool(x) for x in deduper.isdupe] == naive(self.vs.rows)
+
+    def test_collisions(self, monkeypatch):
+        'rows with the same fingerprint but different values are not duplicates'
+        monkeypatch.setattr(dedupe, 'fingerprint', lambda vals: 42)
+        assert self.dupes() == naive(self.vs.rows)
+        assert self.dupes(keep='last', budget=1) == naive(self.vs.rows, 'last')
+
+    def test_groups(self):
+        vs = DuplicateGroupsSheet('dupes', 'duplicates', source=self.vs)
+        vs.reload()
+        vd.sync()
+        counts = {}
+        for r in self.vs.rows:
+            counts[tuple(r)] = counts.get(tuple(r), 0) + 1
+        assert {(r[0][0], r[0][1]): r[1] for r in vs.rows} == {k: n for k, n in counts.items() if n > 1}
@@ -0,0 +1,70 @@
+import statistics
+
+import pytest
+
+from visidata import vd, Sheet, ColumnItem
+from visidata.features.describe import DescribeSheet, RowBitmap, ValueSample
+
+
+class TestDescribe:
+    def setup_method(self):
+        rows = [[str(i % 7) if i % 5 else None, f'x{i % 3}'] for i in range(100)]
+        rows[13][0] = 'bad'
+        rows[42][0] = 'worse'
+        self.vs = Sheet('describe', rows=rows)
+        self.vs.addColumn(ColumnItem('n', 0, type=int))
+        self.vs.addColumn(ColumnItem('s', 1))
+
+    def describe(self):
+        ds = DescribeSheet('describe_describe', source=[self.vs])
+        ds.reload()
+        vd.sync()
+        return {c.name: ds.describeData[c] for c in ds.rows}
+
+    def test_stats(self):
+        'statistics are the same as over the lists of all values'
+        d = self.describe()
+        vals = [int(r[0]) for r in self.vs.rows if r[0] is not None and r[0].isdigit()]
+        n = d['n']
+        assert [r[0] for r in n['errors']] == ['bad', 'worse']
+        assert list(n['nulls']) == [r for r in self.vs.rows if r[0] is None]
+        assert n['distinct'] == len(set(vals))+1  # and None
+        assert n['mode'] == statistics.mode(vals)
+        assert (n['min'], n['max'], n['sum']) == (min(vals), max(vals), sum(vals))
+        assert n['median'] == statistics.median(vals)
+        assert n['mean'] == pytest.approx(statistics.mean(vals))
+        assert n['stdev'] == pytest.approx(statistics.stdev(vals))
+
+        assert d['s']['distinct'] == 3
+        assert 'min' not in d['s']
+
+    def test_bounded(self):
+        'beyond the limits, distinct is estimated and median is over a sample'
+        self.vs.rows = [[str(i), 'x'] for i in range(5000)]
+        self.vs.options.describe_distinct_max = 100
+        self.vs.options.describe_sample_size = 500
+        n = self.describe()['n']
+        assert 4800 < n['distinct'] < 5200
+        assert 2000 < n['median'] < 3000
+        assert n['sum'] == sum(range(5000))
+
+    def test_bitmap(self):
+        rows = list(range(20))
+        bm = RowBitmap(rows)
+        assert len(bm) == 0 and list(bm) == []
+        for i in (17, 3, 8, 3):
+            bm.add(i)
+        assert len(bm) == 3
+        assert list(bm) == [3, 8, 17]
+
+    def test_sample(self):
+        sample = ValueSample(10)
+        sample.extend(list(range(4)))
+        sample.extend(list(range(4, 8)))
+        assert sample == list(range(8))
+
+        for i in range(100):
+            sample.extend(list(range(8+i*50, 8+(i+1)*50)))
+        assert len(sample) == 10
+        assert len(set(sample)) == 10
+        assert max(sample) > 1000
@@ -0,0 +1,57 @@
+import pytest
+
+from visidata import vd, Sheet, Column
+
+
+class CountingColumn(Column):
+    'Column which counts how often its values are computed.'
+    ncalcs = 0
+
+    def calcValue(self, row):
+        CountingColumn.ncalcs += 1
+        return row[0] * 2
+
+
+@pytest.mark.usefixtures('curses_setup')
+class TestDrawnCells:
+    def setup_method(self):
+        self.vs = Sheet('drawn', rows=[[i] for i in range(10)])
+        self.vs.addColumn(CountingColumn('double', width=6))
+        vd.sheets.insert(0, self.vs)
+        vd.sync()  # cells are not reused while threads are running
+
+    def teardown_method(self):
+        vd.sheets.remove(self.vs)
+
+    def frame(self, scr):
+        'Return number of values computed to draw one frame.'
+        n = CountingColumn.ncalcs
+        vd.clearCaches()
+        self.vs.draw(scr)
+        return CountingColumn.ncalcs - n
+
+    def test_reuse(self, mock_screen):
+        'cells are rendered again only after something might have changed them'
+        vs = self.vs
+        vs._scr = mock_screen
+        assert self.frame(mock_screen) == 10
+        assert self.frame(mock_screen) == 0
+
+        vs.rows[3] = [30]  # different row object
+        assert self.frame(mock_screen) == 1
+
+        vs.cursorRowIndex = 5
+        assert self.frame(mock_screen) == 0
+
+        vd.invalidateCells()
+        assert self.frame(mock_screen) == 10
+
+        vs.options.disp_truncator = '>'
+        assert self.frame(mock_screen) == 10
+
+        vs.columns[0].width = 8
+        assert self.frame(mock_screen) == 10
+
+        vs.options.disp_cell_cache = False
+        assert self.frame(mock_screen) == 10
+        assert self.frame(mock_screen) == 10
@@ -0,0 +1,32 @@
+import pytest
+
+from visidata import vd, Sheet, ColumnItem
+from visidata.features.join import JoinSheet
+
+
+def makeSheet(name, keys, keytype):
+    vs = Sheet(name, columns=[ColumnItem('k', 0, type=keytype), ColumnItem('v', 1)])
+    vs.rows = [[k, i] for i, k in enumerate(keys)]
+    return vs
+
+
+def joinedRows(a, b, ordered):
+    for vs in (a, b):
+        vs._ordering = [(vs.column('k'), False)] if ordered else []
+    j = JoinSheet('j', sources=[a, b], jointype='inner', sheetKeyCols={vs:[vs.column('k')] for vs in (a, b)})
+    j.reload()
+    vd.sync()
+    return sorted((r[0][1], r[1][1]) for r in j.rows)
+
+
+class TestJoin:
+    @pytest.mark.parametrize('types,keys', [
+        ((int, float), ([1, 2, 3], [1.0, 2.0, 3.0])),
+        ((int, str), ([1, 2, 3], ['1', '2', 'x'])),
+        ((str, str), (['a', 'b', 'c'], ['a', 'b', 'c'])),
+        ((str, str), (['a', 'b', 'c'], ['a', 'c', 'b'])),  # stale ordering
+    ])
+    def test_sorted_same_as_unsorted(self, types, keys):
+        'a join of sheets ordered by their keys gives the same rows as a hash join'
+        sheets = lambda: [makeSheet(n, k, t) for n, k, t in zip('ab', keys, types)]
+        assert joinedRows(*sheets(), True) == joinedRows(*sheets(), False)
@@ -0,0 +1,43 @@
+import pytest
+
+from visidata import vd, Sheet
+
+
+class TestOptionsSnapshot:
+    def teardown_method(self):
+        vd.options.unset('disp_truncator', 'global')
+
+    def test_set_after_resolve(self):
+        'resolved sheet options follow later settings of the same option'
+        vs = Sheet('optsheet')
+        assert vs.options.disp_truncator == vd.options.getdefault('disp_truncator')
+        assert vs.options.disp_column_sep == vd.options.getdefault('disp_column_sep')
+
+        vd.options.set('disp_truncator', '>', 'global')
+        assert vs.options.disp_truncator == '>'
+
+        vs.options.disp_truncator = '!'
+        assert vs.options.disp_truncator == '!'
+        assert Sheet('other').options.disp_truncator == '>'
+
+        vs.options.unset('disp_truncator', vs)
+        assert vs.options.disp_truncator == '>'
+
+    def test_rename(self):
+        'sheet options are set by sheet name, so follow a rename'
+        vs = Sheet('before')
+        vs.options.disp_truncator = '!'
+        assert vs.options.disp_truncator == '!'
+
+        vs.name = 'after'
+        assert vs.options.disp_truncator == vd.options.getdefault('disp_truncator')
+
+    def test_class_options(self):
+        class OptSheet(Sheet):
+            pass
+
+        vs = OptSheet('classopts')
+        assert vs.options.disp_truncator == vd.options.getdefault('disp_truncator')
+        OptSheet.options.disp_truncator = '#'
+        assert vs.options.disp_truncator == '#'
+        assert OptSheet.options.disp_truncator == '#'
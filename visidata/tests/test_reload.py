@@ -0,0 +1,46 @@
+import os
+
+from visidata import vd, Path, TsvSheet
+from visidata.features.reload_every import AppendedLines
+
+
+class TestReloadAppended:
+    def test_appended(self, tmp_path):
+        'only complete lines appended to the same file are read, and added in sorted position'
+        p = str(tmp_path/'t.tsv')
+        with open(p, 'w') as fp:
+            fp.write('a\tb\n1\tx\n3\ty\n')
+        vs = TsvSheet('t', source=Path(p))
+        vs.reload()
+        vd.sync()
+        vs.orderBy(vs.column('a'))
+        vd.sync()
+
+        tail = AppendedLines(p, os.stat(p))
+        with open(p, 'a') as fp:
+            fp.write('2\tz\n4\tw')
+        data = tail.read(os.stat(p))
+        assert data == b'2\tz\n'
+        vs.loadAppended(data)
+        vd.sync()
+        assert [list(r) for r in vs.rows] == [['1', 'x'], ['2', 'z'], ['3', 'y']]
+
+        with open(p, 'a') as fp:
+            fp.write('\n')
+        assert tail.read(os.stat(p)) == b'4\tw\n'
+
+    def test_rewritten(self, tmp_path):
+        'a file rewritten in place or replaced is not read as appended'
+        p = str(tmp_path/'t.tsv')
+        with open(p, 'w') as fp:
+            fp.write('a\n1\n2\n')
+        tail = AppendedLines(p, os.stat(p))
+        with open(p, 'r+') as fp:
+            fp.write('b\n1\n2\n3\n')
+        assert tail.read(os.stat(p)) is None
+
+        tail = AppendedLines(p, os.stat(p))
+        os.rename(p, p+'.old')
+        with open(p, 'w') as fp:
+            fp.write('b\n1\n2\n3\n4\n')
+        assert tail.read(os.stat(p)) is None
@@ -0,0 +1,36 @@
+import pytest
+
+from visidata import vd, Sheet, ColumnItem, date
+from visidata.save import ColumnSaver, formatValuesInWorker
+
+
+class TestSaveBatches:
+    def setup_method(self):
+        rows = [[str(i%3), f'2023-01-{i%9+1:02d}', 'x\ty' if i%4 else None] for i in range(25)]
+        rows[7][0] = 'bad'
+        self.vs = Sheet('batches', rows=rows)
+        self.vs.options.safety_first = True
+        for i, t in enumerate((int, date, str)):
+            self.vs.addColumn(ColumnItem(f'c{i}', i, type=t))
+
+    def test_batches(self):
+        'saved values are the same in any size of batch'
+        vs = self.vs
+        vs.options.save_batch_rows = 1
+        expected = list(vs.iterdisprows(format=True))
+        vs.options.save_batch_rows = 10
+        assert [len(batch[0]) for batch in vs.iterdispbatches(format=True)] == [10, 10, 5]
+        assert list(vs.iterdisprows(format=True)) == expected
+
+        assert expected[1] == ('1', '2023-01-02', 'x'+vd.options.tsv_safe_tab+'y')
+        assert expected[7][0] == 'bad'  # unconverted value as-is
+        assert expected[0][2] == ''
+
+    def test_worker(self):
+        'values formatted by a worker process are the same as in this process'
+        vs = self.vs
+        rows = list(vs.iterdisprows(format=True))
+        for i, col in enumerate(vs.visibleCols):
+            saver = ColumnSaver(vs, col, format=True)
+            vals = saver.getValues(vs.rows)
+            assert formatValuesInWorker(*saver.workerArgs(), vals) == [r[i] for r in rows]
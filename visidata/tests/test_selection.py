@@ -0,0 +1,42 @@
+import pytest
+
+from visidata import vd, Sheet, ColumnItem
+
+
+class TestSelectedRows:
+    def setup_method(self):
+        self.vs = Sheet('sel', rows=[[i, (i*7)%20] for i in range(20)])
+        self.vs.addColumn(ColumnItem('a', 0, type=int))
+        self.vs.addColumn(ColumnItem('b', 1, type=int))
+
+    def selected(self):
+        return [r[0] for r in self.vs.selectedRows]
+
+    def test_order(self):
+        'selectedRows are in sheet order, also after the rows are reordered'
+        vs = self.vs
+        vs.selectByIdx([15, 2, 9])
+        vd.sync()
+        assert self.selected() == [2, 9, 15]
+
+        vs.rows.sort(key=lambda r: r[1])
+        assert self.selected() == [r[0] for r in vs.rows if r[0] in (2, 9, 15)]
+
+        del vs.rows[0:3]
+        vs.toggle_row(vs.rows[1])
+        assert self.selected() == [r[0] for r in vs.rows if r[0] in (2, 9, 15, vs.rows[1][0])]
+
+    def test_bulk(self):
+        vs = self.vs
+        vs.select(vs.gatherBy(lambda r: r[0] % 3 == 0), progress=False)
+        vd.sync()
+        assert self.selected() == list(range(0, 20, 3))
+
+        vs.unselect(vs.rows[:10], progress=False)
+        vd.sync()
+        assert self.selected() == [12, 15, 18]
+
+        vs.toggle(vs.rows)
+        vd.sync()
+        assert vs.nSelectedRows == 17
+        assert 12 not in self.selected()
@@ -0,0 +1,108 @@
+import random
+import sqlite3
+
+import pytest
+
+from visidata import vd, Path, FreqTableSheet
+from visidata.loaders.sqlite import SqliteIndexSheet, SqliteRows, keysetCondition, makeSqliteFreqTable
+
+
+class TestSqlitePushdown:
+    @pytest.fixture(autouse=True)
+    def database(self, tmp_path):
+        rnd = random.Random(1)
+        self.path = Path(str(tmp_path/'test.sqlite'))
+        conn = sqlite3.connect(str(self.path))
+        conn.execute('CREATE TABLE t (n INTEGER, s TEXT, x REAL)')
+        conn.executemany('INSERT INTO t VALUES (?, ?, ?)',
+                         [(rnd.choice([None, 1, 2, 3]), rnd.choice([None, 'a', 'b', 'Cc']), rnd.random()) for i in range(700)])
+        conn.commit()
+        self.allrows = conn.execute('SELECT rowid, * FROM t').fetchall()
+        conn.close()
+
+    def open(self, pagesize=50):
+        idx = SqliteIndexSheet('db', source=self.path)
+        idx.reload()
+        vd.sync()
+        vs = idx.rows[0]
+        vs.options.sqlite_page_rows = pagesize
+        vs.reload()
+        vd.sync()
+        return vs
+
+    def test_pages(self):
+        'rows are the same in any order of access, fetched a page at a time'
+        vs = self.open()
+        assert isinstance(vs.rows, SqliteRows) and vs.rows.lazy
+        assert len(vs.rows) == len(self.allrows)
+        assert list(vs.rows) == self.allrows
+        assert [vs.rows[i] for i in reversed(range(len(vs.rows)))] == self.allrows[::-1]
+        assert [vs.rows[i] for i in (650, 3, 699, -1)] == [self.allrows[i] for i in (650, 3, 699, -1)]
+
+        vs.rows.insert(0, (None, 9, 'z', 0.0))
+        assert not vs.rows.lazy
+        assert list(vs.rows) == [(None, 9, 'z', 0.0)] + self.allrows
+
+    def test_keyset(self):
+        'a row is after another by the keyset condition iff it is sorted after it'
+        vs = self.open()
+        keys = [('"n"', 1, True), ('"s"', 2, False), ('rowid', 0, False)]
+        vs.rows.reorderBy(keys[:2])
+        rows = list(vs.rows)
+        for i in (0, 10, 333, 699):
+            sql, parms = keysetCondition(keys, vs.rows.sortKey(rows[i]))
+            assert list(vs.rows.select(sql, parms)) == rows[i+1:]
+            sql, parms = keysetCondition(keys, vs.rows.sortKey(rows[i]), after=False)
+            assert list(vs.rows.select(sql, parms)) == rows[:i]
+
+    def test_sort(self):
+        'ORDER BY gives the same rows as a stable sort in Python'
+        vs = self.open()
+        expected = self.open(pagesize=0)
+        assert type(expected.rows) is list
+
+        for sheet in (vs, expected):
+            sheet.orderBy(None, sheet.column('s'))
+            vd.sync()
+            sheet.orderBy(None, sheet.column('n'), reverse=True)
+            vd.sync()
+        assert vs.rows.lazy
+        assert [vs.rows[i] for i in reversed(range(700))][::-1] == expected.rows
+
+    def test_freq(self):
+        'GROUP BY gives the same bins as grouping in Python'
+        vs = self.open()
+        for colname in ('n', 's'):
+            col = vs.column(colname)
+            freqs = []
+            for ft in (makeSqliteFreqTable(vs, col), FreqTableSheet('freq', groupByCols=[col], source=vs)):
+                ft.reload()
+                vd.sync()
+                freqs.append([(str(r.discrete_keys[0]), list(r.sourcerows)) for r in ft.rows])
+            assert freqs[0] == freqs[1]
+
+    @pytest.mark.parametrize('pagesize', [50, 0])
+    def test_select(self, pagesize):
+        'rows selected by WHERE are those selected in Python'
+        vs = self.open(pagesize)
+        vs.select(vs.equalRows(vs.column('s'), 'Cc', display=True), progress=False)
+        vs.select(vs.equalRows(vs.column('n'), 2), progress=False)
+        vd.sync()
+        assert sorted(vs.selectedRows) == [r for r in self.allrows if r[2] == 'Cc' or r[1] == 2]
+
+        vs.clearSelected()
+        vs.select(vs.regexRows(vs.column('s'), '^c', 'I'), progress=False)
+        vd.sync()
+        assert sorted(vs.selectedRows) == [r for r in self.allrows if r[2] == 'Cc']
+
+    def test_shrunk(self):
+        'rows past the end of a table which shrank since it was counted are placeholders until it is counted again'
+        vs = self.open()
+        assert len(vs.rows) == 700
+        conn = sqlite3.connect(str(self.path))
+        conn.execute('DELETE FROM t WHERE rowid > 600')
+        conn.commit()
+        conn.close()
+        assert vs.rows[650] == []
+        assert len(vs.rows) == 600
+        assert list(vs.rows) == self.allrows[:600]
@@ -1,8 +1,17 @@
 import re
+import io
+import os
+import codecs
+import collections
 
-from visidata import vd, BaseSheet
+from visidata import vd, BaseSheet, Progress, Path
 
 vd.option('regex_skip', '', 'regex of lines to skip in text sources', help='regex')
+vd.option('load_workers', 0, 'number of worker processes parsing large local csv/tsv files in parallel (0 to parse in this process)', replay=True)
+vd.option('load_chunk_mb', 16, 'size in MB of each part of a file parsed by one worker process', max_help=-1)
+
+# encodings in which newline and quote bytes can only be those characters
+_byte_splittable_encodings = 'utf-8 utf-8-sig ascii iso8859-1 cp1252'.split()
 
 class FilterFile:
     def __init__(self, fp, regex:str, regex_flags:int=0):
@@ -44,3 +53,136 @@ def open_text_source(sheet):
     if regex_skip:
         return FilterFile(fp, regex_skip, sheet.regex_flags())
     return fp
+
+
+def rangeBoundaries(path, chunksize, quote=None, firstsize=2**20, blocksize=2**20):
+    '''Generate (start, end) byte offsets covering the file at *path* in ranges of about *chunksize* bytes, each ending just after a newline.
+    If *quote* (a single byte) is given, only split at newlines after an even number of quote bytes, so that ranges do not split quoted fields.
+    The first range is only about *firstsize* bytes, so the first rows can be shown early.'''
+    start = 0
+    target = min(firstsize, chunksize)
+    nquotes = 0  # number of quote bytes before blockstart
+    blockstart = 0
+    with open(path, 'rb') as fp:
+        while True:
+            block = fp.read(blocksize)
+            if not block:
+                break
+
+            q = nquotes
+            checked = 0
+            i = max(target-blockstart, 0)
+            while i < len(block):
+                i = block.find(b'\n', i)
+                if i < 0:
+                    break
+                if quote:
+                    q += block.count(quote, checked, i)
+                    checked = i
+                    if q % 2:  # newline inside quoted field
+                        i += 1
+                        continue
+
+                end = blockstart+i+1
+                yield start, end
+                start = end
+                target = start+chunksize
+                i = max(target-blockstart, i+1)
+
+            if quote:
+                nquotes += block.count(quote)
+            blockstart += len(block)
+
+    if start < blockstart:
+        yield start, blockstart
+
+
+def readTextRange(path, start, end, encoding, encoding_errors):
+    'Return text of bytes *start* to *end* of file at *path*, decoded and with universal newlines, as a file opened in text mode would read them.'
+    with open(path, 'rb') as fp:
+        fp.seek(start)
+        data = fp.read(end-start)
+    if start > 0 and codecs.lookup(encoding).name == 'utf-8-sig':
+        encoding = 'utf-8'  # BOM only at start of file
+    return io.StringIO(data.decode(encoding, encoding_errors), newline=None).getvalue()
+
+
+@BaseSheet.api
+def localSourcePath(sheet):
+    'Return the path of the source file, if it is a local uncompressed regular file in an encoding whose bytes can be split at newlines and delimiters; otherwise None.'
+    p = sheet.source
+    if not isinstance(p, Path) or p.has_fp() or p.given == '-' or p.compression or p.is_url():
+        return None
+
+    if codecs.lookup(sheet.options.encoding).name not in _byte_splittable_encodings:
+        return None
+
+    path = str(p)
+    if not os.path.isfile(path):
+        return None
+
+    return path
+
+
+@BaseSheet.api
+def parallelSourcePath(sheet):
+    'Return the local path of the source file, if it can be split into byte ranges parsed by options.load_workers processes; otherwise None.'
+    if sheet.options.load_workers < 1:
+        return None
+
+    path = sheet.localSourcePath()
+    if not path or os.path.getsize(path) <= sheet.options.load_chunk_mb*2**20:
+        return None
+
+    return path
+
+
+@BaseSheet.api
+def iterloadParallel(sheet, path, parsefunc, *args, quote=None):
+    '''Generate rows from the file at *path*, split into byte ranges which are parsed by ``parsefunc(path, start, end, encoding, encoding_errors, *args)`` in worker processes.
+    *parsefunc* must be a module-level function returning a list of rows, or None if the range did not end on a row boundary (like a newline inside a quoted field with a stray quote before it); then the rest of the file is parsed as one range.
+    The first range is parsed in this process, to show its rows while the workers start.'''
+    import concurrent.futures
+    import multiprocessing
+
+    nworkers = sheet.options.load_workers
+    chunksize = max(sheet.options.load_chunk_mb, 1)*2**20
+    encargs = (sheet.options.encoding, sheet.options.encoding_errors)
+    filesize = os.path.getsize(path)
+
+    ranges = rangeBoundaries(path, chunksize, quote=quote)
+
+    with Progress(gerund='reading', total=filesize) as prog:
+        def _results(start, end, rows):
+            if rows is None:
+                vd.warning(f'could not split {path} at byte {end}; reading rest of file in one part')
+                rows = parsefunc(path, start, filesize, *encargs, *args)
+                end = filesize
+            yield from rows
+            prog.addProgress(end-start)
+            return end == filesize
+
+        for start, end in ranges:
+            if (yield from _results(start, end, parsefunc(path, start, end, *encargs, *args))):
+                return
+            break
+
+        # spawn instead of fork, since other threads may be holding locks
+        mpctx = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(max_workers=nworkers, mp_context=mpctx) as executor:
+            pending = collections.deque()
+            try:
+                for start, end in ranges:
+                    pending.append((start, end, executor.submit(parsefunc, path, start, end, *encargs, *args)))
+                    if len(pending) > nworkers*2:  # bound the number of parsed ranges held in memory
+                        start, end, fut = pending.popleft()
+                        if (yield from _results(start, end, fut.result())):
+                            return
+
+                while pending:
+                    start, end, fut = pending.popleft()
+                    if (yield from _results(start, end, fut.result())):
+                        return
+            finally:
+                for _, _, fut in pending:
+                    fut.cancel()